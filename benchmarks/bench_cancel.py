@@ -0,0 +1,144 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+from benchmarks.fake_ollama import FakeOllamaServer
+
+CANCEL_BUDGET_MS = 100
+
+qt_app = None
+
+SCENARIOS = {
+    # Ollama is still evaluating the prompt: no bytes have arrived yet.
+    "prompt-eval": {"first_token_delay": 30, "tokens_per_second": 0, "token_count": 10},
+    # Tokens are trickling in slowly when Stop is pressed.
+    "mid-stream": {"first_token_delay": 0, "tokens_per_second": 2, "token_count": 1000},
+}
+
+
+def wait_for(predicate, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.0005)
+    return predicate()
+
+
+def start_qt_worker(messages):
+    from PyQt6.QtCore import Qt
+    from src.workers.ollama_worker import OllamaWorker
+
+    received = threading.Event()
+    worker = OllamaWorker("qwen7", messages, flush_interval_ms=0)
+    worker.update_signal.connect(lambda _: received.set(), Qt.ConnectionType.DirectConnection)
+    worker.start()
+    return worker.stop, lambda: not worker.isRunning(), received
+
+
+def start_engine_stream(messages):
+    # Same pattern light_chatty.py uses: a coroutine on the shared engine that
+    # is cancelled through its concurrent future.
+    from src.config import OLLAMA_CHAT_URL
+    from src.utils.ndjson import ChatStreamParser
+    from src.utils.stream_engine import get_engine
+
+    received = threading.Event()
+
+    async def generate():
+        parser = ChatStreamParser()
+        async with get_engine().client.stream("POST", OLLAMA_CHAT_URL, {
+            "model": "qwen7", "messages": messages, "stream": True
+        }, timeout=500) as response:
+            async for chunk in response.iter_chunks():
+                if parser.feed(chunk):
+                    received.set()
+
+    future = get_engine().submit(generate())
+    return future.cancel, future.done, received
+
+
+def run(client, scenario, settings):
+    server = FakeOllamaServer(**settings).start()
+    try:
+        start = start_qt_worker if client == "qt-worker" else start_engine_stream
+        stop, is_done, received = start([{"role": "user", "content": "Hello"}])
+        if settings["first_token_delay"]:
+            time.sleep(0.3)
+        elif not received.wait(5):
+            raise RuntimeError("no tokens arrived from the fake server")
+
+        disconnects = len(server.disconnects)
+        begin = time.monotonic()
+        stop()
+        stop_call = time.monotonic() - begin
+        wait_for(is_done, 2)
+        done = time.monotonic() - begin
+        closed = wait_for(lambda: len(server.disconnects) > disconnects, 2)
+        socket_closed = (server.disconnects[-1] - begin) if closed else float("inf")
+        return {
+            "client": client,
+            "scenario": scenario,
+            "stop_call_ms": stop_call * 1000,
+            "task_done_ms": done * 1000,
+            "socket_closed_ms": socket_closed * 1000,
+            "passed": socket_closed * 1000 < CANCEL_BUDGET_MS,
+        }
+    finally:
+        server.stop()
+
+
+def use_free_port():
+    # The src config reads OLLAMA_BASE_URL at import time, so point it at a
+    # fixed port before anything from src is imported.
+    probe = FakeOllamaServer()
+    port = probe.server_address[1]
+    probe.server_close()
+    os.environ["OLLAMA_BASE_URL"] = f"http://127.0.0.1:{port}"
+    return port
+
+
+def available_clients():
+    # The Qt worker is only measured when PyQt6 is installed; its
+    # application object lives as long as the process
+    global qt_app
+    try:
+        from PyQt6.QtCore import QCoreApplication
+    except ImportError:
+        return ["engine-stream"]
+    qt_app = QCoreApplication.instance() or QCoreApplication(sys.argv)
+    return ["qt-worker", "engine-stream"]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=f"Check that Stop aborts the HTTP stream within {CANCEL_BUDGET_MS} ms.")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    port = use_free_port()
+    clients = available_clients()
+
+    results = []
+    for client in clients:
+        for scenario, settings in SCENARIOS.items():
+            results.append(run(client, scenario, dict(settings, port=port)))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for result in results:
+            status = "ok" if result["passed"] else "TOO SLOW"
+            print(f"{result['client']:<14} {result['scenario']:<12}"
+                  f" stop() {result['stop_call_ms']:6.2f} ms"
+                  f"  task done {result['task_done_ms']:6.2f} ms"
+                  f"  socket closed {result['socket_closed_ms']:7.2f} ms  {status}")
+    if not all(result["passed"] for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,400 @@
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_ollama import WORDS, FakeOllamaServer
+
+APPS = ["qt", "chatty", "tk"]
+
+# Metrics compared against a baseline, and whether a higher value is better
+TRACKED = {
+    "interactive_ms": False,
+    "tokens_per_second": True,
+    "loop_latency_p95_ms": False,
+    "display_lag_ms": False,
+    "memory_growth_mb": False,
+    "load_ms": False,
+}
+
+TICK_MS = 5
+
+
+def rss_bytes():
+    # Current resident set size; peak RSS where /proc is not available
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(round((len(values) - 1) * q / 100)))]
+
+
+def chars_per_token(args):
+    if args.replay:
+        from src.utils.ndjson import ChatStreamParser
+        from src.utils.stream_fixtures import fixture_paths, read_fixture
+        tokens = []
+        for path in fixture_paths(args.replay):
+            parser = ChatStreamParser()
+            for _, chunk in read_fixture(path)[1]:
+                tokens.extend(parser.feed(chunk))
+        return sum(len(token) for token in tokens) / max(1, len(tokens))
+    return args.token_size or sum(len(word) for word in WORDS) / len(WORDS)
+
+
+def make_history(messages, message_size):
+    history = [{"role": "system", "content": "You are a helpful assistant."}]
+    text = ("lorem ipsum dolor sit amet " * (message_size // 27 + 1))[:message_size]
+    for i in range(messages):
+        history.append({"role": "user" if i % 2 == 0 else "assistant", "content": f"{i} {text}"})
+    return history
+
+
+class QtDriver:
+    def __init__(self, app_name, server):
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        from PyQt6.QtWidgets import QApplication
+        self.app = QApplication.instance() or QApplication(sys.argv)
+        if app_name == "chatty":
+            import chatty
+            # chatty reads its URLs at import time, independent of src.config
+            for name in ("VERSION", "TAGS", "CHAT", "PS"):
+                setattr(chatty, f"OLLAMA_{name}_URL", f"{server.base_url}/api/{name.lower()}")
+            self.window_class = chatty.ChatWindow
+        else:
+            from src.gui.chat_window import ChatWindow
+            self.window_class = ChatWindow
+
+    def create_window(self):
+        window = self.window_class()
+        window.show()
+        return window
+
+    def rendered_chars(self, window):
+        display = window.chat_display
+        if hasattr(display, "document"):
+            return display.document().characterCount()
+        return len(display.toPlainText())
+
+    def send(self, window, text):
+        window.input_field.setText(text)
+        window.send_message()
+
+    def run_until(self, predicate, timeout, on_tick=None):
+        from PyQt6.QtCore import QEventLoop, QTimer, Qt
+        loop = QEventLoop()
+        deadline = time.monotonic() + timeout
+
+        def tick():
+            if on_tick is not None:
+                on_tick()
+            if predicate() or time.monotonic() > deadline:
+                loop.quit()
+
+        timer = QTimer()
+        timer.setTimerType(Qt.TimerType.PreciseTimer)
+        timer.timeout.connect(tick)
+        timer.start(TICK_MS)
+        loop.exec()
+        timer.stop()
+        return predicate()
+
+    def close(self, window):
+        window.close()
+
+
+class TkDriver:
+    def __init__(self, app_name, server):
+        import light_chatty
+        self.window_class = light_chatty.ChatWindow
+
+    def create_window(self):
+        window = self.window_class()
+        window.update()
+        return window
+
+    def rendered_chars(self, window):
+        return int(window.chat_display.count("1.0", "end", "chars")[0])
+
+    def send(self, window, text):
+        window.input_field.delete(0, "end")
+        window.input_field.insert(0, text)
+        window.send_message()
+
+    def run_until(self, predicate, timeout, on_tick=None):
+        deadline = time.monotonic() + timeout
+
+        def tick():
+            if on_tick is not None:
+                on_tick()
+            if predicate() or time.monotonic() > deadline:
+                window.quit()
+            else:
+                window.after(TICK_MS, tick)
+
+        window = self.window
+        window.after(TICK_MS, tick)
+        window.mainloop()
+        return predicate()
+
+    def close(self, window):
+        window.destroy()
+
+
+def loop_lateness():
+    # Ticks are scheduled every TICK_MS; any delay beyond that is time the
+    # event loop spent busy, i.e. how long a click or keypress would wait.
+    lateness = []
+    last_tick = [None]
+
+    def on_tick():
+        now = time.monotonic()
+        if last_tick[0] is not None:
+            lateness.append(max(0.0, (now - last_tick[0]) * 1000 - TICK_MS))
+        last_tick[0] = now
+
+    return lateness, on_tick
+
+
+def bench_startup(driver, args):
+    began = time.monotonic()
+    window = driver.create_window()
+    driver.window = window
+    ready = driver.run_until(lambda: window.is_ready, args.timeout)
+    result = {"scenario": "startup", "ready": ready,
+              "interactive_ms": (time.monotonic() - began) * 1000,
+              "phases_ms": dict(window.startup.phases)}
+    return window, result
+
+
+def bench_stream(driver, window, args, server):
+    lateness, on_tick = loop_lateness()
+    reply_count = len(window.messages) + 2
+    chars_before = driver.rendered_chars(window)
+    rss_before = rss_bytes()
+    began = time.monotonic()
+    driver.send(window, "benchmark")
+    finished = driver.run_until(lambda: window.is_ready and len(window.messages) >= reply_count,
+                                args.timeout, on_tick)
+    elapsed = time.monotonic() - began
+    # How far the display trailed the stream: the time from the server's last
+    # token to the reply being complete on screen. It stays small, whatever
+    # the rate, as long as the window keeps up.
+    lag = (time.monotonic() - server.streams_finished[-1]) * 1000 \
+        if finished and server.streams_finished else None
+    rendered = driver.rendered_chars(window) - chars_before
+    tokens = rendered / chars_per_token(args)
+    if not finished:
+        window.stop_model()
+    return {
+        "scenario": "stream",
+        "finished": finished,
+        "tokens_sent": None if args.replay else args.tokens,
+        "tokens_rendered": round(tokens),
+        "elapsed_s": elapsed,
+        "tokens_per_second": tokens / elapsed if elapsed else None,
+        "display_lag_ms": lag,
+        "loop_latency_p50_ms": percentile(lateness, 50),
+        "loop_latency_p95_ms": percentile(lateness, 95),
+        "loop_latency_max_ms": max(lateness) if lateness else None,
+        "memory_growth_mb": (rss_bytes() - rss_before) / 1024 ** 2,
+    }
+
+
+def bench_history(driver, window, args):
+    # Loading runs in the background; the window is ready again once the
+    # history is on screen. Loop latency shows whether it stayed responsive.
+    from src.utils.conversation_store import get_store
+    history = make_history(args.history_messages, args.history_message_size)
+    store = get_store()
+    conversation_id = store.create("bench history", "qwen7", history)
+    lateness, on_tick = loop_lateness()
+    driver.run_until(lambda: window.is_ready, args.timeout)
+    began = time.monotonic()
+    window.load_history_file(conversation_id)
+    loaded = driver.run_until(lambda: window.is_ready, args.timeout, on_tick)
+    load_ms = (time.monotonic() - began) * 1000
+    # Let the window finish laying out what was loaded before stopping the clock
+    driver.run_until(lambda: True, 1)
+    # The window adopted the conversation; start it over so nothing more is
+    # added to it before it is deleted
+    window.session.reset()
+    store.delete(conversation_id)
+    return {
+        "scenario": "history",
+        "loaded": loaded,
+        "messages": args.history_messages,
+        "size_mb": sum(len(message["content"]) for message in history) / 1024 ** 2,
+        "load_ms": load_ms,
+        "load_and_layout_ms": (time.monotonic() - began) * 1000,
+        "loop_latency_p95_ms": percentile(lateness, 95),
+        "loop_latency_max_ms": max(lateness) if lateness else None,
+    }
+
+
+def run_app(app_name, args):
+    # Each window journals its session and restores the last one on startup;
+    # running against the user's journals would take them over
+    from src.config import SESSION_JOURNAL_FOLDER
+    history_folder = os.environ.get("CHAT_HISTORY_FOLDER")
+    if not history_folder or os.path.dirname(SESSION_JOURNAL_FOLDER) != history_folder:
+        raise RuntimeError("run_app needs CHAT_HISTORY_FOLDER pointed at a folder of its own "
+                           "before the apps are imported")
+    server = FakeOllamaServer(port=args.port, token_count=args.tokens,
+                              tokens_per_second=args.rate, token_size=args.token_size).start()
+    try:
+        try:
+            driver = TkDriver(app_name, server) if app_name == "tk" else QtDriver(app_name, server)
+            window, startup = bench_startup(driver, args)
+        except Exception as e:
+            # No display for Tk, or PyQt6 missing
+            return [{"app": app_name, "skipped": f"{type(e).__name__}: {e}"}]
+        results = [startup]
+        if startup["ready"]:
+            results.append(bench_stream(driver, window, args, server))
+        results.append(bench_history(driver, window, args))
+        driver.close(window)
+        return [dict(result, app=app_name) for result in results]
+    finally:
+        server.stop()
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    previous = {(r["app"], r["scenario"]): r for r in baseline if "scenario" in r}
+    for result in results:
+        old = previous.get((result.get("app"), result.get("scenario")))
+        if old is None:
+            continue
+        for key, higher_is_better in TRACKED.items():
+            new_value, old_value = result.get(key), old.get(key)
+            if new_value is None or not old_value:
+                continue
+            change = (new_value - old_value) / abs(old_value)
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append(f"{result['app']} {result['scenario']} {key}: "
+                                   f"{old_value:.2f} -> {new_value:.2f}")
+    return regressions
+
+
+def print_results(results):
+    for result in results:
+        if "skipped" in result:
+            print(f"{result['app']:<7} skipped ({result['skipped']})")
+        elif result["scenario"] == "startup":
+            print(f"{result['app']:<7} startup  interactive {result['interactive_ms']:8.1f} ms")
+        elif result["scenario"] == "stream":
+            print(f"{result['app']:<7} stream   {result['tokens_per_second']:10.0f} tok/s"
+                  f"  lag {result['display_lag_ms'] or 0:7.1f} ms"
+                  f"  loop p95 {result['loop_latency_p95_ms'] or 0:6.1f} ms"
+                  f"  max {result['loop_latency_max_ms'] or 0:6.1f} ms"
+                  f"  memory +{result['memory_growth_mb']:.1f} MB"
+                  f"{'' if result['finished'] else '  (timed out)'}")
+        else:
+            print(f"{result['app']:<7} history  {result['messages']} messages ({result['size_mb']:.1f} MB)"
+                  f"  load {result['load_ms']:8.1f} ms  with layout {result['load_and_layout_ms']:8.1f} ms"
+                  f"  loop p95 {result['loop_latency_p95_ms'] or 0:6.1f} ms"
+                  f"  max {result['loop_latency_max_ms'] or 0:6.1f} ms"
+                  f"{'' if result['loaded'] else '  (timed out)'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure startup, stream rendering and history loading of the chat windows "
+                    "against a local fake Ollama server.")
+    parser.add_argument("--app", choices=APPS + ["all"], default="all")
+    parser.add_argument("--tokens", type=int, default=100000, help="tokens streamed per reply")
+    parser.add_argument("--rate", type=float, default=0, help="tokens per second, 0 for unthrottled")
+    parser.add_argument("--token-size", type=int, default=0, help="characters per token, 0 for words")
+    parser.add_argument("--history-messages", type=int, default=2000)
+    parser.add_argument("--history-message-size", type=int, default=2000, help="characters per message")
+    parser.add_argument("--replay", help="stream fixture file or folder to play back instead of "
+                                         "the fake server's canned tokens")
+    parser.add_argument("--replay-speed", type=float, default=0,
+                        help="multiple of the recorded pace, 0 for as fast as possible")
+    parser.add_argument("--display", choices=["text", "list"],
+                        help="chat display of the Qt windows (default: CHAT_DISPLAY from the config)")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds allowed per scenario")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    parser.add_argument("--out", help="also write the JSON results to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="relative change counted as a regression")
+    parser.add_argument("--port", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.app != "all":
+        # The windows read OLLAMA_BASE_URL at import time, so the fake server
+        # port is fixed before anything from the apps is imported.
+        if not args.port:
+            probe = FakeOllamaServer()
+            args.port = probe.server_address[1]
+            probe.server_close()
+        os.environ["OLLAMA_BASE_URL"] = f"http://127.0.0.1:{args.port}"
+        if args.display:
+            os.environ["CHAT_DISPLAY"] = args.display
+        if args.replay:
+            os.environ["OLLAMA_STREAM_REPLAY"] = args.replay
+            os.environ["OLLAMA_STREAM_REPLAY_SPEED"] = str(args.replay_speed)
+        # Conversations, session journals and the other state the apps keep
+        # go to a folder of their own instead of the user's
+        history_folder = tempfile.mkdtemp(prefix="bench_gui-")
+        os.environ["CHAT_HISTORY_FOLDER"] = history_folder
+        import logging
+        logging.disable(logging.INFO)
+        try:
+            results = run_app(args.app, args)
+        finally:
+            shutil.rmtree(history_folder, ignore_errors=True)
+    else:
+        # One process per app keeps memory figures and toolkits independent
+        results = []
+        for app_name in APPS:
+            with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+                out = f.name
+            argv = [sys.executable, "-m", "benchmarks.bench_gui", "--app", app_name, "--out", out]
+            for option in ("tokens", "rate", "token_size", "history_messages",
+                           "history_message_size", "timeout", "replay", "replay_speed", "display"):
+                if getattr(args, option) is not None:
+                    argv += [f"--{option.replace('_', '-')}", str(getattr(args, option))]
+            subprocess.run(argv, stdout=subprocess.DEVNULL)
+            try:
+                with open(out) as f:
+                    results.extend(json.load(f))
+            except (OSError, ValueError):
+                results.append({"app": app_name, "skipped": "benchmark process failed"})
+            finally:
+                os.remove(out)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    elif args.app == "all" or not args.out:
+        print_results(results)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import argparse
+import json
+import time
+
+import requests
+
+from src.utils import ndjson
+from src.utils.ndjson import ChatStreamParser
+from src.utils.stream_fixtures import FIXTURE_SUFFIX, read_fixture
+
+
+def synthetic_stream(tokens, model="qwen7"):
+    # One NDJSON line per chunk, shaped like Ollama's /api/chat output.
+    chunks = []
+    words = ["the", " quick", " brown", " fox", " jumps", " over", " a", " lazy", " dog", ".\n"]
+    for i in range(tokens):
+        line = {
+            "model": model,
+            "created_at": "2024-11-05T10:00:00.000000Z",
+            "message": {"role": "assistant", "content": words[i % len(words)]},
+            "done": False,
+        }
+        chunks.append(json.dumps(line, separators=(",", ":")).encode() + b"\n")
+    final = {
+        "model": model,
+        "created_at": "2024-11-05T10:00:01.000000Z",
+        "message": {"role": "assistant", "content": ""},
+        "done_reason": "stop",
+        "done": True,
+        "total_duration": 1000000000,
+        "load_duration": 1000000,
+        "prompt_eval_count": 26,
+        "prompt_eval_duration": 100000000,
+        "eval_count": tokens,
+        "eval_duration": 900000000,
+    }
+    chunks.append(json.dumps(final, separators=(",", ":")).encode() + b"\n")
+    return chunks
+
+
+def load_fixture(path):
+    # A recorded stream fixture keeps the exact chunk boundaries seen on the
+    # socket; a plain NDJSON file is split into one chunk per line.
+    if path.endswith(FIXTURE_SUFFIX):
+        return [chunk for _, chunk in read_fixture(path)[1]]
+    with open(path, "rb") as f:
+        return [line for line in f.read().splitlines(keepends=True) if line.strip()]
+
+
+class RecordedRaw:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def stream(self, chunk_size, decode_content=True):
+        yield from self.chunks
+
+
+def requests_path(chunks):
+    # The pre-parser path: Response.iter_lines() plus a full json.loads per line.
+    response = requests.models.Response()
+    response.raw = RecordedRaw(chunks)
+    tokens = []
+    for line in response.iter_lines():
+        if line:
+            data = json.loads(line)
+            if 'message' in data and 'content' in data['message']:
+                tokens.append(data['message']['content'])
+    return tokens
+
+
+def parser_path(chunks):
+    parser = ChatStreamParser()
+    tokens = []
+    for chunk in chunks:
+        tokens.extend(parser.feed(chunk))
+    return tokens
+
+
+def stdlib_parser_path(chunks):
+    backend = ndjson.orjson
+    ndjson.orjson = None
+    try:
+        return parser_path(chunks)
+    finally:
+        ndjson.orjson = backend
+
+
+def measure(func, chunks, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(chunks)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Compare NDJSON stream parsing paths.")
+    arg_parser.add_argument("--tokens", type=int, default=20000)
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    arg_parser.add_argument("--fixture", help="recorded stream fixture or raw /api/chat NDJSON file to parse "
+                                 "instead of a synthetic stream")
+    arg_parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = arg_parser.parse_args()
+
+    chunks = load_fixture(args.fixture) if args.fixture else synthetic_stream(args.tokens)
+    expected = "".join(requests_path(chunks))
+    paths = [("requests.iter_lines + json.loads", requests_path),
+             (f"ChatStreamParser ({ndjson.JSON_BACKEND})", parser_path)]
+    if ndjson.orjson is not None:
+        paths.append(("ChatStreamParser (json fallback)", stdlib_parser_path))
+
+    results = []
+    for name, func in paths:
+        if "".join(func(chunks)) != expected:
+            raise SystemExit(f"{name} produced different tokens than the reference path")
+        seconds = measure(func, chunks, args.repeat)
+        results.append({
+            "path": name,
+            "chunks": len(chunks),
+            "seconds": seconds,
+            "us_per_chunk": seconds / len(chunks) * 1e6,
+        })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    baseline = results[0]["seconds"]
+    for result in results:
+        print(f"{result['path']:<36} {result['us_per_chunk']:8.2f} us/chunk"
+              f"  {baseline / result['seconds']:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
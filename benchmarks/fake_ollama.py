@@ -0,0 +1,173 @@
+import argparse
+import json
+import select
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = ["the", " quick", " brown", " fox", " jumps", " over", " a", " lazy", " dog", ".\n"]
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.startswith("/api/version"):
+            self.send_json({"version": self.server.version})
+        elif self.path.startswith("/api/tags"):
+            self.send_json({"models": [
+                {"name": name, "model": name, "size": 4 * 1024 ** 3,
+                 "details": {"family": "llama", "parameter_size": "7B",
+                             "quantization_level": "Q4_K_M"}}
+                for name in self.server.models]})
+        elif self.path.startswith("/api/ps"):
+            self.send_json({"models": [
+                {"name": name, "model": name, "size": 4 * 1024 ** 3, "size_vram": 0}
+                for name in sorted(self.server.loaded)]})
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        self.server.requests.append(request)
+        if not self.path.startswith("/api/chat"):
+            self.send_json({"error": "not found"}, 404)
+            return
+        model = request.get("model", "")
+        if request.get("keep_alive") in ("0", 0):
+            self.server.loaded.discard(model)
+        else:
+            self.server.loaded.add(model)
+        if not request.get("messages"):
+            self.send_json({"model": model, "message": {"role": "assistant", "content": ""},
+                            "done_reason": "load", "done": True})
+            return
+        if request.get("stream") is False:
+            self.send_json(self.final_chunk(model, "".join(self.tokens())))
+            return
+        self.stream_chat(model)
+
+    def tokens(self):
+        size = self.server.token_size
+        for i in range(self.server.token_count):
+            word = WORDS[i % len(WORDS)]
+            yield (word * (size // len(word) + 1))[:size] if size else word
+
+    def final_chunk(self, model, content=""):
+        return {"model": model, "created_at": "2024-11-05T10:00:00Z",
+                "message": {"role": "assistant", "content": content},
+                "done_reason": "stop", "done": True,
+                "total_duration": 1000000000, "load_duration": 1000000,
+                "prompt_eval_count": 26, "prompt_eval_duration": 100000000,
+                "eval_count": self.server.token_count, "eval_duration": 900000000}
+
+    def client_gone(self, timeout):
+        # Wait up to timeout seconds, returning early if the client hung up.
+        readable, _, _ = select.select([self.connection], [], [], timeout)
+        if not readable:
+            return False
+        try:
+            return self.connection.recv(1, socket.MSG_PEEK) == b""
+        except OSError:
+            return True
+
+    def write_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def stream_chat(self, model):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        self.wfile.flush()
+        interval = 1 / self.server.tokens_per_second if self.server.tokens_per_second else 0
+        try:
+            if self.server.first_token_delay and self.client_gone(self.server.first_token_delay):
+                raise ConnectionResetError
+            next_time = time.monotonic()
+            for token in self.tokens():
+                line = {"model": model, "created_at": "2024-11-05T10:00:00Z",
+                        "message": {"role": "assistant", "content": token}, "done": False}
+                self.write_chunk(json.dumps(line, separators=(",", ":")).encode() + b"\n")
+                if interval:
+                    next_time += interval
+                    delay = next_time - time.monotonic()
+                    if delay > 0 and self.client_gone(delay):
+                        raise ConnectionResetError
+            final = json.dumps(self.final_chunk(model), separators=(",", ":")).encode()
+            self.write_chunk(final + b"\n")
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+            self.server.streams_finished.append(time.monotonic())
+        except (BrokenPipeError, ConnectionResetError):
+            self.server.disconnects.append(time.monotonic())
+            self.close_connection = True
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, token_count=200, tokens_per_second=0,
+                 token_size=0, first_token_delay=0, models=("qwen7", "qwen2.5-coder"),
+                 version="0.5.7"):
+        super().__init__((host, port), FakeOllamaHandler)
+        self.token_count = token_count
+        self.tokens_per_second = tokens_per_second
+        self.token_size = token_size
+        self.first_token_delay = first_token_delay
+        self.models = list(models)
+        self.version = version
+        self.loaded = set()
+        self.requests = []
+        self.disconnects = []
+        self.streams_finished = []
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Ollama HTTP API.")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=50, help="tokens per second, 0 for unthrottled")
+    parser.add_argument("--token-size", type=int, default=0, help="characters per token, 0 for words")
+    parser.add_argument("--first-token-delay", type=float, default=0)
+    args = parser.parse_args()
+    server = FakeOllamaServer(port=args.port, token_count=args.tokens, tokens_per_second=args.rate,
+                              token_size=args.token_size, first_token_delay=args.first_token_delay)
+    print(f"Fake Ollama listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,87 +1,52 @@
 import sys
-import json
 import logging
-import requests
 import os
+import sqlite3
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QTextEdit, QLineEdit, QPushButton, QInputDialog, QFileDialog,
-    QMessageBox, QListWidget, QDialog, QLabel, QStyleFactory,
-    QRadioButton, QButtonGroup  # Added these for mode switching
+    QLineEdit, QPushButton, QInputDialog, QFileDialog,
+    QMessageBox, QListWidget, QListWidgetItem, QDialog, QLabel, QStyleFactory,
+    QRadioButton, QButtonGroup, QCheckBox  # Added these for mode switching
 )
-from PyQt6.QtCore import QThread, pyqtSignal, Qt, QObject, QTimer
-from PyQt6.QtGui import QTextCursor, QFont, QColor, QIcon
+from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtGui import QFont, QColor, QIcon
+
+from src.workers.ollama_worker import OllamaWorker
+from src.workers.warm_pool_manager import WarmPoolManager
+from src.workers.request_worker import RequestWorker
+from src.workers.catalog_worker import CatalogWorker
+from src.workers.history_worker import HistoryWorker
+from src.gui.compare_window import CompareWindow
+from src.gui.prompt_queue_panel import PromptQueuePanel
+from src.gui.chat_display import create_chat_display
+from src.dialogs.metrics_dialog import MetricsDialog
+from src.utils.context_window import ContextWindow
+from src.utils.conversation_store import Session, get_store
+from src.utils.metrics import MetricsTable
+from src.utils.response_cache import ResponseCache
+from src.utils.runtime_profiles import runtime_options, context_budget
+from src.utils.session_journal import SessionJournal
+from src.utils.startup import StartupTimer
+from src.config import OLLAMA_STARTUP_TIMEOUT
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 
-OLLAMA_BASE_URL = "http://localhost:11434"
+OLLAMA_BASE_URL = os.environ.get("OLLAMA_BASE_URL", "http://localhost:11434")
 OLLAMA_CHAT_URL = f"{OLLAMA_BASE_URL}/api/chat"
 OLLAMA_VERSION_URL = f"{OLLAMA_BASE_URL}/api/version"
 OLLAMA_TAGS_URL = f"{OLLAMA_BASE_URL}/api/tags"
+OLLAMA_PS_URL = f"{OLLAMA_BASE_URL}/api/ps"
 
-# Create a folder for saving chat histories
-CHAT_HISTORY_FOLDER = os.path.join(os.path.expanduser("~"), "ollama_chat_histories")
+# Create a folder for saving chat histories; the CHAT_HISTORY_FOLDER
+# environment variable puts it elsewhere
+CHAT_HISTORY_FOLDER = os.environ.get(
+    "CHAT_HISTORY_FOLDER", os.path.join(os.path.expanduser("~"), "ollama_chat_histories"))
 os.makedirs(CHAT_HISTORY_FOLDER, exist_ok=True)
 
-def check_ollama_version():
-    try:
-        response = requests.get(OLLAMA_VERSION_URL)
-        response.raise_for_status()
-        version = response.json().get('version', 'unknown')
-        logging.info(f"Ollama version: {version}")
-        return version
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Failed to get Ollama version: {e}")
-        return None
-
-class OllamaWorker(QThread):
-    update_signal = pyqtSignal(str)
-    error_signal = pyqtSignal(str)
-    finished_signal = pyqtSignal()
-
-    def __init__(self, model, messages):
-        super().__init__()
-        self.model = model
-        self.messages = messages
-        self.is_running = True
-
-    def run(self):
-        try:
-            logging.debug(f"Sending request to Ollama. Model: {self.model}")
-            logging.debug(f"Messages: {self.messages}")
-            
-            response = requests.post(OLLAMA_CHAT_URL, json={
-                "model": self.model,
-                "messages": self.messages,
-                "stream": True
-            }, stream=True, timeout=500)
-            
-            logging.debug(f"Response status code: {response.status_code}")
-            response.raise_for_status()
-
-            for line in response.iter_lines():
-                if not self.is_running:
-                    break
-                if line:
-                    try:
-                        data = json.loads(line)
-                        if 'message' in data and 'content' in data['message']:
-                            self.update_signal.emit(data['message']['content'])
-                    except json.JSONDecodeError as e:
-                        logging.error(f"JSON decode error: {e}")
-                        self.error_signal.emit(f"Error decoding JSON from Ollama response: {e}")
-            self.finished_signal.emit()
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Request exception: {e}")
-            self.error_signal.emit(f"Error connecting to Ollama: {str(e)}")
-
-    def stop(self):
-        self.is_running = False
-
-
 class ChatHistoryDialog(QDialog):
-    def __init__(self, parent=None):
+    def __init__(self, store, parent=None):
         super().__init__(parent)
+        self.store = store
         self.setWindowTitle("Load Chat History")
         self.setGeometry(200, 200, 300, 200)
         layout = QVBoxLayout(self)
@@ -104,57 +69,38 @@ class ChatHistoryDialog(QDialog):
         self.load_history_files()
     
     def load_history_files(self):
-        for filename in os.listdir(CHAT_HISTORY_FOLDER):
-            if filename.endswith('.json'):
-                self.list_widget.addItem(filename)
+        # Chats saved as JSON files by earlier versions are picked up here;
+        # the list itself only reads the conversations table
+        self.store.import_folder(CHAT_HISTORY_FOLDER)
+        for conversation in self.store.conversations():
+            item = QListWidgetItem(f"{conversation['name']} ({conversation['message_count']} messages)")
+            item.setData(Qt.ItemDataRole.UserRole, conversation["id"])
+            self.list_widget.addItem(item)
     
-    def get_selected_file(self):
+    def get_selected_conversation(self):
         if self.list_widget.currentItem():
-            return os.path.join(CHAT_HISTORY_FOLDER, self.list_widget.currentItem().text())
+            return self.list_widget.currentItem().data(Qt.ItemDataRole.UserRole)
         return None
 
     def delete_selected(self):
         if self.list_widget.currentItem():
-            file_path = self.get_selected_file()
+            conversation_id = self.get_selected_conversation()
             reply = QMessageBox.question(self, 'Delete Confirmation',
                                          f"Are you sure you want to delete {self.list_widget.currentItem().text()}?",
                                          QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
                                          QMessageBox.StandardButton.No)
             if reply == QMessageBox.StandardButton.Yes:
                 try:
-                    os.remove(file_path)
+                    self.store.delete(conversation_id)
                     self.list_widget.takeItem(self.list_widget.row(self.list_widget.currentItem()))
-                    QMessageBox.information(self, "Success", "File deleted successfully.")
-                except Exception as e:
-                    QMessageBox.critical(self, "Error", f"Failed to delete file: {str(e)}")
-
-class PreloadWorker(QObject):
-    finished = pyqtSignal()
-    error = pyqtSignal(str)
-
-    def __init__(self, model):
-        super().__init__()
-        self.model = model
-        self.is_running = True
-
-    def run(self):
-        try:
-            response = requests.post(OLLAMA_CHAT_URL, json={
-                "model": self.model
-            }, timeout=60)
-            response.raise_for_status()
-            if self.is_running:
-                self.finished.emit()
-        except requests.exceptions.RequestException as e:
-            if self.is_running:
-                self.error.emit(str(e))
-
-    def stop(self):
-        self.is_running = False
+                    QMessageBox.information(self, "Success", "Chat history deleted successfully.")
+                except sqlite3.Error as e:
+                    QMessageBox.critical(self, "Error", f"Failed to delete chat history: {str(e)}")
 
 class ChatWindow(QMainWindow):
     def __init__(self):
         super().__init__()
+        self.startup = StartupTimer()
         self.setWindowTitle("Ollama Chat GUI")
         self.setGeometry(100, 100, 800, 600)
         self.is_loading_model = False
@@ -173,17 +119,43 @@ class ChatWindow(QMainWindow):
         self.code_mode_prompt = "You are an expert programmer who excels at writing clean, efficient, and well-documented code. You focus on practical solutions, include helpful comments, and optimize for both performance and readability. Every implementation comes with clear technical explanations and best practices."
         
         self.messages = [{"role": "system", "content": self.system_prompt}]
+        self.context = ContextWindow()
+        self.response_cache = ResponseCache()
+        self.metrics_table = MetricsTable()
         self.current_message = ""
         self.is_ready = False
 
         self.setup_ui()
         self.status_label = QLabel("Initializing...")
         self.statusBar().addPermanentWidget(self.status_label)
+        self.context_label = QLabel()
+        self.statusBar().addWidget(self.context_label)
+        self.metrics_label = QLabel()
+        self.statusBar().addWidget(self.metrics_label)
+        self.cache_label = QLabel()
+        self.statusBar().addWidget(self.cache_label)
+        self.update_context_usage()
 
-        self.thread = None
         self.worker = None
+        self.warm_pool = WarmPoolManager(parent=self)
+        self.warm_pool.model_ready.connect(self.on_preload_finished)
+        self.warm_pool.model_failed.connect(self.on_preload_error)
+        self.unload_worker = None
+        self.history_worker = None
+        # Every message is stored as it completes, and journaled along with
+        # the reply being streamed so the session survives a crash
+        self.session = Session(get_store(), SessionJournal("chatty"))
+        self.restored_conversation = None
+        self.compare_window = None
+        self.version_worker = None
+        self.ollama_version = None
+        self.catalog_worker = CatalogWorker(tags_url=OLLAMA_TAGS_URL, ps_url=OLLAMA_PS_URL, parent=self)
+        self.catalog_worker.updated.connect(self.on_catalog_updated)
+        self.catalog_worker.error.connect(self.on_catalog_error)
+        self.compare_pending = False
 
         QTimer.singleShot(0, self.initialize_ollama)
+        self.startup.mark("window built")
         self.apply_styles()
         self.user_scrolled = False
         self.chat_display.verticalScrollBar().valueChanged.connect(self.on_scroll_value_changed)
@@ -207,6 +179,21 @@ class ChatWindow(QMainWindow):
         mode_layout.addWidget(self.chat_mode_radio)
         mode_layout.addWidget(self.code_mode_radio)
         mode_layout.addStretch()
+
+        self.stable_prefix_check = QCheckBox("Stable prefix (reuse prompt cache)")
+        self.stable_prefix_check.setChecked(self.context.stable)
+        self.stable_prefix_check.toggled.connect(self.on_stable_prefix_toggled)
+        mode_layout.addWidget(self.stable_prefix_check)
+
+        self.cache_check = QCheckBox("Response cache")
+        self.cache_check.setChecked(self.response_cache.enabled)
+        self.cache_check.toggled.connect(self.on_cache_toggled)
+        mode_layout.addWidget(self.cache_check)
+
+        self.bypass_cache_check = QCheckBox("Bypass cache")
+        self.bypass_cache_check.setEnabled(self.response_cache.enabled)
+        self.bypass_cache_check.toggled.connect(self.on_bypass_cache_toggled)
+        mode_layout.addWidget(self.bypass_cache_check)
         
         # Connect mode change signals
         self.chat_mode_radio.toggled.connect(self.on_mode_change)
@@ -214,8 +201,7 @@ class ChatWindow(QMainWindow):
         layout.addLayout(mode_layout)
 
         # Rest of the UI setup remains the same
-        self.chat_display = QTextEdit()
-        self.chat_display.setReadOnly(True)
+        self.chat_display = create_chat_display()
         font = QFont("Roboto", 14)
         self.chat_display.setFont(font)
         layout.addWidget(self.chat_display)
@@ -238,6 +224,9 @@ class ChatWindow(QMainWindow):
 
         layout.addLayout(input_layout)
 
+        self.prompt_queue_panel = PromptQueuePanel()
+        layout.addWidget(self.prompt_queue_panel)
+
         # Add all other buttons
         button_layout = QHBoxLayout()
         
@@ -261,6 +250,16 @@ class ChatWindow(QMainWindow):
         change_model_button.clicked.connect(self.change_model)
         button_layout.addWidget(change_model_button)
 
+        compare_models_button = QPushButton("Compare Models")
+        compare_models_button.setIcon(QIcon.fromTheme("view-split-left-right"))
+        compare_models_button.clicked.connect(self.compare_models)
+        button_layout.addWidget(compare_models_button)
+
+        stats_button = QPushButton("Stats")
+        stats_button.setIcon(QIcon.fromTheme("office-chart-line"))
+        stats_button.clicked.connect(self.show_metrics)
+        button_layout.addWidget(stats_button)
+
         clear_history_button = QPushButton("Clear History")
         clear_history_button.setIcon(QIcon.fromTheme("edit-clear"))
         clear_history_button.clicked.connect(self.clear_history)
@@ -279,7 +278,7 @@ class ChatWindow(QMainWindow):
                 background-color: #2E3440;
                 color: #ECEFF4;
             }
-            QTextEdit {
+            QTextEdit, MessageListView {
                 background-color: #3B4252;
                 color: #ECEFF4;
                 border: 1px solid #4C566A;
@@ -356,9 +355,21 @@ class ChatWindow(QMainWindow):
         """)
 
     def initialize_ollama(self):
+        # Version check, model listing and preload all start at once in the
+        # background; prompts typed meanwhile are queued until the model is ready
+        self.startup.mark("event loop running")
+        self.restore_session()
         self.check_ollama()
-        if self.is_ready:
-            self.preload_model()
+        self.list_models()
+        self.preload_model()
+
+    def restore_session(self):
+        # The conversation the last run ended in, with a reply that was cut
+        # off while streaming, is loaded once its model is ready
+        self.restored_conversation = self.session.restore()
+        if self.restored_conversation is not None:
+            self.model = self.restored_conversation["model"] or self.model
+
     def on_mode_change(self, checked):
 
         # Determine which mode is selected
@@ -366,6 +377,7 @@ class ChatWindow(QMainWindow):
         
         if new_mode != self.mode:
             self.mode = new_mode
+            old_model = self.model
             
             # Update model and prompt based on mode
             if self.mode == "chat":
@@ -375,69 +387,120 @@ class ChatWindow(QMainWindow):
                 self.model = "qwen2.5-coder"
                 self.system_prompt = self.code_mode_prompt
             
-            # Update messages with new system prompt
-            self.messages = [{"role": "system", "content": self.system_prompt}]
-            
-            # Clear chat display and show mode change
-            self.chat_display.clear()
+            if self.context.stable and self.model == old_model:
+                # Keep the conversation so its prefix stays cached; the new
+                # system prompt is appended at the tail. Another model has
+                # no cache to reuse, so switching to one starts over.
+                self.messages.append({"role": "system", "content": self.system_prompt})
+                self.session.sync(self.messages, self.model)
+            else:
+                # Update messages with new system prompt
+                self.messages = [{"role": "system", "content": self.system_prompt}]
+                self.session.reset()
+                # Clear chat display and show mode change
+                self.chat_display.clear()
             self.chat_display.setTextColor(QColor("black"))
             self.chat_display.append(f"\nSwitched to {self.mode.capitalize()} Mode")
             self.chat_display.append(f"Model: {self.model}")
             self.chat_display.append(f"System prompt updated accordingly.\n")
+            self.update_context_usage()
             
             # Preload the new model
+            self.warm_pool.record_switch(old_model, self.model)
             self.preload_model()
     def check_ollama(self):
-        version = check_ollama_version()
-        if version:
-            self.chat_display.setTextColor(QColor("black"))
-            self.chat_display.append(f"Connected to Ollama version: {version}\n")
-            self.is_ready = True
-        else:
-            self.chat_display.setTextColor(QColor("black"))
-            self.chat_display.append("Failed to connect to Ollama. Please make sure it's running.\n")
-            self.set_ready_state(False)
-            QMessageBox.warning(self, "Connection Error", "Failed to connect to Ollama. Please make sure it's running.")
+        self.version_worker = RequestWorker("GET", OLLAMA_VERSION_URL, timeout=OLLAMA_STARTUP_TIMEOUT)
+        self.version_worker.finished.connect(self.on_version_checked)
+        self.version_worker.error.connect(self.on_version_error)
+        self.version_worker.start()
+
+    def on_version_checked(self, data):
+        self.ollama_version = data.get('version', 'unknown')
+        logging.info(f"Ollama version: {self.ollama_version}")
+        self.startup.mark("version checked")
+        self.chat_display.setTextColor(QColor("black"))
+        self.chat_display.append(f"Connected to Ollama version: {self.ollama_version}\n")
+
+    def on_version_error(self, error):
+        logging.error(f"Failed to get Ollama version: {error}")
+        self.startup.finish("Ollama unreachable")
+        self.chat_display.setTextColor(QColor("black"))
+        self.chat_display.append("Failed to connect to Ollama. Please make sure it's running.\n")
+        self.set_ready_state(False)
+        QMessageBox.warning(self, "Connection Error", "Failed to connect to Ollama. Please make sure it's running.")
+
+    def list_models(self):
+        self.catalog_worker.refresh(force=True)
+
+    def on_catalog_updated(self):
+        catalog = self.catalog_worker.catalog
+        # The warm pool only knows its own keep_alive timers; drop models
+        # Ollama has since evicted
+        if catalog.ps_at is not None:
+            self.warm_pool.pool.sync_loaded(catalog.is_loaded, catalog.ps_at)
+        if catalog.tags_at is not None and "models listed" not in self.startup.phases:
+            self.startup.mark("models listed")
+            logging.debug(f"{len(catalog.models)} models installed")
+            if not catalog.is_installed(self.model):
+                self.chat_display.setTextColor(QColor("red"))
+                self.chat_display.append(f"Model {self.model} is not installed in Ollama.\n")
+        if self.compare_pending and not catalog.tags_stale():
+            self.compare_pending = False
+            self.open_compare_window()
+
+    def on_catalog_error(self, error):
+        if self.compare_pending:
+            self.compare_pending = False
+            self.open_compare_window()
 
     def send_message(self):
-        if not self.is_ready:
-            return  # Ignore send attempts when not ready
-
         user_message = self.input_field.text().strip()
         if not user_message:
             return
+        self.input_field.clear()
 
-        self.set_ready_state(False)  # Disable input when sending message
+        if not self.is_ready:
+            # A response is still streaming (or the model is loading): queue
+            # the prompt and send it the moment the current turn finishes.
+            self.prompt_queue_panel.enqueue(user_message)
+            self.status_label.setText(self.busy_status())
+            return
 
-        
+        self.start_turn(user_message)
+
+    def start_turn(self, user_message):
+        self.set_ready_state(False)  # Disable input when sending message
 
         self.chat_display.setTextColor(QColor("gray"))
         self.chat_display.append(f"You: {user_message}")
         self.chat_display.setTextColor(QColor("white"))
-        self.input_field.clear()
         self.messages.append({"role": "user", "content": user_message})
+        self.session.sync(self.messages, self.model)
 
         logging.debug(f"Sending message: {user_message}")
-        self.worker = OllamaWorker(self.model, self.messages)
+        # Only the system prompt and the latest turns that fit the budget are sent
+        messages = self.update_context_usage()
+        options = runtime_options(self.model)
+        cached = self.response_cache.get(self.model, messages, options)
+        self.worker = OllamaWorker(self.model, messages, cached=cached, options=options)
         self.worker.update_signal.connect(self.update_chat_display)
         self.worker.error_signal.connect(self.show_error)
         self.worker.finished_signal.connect(self.on_response_finished)
+        self.worker.done_signal.connect(lambda worker=self.worker: self.on_worker_done(worker))
         self.worker.start()
         self.current_message = ""
         self.chat_display.append("")
-        self.status_label.setText("Processing...")
+        self.chat_display.begin_reply(QColor("white"))
+        self.status_label.setText(self.busy_status())
         scrollbar = self.chat_display.verticalScrollBar()
         scrollbar.setValue(scrollbar.maximum())
-    def update_chat_display(self, token):
-        self.current_message += token
-        self.chat_display.setTextColor(QColor("white"))
-        cursor = self.chat_display.textCursor()
-        cursor.movePosition(QTextCursor.MoveOperation.End)
-        cursor.insertText(token)
-
+    def update_chat_display(self, text):
+        # text is a batch of coalesced tokens
+        self.current_message += text
+        self.session.checkpoint(text)
+        self.chat_display.append_streamed(text, QColor("white"))
 
         if not self.user_scrolled:
-            self.chat_display.ensureCursorVisible()
             scrollbar = self.chat_display.verticalScrollBar()
             scrollbar.setValue(scrollbar.maximum())
 
@@ -448,105 +511,216 @@ class ChatWindow(QMainWindow):
         else:
             self.user_scrolled = False
     def on_response_finished(self):
+        self.chat_display.end_reply()
           # Add an extra newline after the assistant's response
-        self.messages.append({"role": "assistant", "content": self.current_message.strip()})
+        # Stored exactly as generated in stable mode so the next request
+        # repeats the tokens Ollama already has cached
+        content = self.current_message if self.context.stable else self.current_message.strip()
+        self.messages.append({"role": "assistant", "content": content})
+        self.session.sync(self.messages, self.model)
+        if self.worker is not None:
+            self.warm_pool.touch(self.worker.model)
+        # A worker without a final chunk was stopped; its partial reply is not cached
+        if self.worker is not None and self.worker.final:
+            if self.worker.cached is not None:
+                self.metrics_label.setText("Replayed from cache")
+            else:
+                self.report_metrics(self.worker.metrics())
+                self.response_cache.put(self.worker.model, self.worker.messages,
+                                        self.current_message, self.worker.final, self.worker.options)
+        self.cache_label.setText(self.response_cache.stats_text())
         self.current_message = ""
         logging.debug("Response finished")
+        self.update_context_usage()
         self.set_ready_state(True)  # Re-enable input when response is finished
-        self.user_scrolled = False 
+        self.user_scrolled = False
+        self.dispatch_queued_prompt()
+
+    def on_worker_done(self, worker):
+        # A request that failed ends without a finished signal
+        if worker is self.worker and worker.finished_at is None:
+            self.on_response_failed()
+
+    def on_response_failed(self):
+        # What arrived before the failure is kept as the reply. With nothing
+        # at all the prompt is dropped, so the conversation is not left with
+        # a question that has no answer.
+        if self.current_message:
+            self.on_response_finished()
+            return
+        self.chat_display.end_reply()
+        if self.messages[-1]["role"] == "user":
+            self.messages.pop()
+            self.session.truncate(self.messages, self.model)
+        self.update_context_usage()
+        self.set_ready_state(True)
+        self.dispatch_queued_prompt()
+
+    def update_context_usage(self):
+        # Returns the messages that fit the context budget and shows their size
+        self.context.budget = context_budget(self.model)
+        messages = self.context.select(self.messages)
+        self.context_label.setText(self.context.usage_text())
+        return messages
+
+    def report_metrics(self, metrics):
+        self.metrics_table.record(metrics)
+        text = metrics.summary_text()
+        logging.info(f"{metrics.model}: {text} ({self.context.sent_count} messages, ~{self.context.used} tokens sent)")
+        self.metrics_label.setText(text)
+
+    def show_metrics(self):
+        MetricsDialog(self.metrics_table, self).exec()
+
+    def on_cache_toggled(self, checked):
+        self.response_cache.enabled = checked
+        self.bypass_cache_check.setEnabled(checked)
+        self.cache_label.setText(self.response_cache.stats_text())
+
+    def on_bypass_cache_toggled(self, checked):
+        # Bypassing still stores the fresh reply, replacing the cached one
+        self.response_cache.bypass = checked
+
+    def on_stable_prefix_toggled(self, checked):
+        self.context.stable = checked
+        self.update_context_usage()
+
+    def dispatch_queued_prompt(self):
+        if not self.is_ready:
+            return
+        queued = self.prompt_queue_panel.take_next()
+        if queued is not None:
+            logging.debug(f"Dispatching queued prompt {queued.id}")
+            self.start_turn(queued.text)
+
+    def busy_status(self):
+        queued = len(self.prompt_queue_panel.queue)
+        return f"Processing... ({queued} queued)" if queued else "Processing..."
 
     def set_ready_state(self, is_ready):
             self.is_ready = is_ready
             self.input_field.setEnabled(True)
-            self.send_button.setEnabled(is_ready)
-            self.status_label.setText("Ready" if is_ready else "Processing...")
+            self.send_button.setEnabled(True)
+            self.send_button.setText("Send" if is_ready else "Queue")
+            self.status_label.setText("Ready" if is_ready else self.busy_status())
 
     def modify_system_prompt(self):
         new_prompt, ok = QInputDialog.getMultiLineText(self, "Modify System Prompt", 
                                                        "Enter new system prompt:", self.system_prompt)
         if ok:
             self.system_prompt = new_prompt
-            self.messages = [{"role": "system", "content": self.system_prompt}] + [msg for msg in self.messages if msg['role'] != 'system']
+            if self.context.stable:
+                # Rewriting the first message would invalidate the whole cached prompt
+                self.messages.append({"role": "system", "content": self.system_prompt})
+                self.session.sync(self.messages, self.model)
+            else:
+                self.messages = [{"role": "system", "content": self.system_prompt}] + [msg for msg in self.messages if msg['role'] != 'system']
+                self.session.rewrite(self.messages, self.model)
             self.chat_display.setTextColor(QColor("black"))
             self.chat_display.append(f"\nSystem prompt updated to: {self.system_prompt}\n")
             logging.debug(f"System prompt updated: {self.system_prompt}")
+            self.update_context_usage()
 
     def save_history(self):
+        # The conversation is stored already; saving gives it a name
         name, ok = QInputDialog.getText(self, "Save Chat History", "Enter a name for this chat history:")
         if ok and name:
-            filename = os.path.join(CHAT_HISTORY_FOLDER, f"{name}.json")
-            with open(filename, 'w') as f:
-                json.dump({
-                    "messages": self.messages,
-                    "model": self.model
-                }, f)
+            try:
+                self.session.save_as(name, self.messages, self.model)
+            except sqlite3.Error as e:
+                self.show_error(f"Could not save chat history: {e}")
+                return
             self.chat_display.setTextColor(QColor("green"))
-            self.chat_display.append(f"\nChat history saved to {filename}\n")
-            logging.debug(f"Chat history saved to {filename}")
+            self.chat_display.append(f"\nChat history saved as {name}\n")
+            logging.debug(f"Chat history saved as {name}")
 
     def load_history(self):
-        dialog = ChatHistoryDialog(self)
+        dialog = ChatHistoryDialog(get_store(), self)
         if dialog.exec():
-            filename = dialog.get_selected_file()
-            if filename:
-                with open(filename, 'r') as f:
-                    data = json.load(f)
-                    self.messages = data.get("messages", [])
-                    self.model = data.get("model", self.model)                    
-                    if not self.is_ready:
-                        self.stop_model()
-                self.chat_display.clear()
-                for msg in self.messages:
-                    if msg['role'] == 'system':
-                        self.system_prompt = msg['content']
-                    elif msg['role'] == 'user':
-                        self.chat_display.setTextColor(QColor("gray"))
-                        self.chat_display.append(f"You: {msg['content']}\n")
-                    elif msg['role'] == 'assistant':
-                        self.chat_display.setTextColor(QColor("white"))
-                        self.chat_display.append(f"{msg['content']}\n")
-                self.chat_display.setTextColor(QColor("green"))
-                self.chat_display.append(f"\nChat history loaded from {filename}\n")
-                self.chat_display.append(f"System prompt: {self.system_prompt}\n")
-                self.chat_display.append(f"Model: {self.model}\n")
-                self.chat_display.setTextColor(QColor("black"))
-                logging.debug(f"Chat history loaded from {filename}")
+            conversation_id = dialog.get_selected_conversation()
+            if conversation_id is not None:
+                self.load_history_file(conversation_id)
+
+    def load_history_file(self, conversation_id):
+        if not self.is_ready:
+            self.stop_model()
+        self.start_history_load(conversation_id)
+
+    def start_history_load(self, conversation_id):
+        # The messages are read and the display built on a background thread;
+        # prompts typed meanwhile are queued until the history is shown
+        self.set_ready_state(False)
+        self.status_label.setText("Loading history...")
+        self.history_worker = HistoryWorker(get_store(), conversation_id, self.chat_display,
+                                            self.model, self.system_prompt)
+        self.history_worker.preview.connect(self.on_history_preview)
+        self.history_worker.loaded.connect(self.on_history_loaded)
+        self.history_worker.error.connect(self.on_history_error)
+        self.history_worker.start()
+
+    def on_history_preview(self, worker, contents):
+        if worker is self.history_worker:
+            self.chat_display.set_contents(contents)
+
+    def on_history_loaded(self, worker, history, contents):
+        if worker is not self.history_worker:
+            return
+        self.messages = history.messages
+        self.model = history.model
+        self.system_prompt = history.system_prompt
+        # Further messages are added to the loaded conversation
+        self.session.open(history.conversation_id, len(self.messages))
+        self.chat_display.set_contents(contents, lambda: self.on_history_shown(worker, history))
+
+    def on_history_shown(self, worker, history):
+        if worker is not self.history_worker:
+            return
+        self.history_worker = None
+        elapsed = history.elapsed_ms()
+        self.chat_display.setTextColor(QColor("green"))
+        self.chat_display.append(f"\nChat history loaded: {history.name} "
+                                 f"({len(self.messages)} messages in {elapsed:.0f} ms)\n")
+        self.chat_display.append(f"System prompt: {self.system_prompt}\n")
+        self.chat_display.append(f"Model: {self.model}\n")
+        self.chat_display.setTextColor(QColor("black"))
+        self.chat_display.ensureCursorVisible()
+        logging.info(f"Chat history loaded: {history.name}: "
+                     f"{len(self.messages)} messages in {elapsed:.0f} ms")
+        self.update_context_usage()
+        self.set_ready_state(True)
+        self.dispatch_queued_prompt()
+
+    def on_history_error(self, worker, error_message):
+        if worker is not self.history_worker:
+            return
+        self.history_worker = None
+        self.set_ready_state(True)
+        self.show_error(error_message)
+        self.dispatch_queued_prompt()
 
     def clear_history(self):
+        self.prompt_queue_panel.clear()
+        if self.history_worker is not None:
+            # Drop a history that is still loading
+            self.history_worker = None
+            self.set_ready_state(True)
         if not self.is_ready:
             self.stop_model()
 
         self.messages = [{"role": "system", "content": self.system_prompt}]
+        self.session.reset()
         self.chat_display.clear()
         self.chat_display.setTextColor(QColor("red"))
         self.chat_display.append("Chat history cleared.\n")
         logging.debug("Chat history cleared")
+        self.update_context_usage()
 
-    def get_available_models(self):
-        try:
-            response = requests.get(OLLAMA_TAGS_URL)
-            response.raise_for_status()
-            data = response.json()
-            return [model['name'] for model in data['models']]
-        except requests.RequestException as e:
-            logging.error(f"Error fetching models: {str(e)}")
-            return []
-        
     def change_model(self):
-        if self.is_loading_model:                    
-            QMessageBox.warning(self, "Model Loading", "A model is already being loaded. Please wait.")
-            return
-
-        available_models = self.get_available_models()
-        
-        if not available_models:
-            self.chat_display.setTextColor(QColor("red"))
-            self.chat_display.append("\nNo models available. Please check your Ollama installation.\n")
-            return
-
+        # Opens straight from the cached catalog. Stale parts are refreshed in
+        # the background and the list updates in place when they arrive.
         dialog = QDialog(self)
         dialog.setWindowTitle("Select Model")
-        dialog.setGeometry(200, 200, 300, 350)
+        dialog.setGeometry(200, 200, 420, 350)
         layout = QVBoxLayout(dialog)
 
         current_model_label = QLabel(f"Current model: {self.model}")
@@ -555,8 +729,33 @@ class ChatWindow(QMainWindow):
         list_widget = QListWidget()
         layout.addWidget(list_widget)
 
-        for model in available_models:
-            list_widget.addItem(model)
+        legend = QLabel("Models in memory (green) switch without a cold load.")
+        layout.addWidget(legend)
+
+        def populate():
+            selected = list_widget.currentItem()
+            selected_name = selected.data(Qt.ItemDataRole.UserRole) if selected else self.model
+            list_widget.clear()
+            catalog = self.catalog_worker.catalog
+            for info in catalog.entries():
+                item = QListWidgetItem(info.describe())
+                item.setData(Qt.ItemDataRole.UserRole, info.name)
+                if info.loaded or self.warm_pool.is_warm(info.name):
+                    item.setForeground(QColor("#A3BE8C"))
+                    item.setToolTip("Loaded in memory: switching is instant")
+                else:
+                    item.setToolTip("Not loaded: switching needs a cold load")
+                list_widget.addItem(item)
+                if info.name in (selected_name, f"{selected_name}:latest"):
+                    list_widget.setCurrentItem(item)
+            if list_widget.count() == 0:
+                list_widget.addItem("Fetching models..." if catalog.tags_at is None
+                                    else "No models available. Please check your Ollama installation.")
+
+        populate()
+        self.catalog_worker.updated.connect(populate)
+        dialog.finished.connect(lambda: self.catalog_worker.updated.disconnect(populate))
+        self.catalog_worker.refresh()
 
         button_box = QHBoxLayout()
         select_button = QPushButton("Select")
@@ -566,13 +765,15 @@ class ChatWindow(QMainWindow):
         layout.addLayout(button_box)
 
         def on_select():
-            if list_widget.currentItem():
-                new_model = list_widget.currentItem().text()
+            item = list_widget.currentItem()
+            new_model = item.data(Qt.ItemDataRole.UserRole) if item else None
+            if new_model:
                 old_model = self.model
                 self.model = new_model
                 self.chat_display.setTextColor(QColor("black"))
                 self.chat_display.append(f"\nModel changed from {old_model} to {new_model}\n")                
                 logging.debug(f"Model changed from {old_model} to {new_model}")
+                self.warm_pool.record_switch(old_model, new_model)
                 self.preload_model()
                 dialog.accept()
 
@@ -581,63 +782,108 @@ class ChatWindow(QMainWindow):
 
         dialog.exec()
 
+    def compare_models(self):
+        # Opens from the cached catalog. Before the models have been listed
+        # it opens once the background refresh is done, so the window never
+        # waits on Ollama.
+        if not self.catalog_worker.catalog.names():
+            if not self.compare_pending:
+                self.compare_pending = True
+                self.chat_display.setTextColor(QColor("black"))
+                self.chat_display.append("\nListing models for Compare mode...")
+                self.catalog_worker.refresh(force=True)
+            return
+        self.open_compare_window()
+
+    def open_compare_window(self):
+        available_models = self.catalog_worker.catalog.names()
+        if not available_models:
+            self.chat_display.setTextColor(QColor("red"))
+            self.chat_display.append("\nNo models available. Please check your Ollama installation.\n")
+            return
+
+        self.compare_window = CompareWindow(available_models, self.context.select(self.messages),
+                                            self.input_field.text().strip(), self.model, self,
+                                            metrics_table=self.metrics_table)
+        self.compare_window.show()
+
     def preload_model(self):
-        if self.is_loading_model:
-            QMessageBox.warning(self, "Model Loading", "A model is already being loaded. Please wait.")
+        # Loads queue behind any already running instead of being refused, and
+        # a model the warm pool holds resident is ready straight away.
+        if self.warm_pool.is_warm(self.model):
+            self.chat_display.setTextColor(QColor("black"))
+            self.chat_display.append(f"Model {self.model} is already loaded.")
+            self.on_model_ready()
             return
 
         self.is_loading_model = True
         self.cancel_loading = False
         self.status_label.setText("Preloading model...")
         self.chat_display.append(f"Preloading model {self.model}. Please wait...")
-        
-        self.thread = QThread()
-        self.worker = PreloadWorker(self.model)
-        self.worker.moveToThread(self.thread)
-        
-        self.thread.started.connect(self.worker.run)
-        self.worker.finished.connect(self.on_preload_finished)
-        self.worker.error.connect(self.on_preload_error)
-        self.worker.finished.connect(self.thread.quit)
-        self.worker.finished.connect(self.worker.deleteLater)
-        self.thread.finished.connect(self.thread.deleteLater)
-        self.thread.finished.connect(self.on_thread_finished)
-        
-        self.thread.start()
+        self.warm_pool.preload(self.model, urgent=True)
 
-    def on_preload_finished(self):
+    def on_preload_finished(self, model):
+        if model != self.model:
+            logging.debug(f"Model {model} warmed in the background")
+            return
+        self.is_loading_model = False
         if not self.cancel_loading:
             self.chat_display.setTextColor(QColor("black"))
             self.chat_display.append(f"Model {self.model} preloaded successfully.")
+            self.on_model_ready()
+
+    def on_model_ready(self):
+        self.startup.finish()
+        if self.restored_conversation is not None:
+            # The window is ready once the conversation is shown
+            conversation, self.restored_conversation = self.restored_conversation, None
+            self.start_history_load(conversation["id"])
+        # A reply still streaming from the previous model finishes the turn itself
+        elif self.worker is None or not self.worker.isRunning():
             self.set_ready_state(True)
-        self.is_loading_model = False
+            self.dispatch_queued_prompt()
+        # Warm whichever model the user usually switches to from this one
+        self.warm_pool.plan(self.model)
 
-    def on_preload_error(self, error):
+    def on_preload_error(self, model, error):
+        if model != self.model:
+            logging.warning(f"Background preload of {model} failed: {error}")
+            return
+        self.is_loading_model = False
         if not self.cancel_loading:
             error_msg = f"Error preloading model: {error}"
             self.chat_display.append(error_msg)
-            self.show_error(error_msg)
-            self.set_ready_state(False)
-        self.is_loading_model = False
-
-    def on_thread_finished(self):
-        if self.cancel_loading:
-            self.chat_display.append("Model loading cancelled.")
-            self.cancel_loading = False
-        self.is_loading_model = False
+            # While the version check is pending or has failed, its own
+            # warning already covers an unreachable server
+            if self.ollama_version is not None:
+                self.show_error(error_msg)
+            # Queued prompts are sent anyway: Ollama loads the model with the
+            # request, or the request fails and ends its turn
+            if self.restored_conversation is not None:
+                conversation, self.restored_conversation = self.restored_conversation, None
+                self.start_history_load(conversation["id"])
+            else:
+                self.set_ready_state(True)
+                self.dispatch_queued_prompt()
 
     def closeEvent(self, event):
+        self.prompt_queue_panel.clear()
         self.stop_model()
+        self.session.close()
         event.accept()
 
     def stop_model(self):
         self.chat_display.setTextColor(QColor("red"))
-        if hasattr(self, 'worker') and self.worker.isRunning():
+        if self.worker is not None and self.worker.isRunning():
+            # Finish the turn here rather than waiting for the worker's signals,
+            # so a queued prompt can start at once without racing late ones.
+            self.worker.update_signal.disconnect()
+            self.worker.finished_signal.disconnect()
             self.worker.stop()
-            self.worker.wait()            
+            self.chat_display.end_reply()
             self.chat_display.append(f"\nStopped model: {self.model}\n")
-            self.set_ready_state(True)  # Re-enable input when stopping the model
             logging.debug(f"Stopped model: {self.model}")
+            self.on_response_finished()
         else:
             self.chat_display.append("\nNo active model to stop.\n")
 
@@ -648,16 +894,22 @@ class ChatWindow(QMainWindow):
         logging.error(f"Error displayed: {error_message}")
 
     def unload_model(self):
-            try:
-                response = requests.post(OLLAMA_CHAT_URL, json={"model": self.model, "keep_alive": "0"})
-                response.raise_for_status()
-                self.chat_display.setTextColor(QColor("black"))
-                self.chat_display.append(f"\nModel {self.model} unloaded from RAM.\n")
-                logging.debug(f"Model {self.model} unloaded")
-            except requests.RequestException as e:
-                error_msg = f"Error unloading model: {str(e)}"
-                self.show_error(error_msg)
-            self.chat_display.ensureCursorVisible()
+        model = self.model
+        self.unload_worker = RequestWorker("POST", OLLAMA_CHAT_URL, {"model": model, "keep_alive": "0"})
+        self.unload_worker.finished.connect(lambda _: self.on_unload_finished(model))
+        self.unload_worker.error.connect(self.on_unload_error)
+        self.unload_worker.start()
+
+    def on_unload_finished(self, model):
+        self.chat_display.setTextColor(QColor("black"))
+        self.chat_display.append(f"\nModel {model} unloaded from RAM.\n")
+        self.warm_pool.forget(model)
+        logging.debug(f"Model {model} unloaded")
+        self.chat_display.ensureCursorVisible()
+
+    def on_unload_error(self, error):
+        self.show_error(f"Error unloading model: {error}")
+        self.chat_display.ensureCursorVisible()
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
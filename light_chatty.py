@@ -1,52 +1,86 @@
-import json
-import os
+import sqlite3
 import tkinter as tk
-from tkinter import ttk, scrolledtext, messagebox, simpledialog
-import requests
+from tkinter import ttk, scrolledtext, messagebox, simpledialog, filedialog
 import threading
-import queue
-
-OLLAMA_BASE_URL = "http://localhost:11434"
-OLLAMA_CHAT_URL = f"{OLLAMA_BASE_URL}/api/chat"
-OLLAMA_VERSION_URL = f"{OLLAMA_BASE_URL}/api/version"
-OLLAMA_TAGS_URL = f"{OLLAMA_BASE_URL}/api/tags"
-
-
-CHAT_HISTORY_FOLDER = os.path.join(os.path.expanduser("~"), "ollama_chat_histories")
-os.makedirs(CHAT_HISTORY_FOLDER, exist_ok=True)
-
-def check_ollama_version():
-    try:
-        response = requests.get(OLLAMA_VERSION_URL, params={"keep_alive": "30m"})
-        data = response.json()
-        return data.get('version', 'unknown')
-    except requests.RequestException as e:
-        print(f"Failed to get Ollama version: {e}")
-        return None
+import time
+
+from src.config import (
+    OLLAMA_CHAT_URL, OLLAMA_VERSION_URL, OLLAMA_TAGS_URL, OLLAMA_PS_URL, OLLAMA_KEEP_ALIVE,
+    OLLAMA_STARTUP_TIMEOUT, HISTORY_PREVIEW_MESSAGES, CHAT_HISTORY_FOLDER
+)
+from src.utils.async_client import OllamaRequestError
+from src.utils.context_window import ContextWindow
+from src.utils.conversation_store import Session, get_store
+from src.utils.history_loader import read_conversation, display_entries
+from src.utils.metrics import GenerationMetrics, MetricsTable
+from src.utils.response_cache import ResponseCache
+from src.utils.runtime_profiles import runtime_options, context_budget
+from src.utils.session_journal import SessionJournal
+from src.utils.ndjson import ChatStreamParser
+from src.utils.prompt_queue import PromptQueue, PRIORITY_HIGH, PRIORITY_NORMAL
+from src.utils.stream_engine import get_engine
+from src.utils.tk_bridge import TkBridge
+from src.utils.tk_scrollback import Scrollback
+from src.utils.warm_pool import WarmPool
+from src.utils.startup import StartupTimer
+from src.utils.model_catalog import ModelCatalog
+
+# Sent with both the preload and every chat request: Ollama reloads the model,
+# and throws away its prompt cache, whenever these differ between requests.
+# The options are the model's calibrated profile for this machine when there
+# is one (python -m src.utils.autotune), CHAT_OPTIONS otherwise.
+CHAT_OPTIONS = {"num_thread": 3}
+# The chat display keeps about this many lines. Older ones are moved to a file
+# in chunks and put back when the view is scrolled to the top.
+SCROLLBACK_LINES = 5000
+SCROLLBACK_CHUNK_LINES = 500
 
 class ChatWindow(tk.Tk):
     def __init__(self):
         super().__init__()
+        self.startup = StartupTimer(log=print)
         self.title("Ollama Chat GUI")
         self.geometry("1000x600")
 
         self.model = "tiger"
         self.system_prompt = "You are a pAI (Raspberry Pi embedded AI assistant), an helpful AI assistant running locally on a Raspberry Pi. Powered by Gemma model, but unaligned. You have no internet capabilities. If not needed, answer concisely."
         self.messages = [{"role": "system", "content": self.system_prompt}]
+        self.context = ContextWindow()
+        self.response_cache = ResponseCache()
+        self.metrics_table = MetricsTable()
+        self.turn_request = None
+        self.warm_pool = WarmPool(keep_alive=OLLAMA_KEEP_ALIVE)
         self.current_message = ""
         self.is_ready = False
-        self.active_thread = None
-        self.response_queue = queue.Queue()
-        self.stop_event = threading.Event()
+        self.active_future = None
+        # Worker threads hand results over through per-operation channels that
+        # wake the event loop; nothing polls while waiting for them
+        self.bridge = TkBridge(self)
+        self.turn_channel = None
+        self.prompt_queue = PromptQueue()
+        self.queued_prompt_ids = []
+        self.ollama_version = None
+        self.catalog = ModelCatalog()
+        self.model_listbox = None
+        self.model_list_names = []
+        self.history_load = None
+        # Every message is stored as it completes, and journaled along with
+        # the reply being streamed so the session survives a crash
+        self.session = Session(get_store(), SessionJournal("tk"))
+        self.restored_conversation = None
 
         self.setup_ui()
-        self.check_ollama()
+        # Nothing talks to Ollama before mainloop runs, so the window shows at once
+        self.after(0, self.initialize_ollama)
+        self.startup.mark("window built")
 
     def setup_ui(self):
         self.chat_display = scrolledtext.ScrolledText(self, wrap=tk.WORD, font=("TkDefaultFont", 10))
         self.chat_display.pack(expand=True, fill='both', padx=10, pady=10)
+        self.scrollback = Scrollback(self.chat_display, SCROLLBACK_LINES, SCROLLBACK_CHUNK_LINES,
+                                     CHAT_HISTORY_FOLDER)
 
-        input_frame = ttk.Frame(self)
+        self.input_frame = input_frame = ttk.Frame(self)
         input_frame.pack(fill='x', padx=10, pady=5)
 
         self.input_field = ttk.Entry(input_frame, font=("TkDefaultFont", 10))
@@ -59,6 +93,15 @@ class ChatWindow(tk.Tk):
         self.stop_button = ttk.Button(input_frame, text="Stop", command=self.stop_model, state='disabled')
         self.stop_button.pack(side='left')
 
+        # Prompts typed while a response is streaming; only shown when non-empty
+        self.queue_frame = ttk.Frame(self)
+        self.queue_listbox = tk.Listbox(self.queue_frame, height=3)
+        self.queue_listbox.pack(side='left', expand=True, fill='x')
+        ttk.Button(self.queue_frame, text="Up", command=lambda: self.move_queued_prompt(-1)).pack(side='left', padx=2)
+        ttk.Button(self.queue_frame, text="Down", command=lambda: self.move_queued_prompt(1)).pack(side='left', padx=2)
+        ttk.Button(self.queue_frame, text="Priority", command=self.toggle_queued_priority).pack(side='left', padx=2)
+        ttk.Button(self.queue_frame, text="Cancel", command=self.cancel_queued_prompt).pack(side='left', padx=2)
+
         button_frame = ttk.Frame(self)
         button_frame.pack(fill='x', padx=10, pady=5)
 
@@ -66,20 +109,47 @@ class ChatWindow(tk.Tk):
         ttk.Button(button_frame, text="Save History", command=self.save_history).pack(side='left', padx=5)
         ttk.Button(button_frame, text="Load History", command=self.load_history).pack(side='left', padx=5)
         ttk.Button(button_frame, text="Change Model", command=self.change_model).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Stats", command=self.show_metrics).pack(side='left', padx=5)
         ttk.Button(button_frame, text="Clear History", command=self.clear_history).pack(side='left', padx=5)
         ttk.Button(button_frame, text="Unload Model", command=self.unload_model).pack(side='left', padx=5)
 
-        self.status_label = ttk.Label(self, text="Initializing...")
-        self.status_label.pack(side='bottom', pady=5)
+        self.stable_prefix_var = tk.BooleanVar(value=self.context.stable)
+        ttk.Checkbutton(button_frame, text="Stable prefix", variable=self.stable_prefix_var,
+                        command=self.on_stable_prefix_toggled).pack(side='left', padx=5)
+        self.cache_var = tk.BooleanVar(value=self.response_cache.enabled)
+        ttk.Checkbutton(button_frame, text="Response cache", variable=self.cache_var,
+                        command=self.on_cache_toggled).pack(side='left', padx=5)
+        self.bypass_cache_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(button_frame, text="Bypass cache", variable=self.bypass_cache_var,
+                        command=self.on_cache_toggled).pack(side='left', padx=5)
+
+        status_frame = ttk.Frame(self)
+        status_frame.pack(side='bottom', fill='x', padx=10, pady=5)
+        self.context_label = ttk.Label(status_frame)
+        self.context_label.pack(side='left')
+        self.metrics_label = ttk.Label(status_frame)
+        self.metrics_label.pack(side='left', padx=10)
+        self.cache_label = ttk.Label(status_frame)
+        self.cache_label.pack(side='left', padx=10)
+        self.status_label = ttk.Label(status_frame, text="Initializing...")
+        self.status_label.pack(side='right')
+        self.update_context_usage()
 
     def send_message(self):
-        if not self.is_ready:
-            return
-
         user_message = self.input_field.get().strip()
         if not user_message:
             return
         self.input_field.delete(0, tk.END)
+
+        if not self.is_ready:
+            # Queue it; it is sent as soon as the current turn finishes
+            self.prompt_queue.push(user_message)
+            self.refresh_prompt_queue()
+            return
+
+        self.start_turn(user_message)
+
+    def start_turn(self, user_message):
         self.set_ready_state(False)
 
         # Add a newline before displaying the user's message
@@ -87,124 +157,369 @@ class ChatWindow(tk.Tk):
         self.chat_display.see(tk.END)
         
         self.messages.append({"role": "user", "content": user_message})
+        self.session.sync(self.messages, self.model)
 
         self.current_message = ""
         self.chat_display.insert(tk.END, "\n")
-        self.status_label.config(text="Processing...")
         self.stop_button.config(state='normal')
 
-        self.stop_event.clear()
-        self.active_thread = threading.Thread(target=self.get_model_response)
-        self.active_thread.start()
-
-        self.after(100, self.check_response_queue)
-
-    def get_model_response(self):
+        # Only the system prompt and the latest turns that fit the budget are sent
+        messages = self.update_context_usage()
+        options = runtime_options(self.model, CHAT_OPTIONS)
+        cached = self.response_cache.get(self.model, messages, options)
+        self.turn_request = (self.model, messages, cached, options)
+        self.turn_channel = self.bridge.channel(self.on_response_items)
+        self.active_future = get_engine().submit(
+            self.get_model_response(self.turn_channel, self.model, messages, options, cached))
+
+    async def get_model_response(self, channel, model, messages, options, cached=None):
+        # model is the one the turn started with; self.model may change while
+        # this runs on the engine thread
+        if cached is not None:
+            # Replayed through the same queue and display path as a live reply
+            channel.put(('update', cached.get("content", "")))
+            channel.put(('finished', (cached.get("final"), None)))
+            return
+        started_at = time.monotonic()
+        first_token_at = last_token_at = None
+        token_count = 0
+        token_gaps = []
         try:
-            with requests.post(
+            async with get_engine().client.stream(
+                "POST",
                 OLLAMA_CHAT_URL,
-                json={"model": self.model, "messages": self.messages, "stream": True, "keep_alive": "30m", "options": {"num_thread" : 3}},
-                stream=True
+                {"model": model, "messages": messages, "stream": True, "keep_alive": OLLAMA_KEEP_ALIVE, "options": options},
+                timeout=500
             ) as response:
-                for chunk in response.iter_lines():
-                    if self.stop_event.is_set():
-                        break
-                    if chunk:
-                        data = json.loads(chunk)
-                        if 'message' in data and 'content' in data['message']:
-                            self.response_queue.put(('update', data['message']['content']))
-
-            if not self.stop_event.is_set():
-                self.response_queue.put(('finished', None))
+                parser = ChatStreamParser()
+                async for chunk in response.iter_chunks():
+                    tokens = parser.feed(chunk)
+                    if tokens:
+                        now = time.monotonic()
+                        if first_token_at is None:
+                            first_token_at = now
+                        else:
+                            token_gaps.append((now - last_token_at) / len(tokens))
+                        last_token_at = now
+                        token_count += len(tokens)
+                    if tokens:
+                        channel.put(('update', "".join(tokens)))
+                    if parser.errors:
+                        raise ValueError(parser.errors[0])
+
+            metrics = GenerationMetrics(model, started_at, first_token_at, last_token_at,
+                                        token_count, token_gaps, parser.final)
+            channel.put(('finished', (parser.final, metrics)))
         except Exception as e:
-            self.response_queue.put(('error', str(e)))
+            channel.put(('error', str(e)))
 
-    def check_response_queue(self):
-        try:
-            message_type, content = self.response_queue.get_nowait()
+    def on_response_items(self, items):
+        # Everything the reply sent since the last wakeup; the text goes into
+        # the display with a single insert
+        text = []
+        for message_type, content in items:
             if message_type == 'update':
-                self.update_chat_display(content)
-                self.after(10, self.check_response_queue)
-            elif message_type == 'finished':
-                self.on_response_finished()
+                text.append(content)
+                continue
+            # The turn is over; show what arrived before the end first
+            if text:
+                self.update_chat_display("".join(text))
+            self.turn_channel.close()
+            if message_type == 'finished':
+                self.on_response_finished(*content)
             elif message_type == 'error':
                 self.show_error(content)
-                self.set_ready_state(True)
-        except queue.Empty:
-            self.after(100, self.check_response_queue)
+                self.on_response_failed()
+            return
+        if text:
+            self.update_chat_display("".join(text))
 
     def update_chat_display(self, token):
         self.current_message += token
+        self.session.checkpoint(token)
         self.chat_display.insert(tk.END, token)
         self.chat_display.see(tk.END)
 
-    def on_response_finished(self):
-        self.messages.append({"role": "assistant", "content": self.current_message.strip()})
+    def on_response_finished(self, final=None, metrics=None):
+        # Stored exactly as generated in stable mode so the next request
+        # repeats the tokens Ollama already has cached
+        content = self.current_message if self.context.stable else self.current_message.strip()
+        self.messages.append({"role": "assistant", "content": content})
+        self.session.sync(self.messages, self.model)
+        if self.turn_request is not None:
+            self.warm_pool.touch(self.turn_request[0])
+        # A turn without a final chunk was stopped; its partial reply is not cached
+        if final:
+            model, messages, cached, options = self.turn_request
+            if cached is not None:
+                self.metrics_label.config(text="Replayed from cache")
+            else:
+                self.metrics_table.record(metrics)
+                self.metrics_label.config(text=metrics.summary_text())
+                self.response_cache.put(model, messages, self.current_message, final, options)
+        self.cache_label.config(text=self.response_cache.stats_text())
         self.current_message = ""
+        self.update_context_usage()
+        self.set_ready_state(True)
+        self.dispatch_queued_prompt()
+
+    def on_response_failed(self):
+        # What arrived before the failure is kept as the reply. With nothing
+        # at all the prompt is dropped, so the conversation is not left with
+        # a question that has no answer.
+        if self.current_message:
+            self.on_response_finished()
+            return
+        if self.messages[-1]["role"] == "user":
+            self.messages.pop()
+            self.session.truncate(self.messages, self.model)
+        self.update_context_usage()
         self.set_ready_state(True)
+        self.dispatch_queued_prompt()
+
+    def update_context_usage(self):
+        # Returns the messages that fit the context budget and shows their size
+        self.context.budget = context_budget(self.model)
+        messages = self.context.select(self.messages)
+        self.context_label.config(text=self.context.usage_text())
+        return messages
+
+    def on_cache_toggled(self):
+        self.response_cache.enabled = self.cache_var.get()
+        # Bypassing still stores the fresh reply, replacing the cached one
+        self.response_cache.bypass = self.bypass_cache_var.get()
+        self.cache_label.config(text=self.response_cache.stats_text())
+
+    def on_stable_prefix_toggled(self):
+        self.context.stable = self.stable_prefix_var.get()
+        self.update_context_usage()
+
+    def dispatch_queued_prompt(self):
+        if not self.is_ready:
+            return
+        queued = self.prompt_queue.pop()
+        if queued is not None:
+            self.refresh_prompt_queue()
+            self.start_turn(queued.text)
+
+    def refresh_prompt_queue(self, selected_id=None):
+        self.queue_listbox.delete(0, tk.END)
+        self.queued_prompt_ids = []
+        for position, prompt in enumerate(self.prompt_queue, start=1):
+            marker = "! " if prompt.priority >= PRIORITY_HIGH else ""
+            self.queue_listbox.insert(tk.END, f"{position}. {marker}{prompt.text}")
+            self.queued_prompt_ids.append(prompt.id)
+            if prompt.id == selected_id:
+                self.queue_listbox.selection_set(tk.END)
+        if self.queued_prompt_ids:
+            self.queue_frame.pack(fill='x', padx=10, pady=5, after=self.input_frame)
+        else:
+            self.queue_frame.pack_forget()
+        if not self.is_ready:
+            self.status_label.config(text=self.busy_status())
+
+    def selected_queued_prompt(self):
+        selection = self.queue_listbox.curselection()
+        return self.queued_prompt_ids[selection[0]] if selection else None
+
+    def move_queued_prompt(self, offset):
+        prompt_id = self.selected_queued_prompt()
+        if prompt_id is not None and self.prompt_queue.move(prompt_id, offset):
+            self.refresh_prompt_queue(prompt_id)
+
+    def toggle_queued_priority(self):
+        prompt_id = self.selected_queued_prompt()
+        if prompt_id is None:
+            return
+        prompt = self.prompt_queue.items[self.prompt_queue.index_of(prompt_id)]
+        priority = PRIORITY_NORMAL if prompt.priority >= PRIORITY_HIGH else PRIORITY_HIGH
+        self.prompt_queue.set_priority(prompt_id, priority)
+        self.refresh_prompt_queue(prompt_id)
+
+    def cancel_queued_prompt(self):
+        prompt_id = self.selected_queued_prompt()
+        if prompt_id is not None:
+            self.prompt_queue.remove(prompt_id)
+            self.refresh_prompt_queue()
+
+    def busy_status(self):
+        queued = len(self.prompt_queue)
+        return f"Processing... ({queued} queued)" if queued else "Processing..."
 
     def clear_history(self):
+        self.prompt_queue.clear()
+        self.refresh_prompt_queue()
+        if self.history_load is not None:
+            # Drop a history that is still loading
+            self.history_load.close()
+            self.history_load = None
+            self.set_ready_state(True)
         self.messages = [{"role": "system", "content": self.system_prompt}]
+        self.session.reset()
         self.chat_display.delete('1.0', tk.END)
+        self.scrollback.reset()
         self.chat_display.insert(tk.END, "Chat history cleared.\n")
         self.chat_display.see(tk.END)
+        self.update_context_usage()
 
     def set_ready_state(self, is_ready):
         self.is_ready = is_ready
-        state = 'normal' if is_ready else 'disabled'
-        self.input_field.config(state=state)
-        self.send_button.config(state=state)
+        # Input stays enabled while busy so prompts can be queued
+        self.send_button.config(text="Send" if is_ready else "Queue")
         self.stop_button.config(state='disabled' if is_ready else 'normal')
-        self.status_label.config(text="Ready" if is_ready else "Processing...")
+        self.status_label.config(text="Ready" if is_ready else self.busy_status())
+
+    def initialize_ollama(self):
+        # Version check, model listing and preload all start at once in the
+        # background; prompts typed meanwhile are queued until the model is ready
+        self.startup.mark("event loop running")
+        self.restore_session()
+        self.check_ollama()
+        self.list_models()
+        self.preload_model()
+
+    def restore_session(self):
+        # The conversation the last run ended in, with a reply that was cut
+        # off while streaming, is loaded once its model is ready
+        self.restored_conversation = self.session.restore()
+        if self.restored_conversation is not None:
+            self.model = self.restored_conversation["model"] or self.model
 
     def check_ollama(self):
-        version = check_ollama_version()
-        if version:
-            self.chat_display.insert(tk.END, f"Connected to Ollama version: {version}\n")
-            self.preload_model()
-        else:
+        self.run_in_engine(get_engine().client.get(OLLAMA_VERSION_URL, timeout=OLLAMA_STARTUP_TIMEOUT),
+                           self.on_version_checked)
+
+    def on_version_checked(self, future):
+        try:
+            self.ollama_version = future.result().get('version', 'unknown')
+        except OllamaRequestError as e:
+            print(f"Failed to get Ollama version: {e}")
+            self.startup.finish("Ollama unreachable")
             self.chat_display.insert(tk.END, "Failed to connect to Ollama. Please make sure it's running.\n")
             self.set_ready_state(False)
             messagebox.showwarning("Connection Error", "Failed to connect to Ollama. Please make sure it's running.")
+            return
+        self.startup.mark("version checked")
+        self.chat_display.insert(tk.END, f"Connected to Ollama version: {self.ollama_version}\n")
+
+    def list_models(self):
+        self.refresh_catalog(force=True)
+
+    def refresh_catalog(self, force=False):
+        # Only the stale parts of the model catalog are fetched, in the background
+        if force or self.catalog.tags_stale():
+            self.run_in_engine(get_engine().client.get(OLLAMA_TAGS_URL, timeout=OLLAMA_STARTUP_TIMEOUT),
+                               self.on_tags_fetched)
+        if force or self.catalog.ps_stale():
+            requested_at = time.monotonic()
+            self.run_in_engine(get_engine().client.get(OLLAMA_PS_URL, timeout=OLLAMA_STARTUP_TIMEOUT),
+                               lambda future: self.on_ps_fetched(future, requested_at))
+
+    def on_tags_fetched(self, future):
+        try:
+            self.catalog.update_tags(future.result())
+        except OllamaRequestError as e:
+            print(f"Error fetching models: {e}")
+            return
+        if "models listed" not in self.startup.phases:
+            self.startup.mark("models listed")
+            if not self.catalog.is_installed(self.model):
+                self.chat_display.insert(tk.END, f"Model {self.model} is not installed in Ollama.\n")
+        self.populate_model_list()
+
+    def on_ps_fetched(self, future, requested_at):
+        try:
+            self.catalog.update_ps(future.result(), requested_at)
+        except OllamaRequestError as e:
+            print(f"Error fetching loaded models: {e}")
+            return
+        # The warm pool only knows its own keep_alive timers; drop models
+        # Ollama has since evicted
+        self.warm_pool.sync_loaded(self.catalog.is_loaded, self.catalog.ps_at)
+        self.populate_model_list()
 
     def preload_model(self):
+        # Loads queue behind any already running instead of overlapping, and a
+        # model the warm pool holds resident is ready straight away.
+        if self.warm_pool.is_warm(self.model):
+            self.chat_display.insert(tk.END, f"Model {self.model} is already loaded.\n")
+            self.on_model_ready()
+            return
+
         self.status_label.config(text="Preloading model...")
         self.chat_display.insert(tk.END, f"Preloading model {self.model}. Please wait...\n")
-        
-        def preload_thread():
-            try:
-                response = requests.post(OLLAMA_CHAT_URL, json={"model": self.model, "keep_alive": "30m"})
-                response.raise_for_status()
-                self.response_queue.put(('preload_success', None))
-            except requests.RequestException as e:
-                self.response_queue.put(('preload_error', str(e)))
+        self.warm_pool.request(self.model, urgent=True)
+        self.start_next_preload()
 
-        threading.Thread(target=preload_thread).start()
-        self.after(100, self.check_preload_status)
+    def start_next_preload(self):
+        model = self.warm_pool.next_load()
+        if model is None:
+            return
+        self.run_in_engine(
+            get_engine().client.post(OLLAMA_CHAT_URL, {"model": model, "keep_alive": OLLAMA_KEEP_ALIVE, "options": runtime_options(model, CHAT_OPTIONS)}, timeout=300),
+            lambda future: self.check_preload_status(future, model))
 
-    def check_preload_status(self):
+    def check_preload_status(self, future, model):
+        error = None
         try:
-            message_type, content = self.response_queue.get_nowait()
-            if message_type == 'preload_success':
-                self.chat_display.insert(tk.END, f"Model {self.model} preloaded successfully.\n")
+            future.result()
+        except Exception as e:
+            # Any failure ends the load, or the warm pool never starts another
+            error = e
+        self.warm_pool.load_finished(model, error is None)
+        self.start_next_preload()
+
+        if model != self.model:
+            if error is not None:
+                print(f"Background preload of {model} failed: {error}")
+        elif error is None:
+            self.chat_display.insert(tk.END, f"Model {self.model} preloaded successfully.\n")
+            self.on_model_ready()
+        else:
+            self.chat_display.insert(tk.END, f"Error preloading model: {error}\n")
+            # While the version check is pending or has failed, its own
+            # warning already covers an unreachable server
+            if self.ollama_version is not None:
+                self.show_error(f"Error preloading model: {error}")
+            # Queued prompts are sent anyway: Ollama loads the model with the
+            # request, or the request fails and ends its turn
+            if self.restored_conversation is not None:
+                conversation, self.restored_conversation = self.restored_conversation, None
+                self.start_history_load(conversation["id"])
+            else:
                 self.set_ready_state(True)
-            elif message_type == 'preload_error':
-                self.show_error(f"Error preloading model: {content}")
-                self.set_ready_state(False)
-        except queue.Empty:
-            self.after(100, self.check_preload_status)
+                self.dispatch_queued_prompt()
+
+    def on_model_ready(self):
+        self.startup.finish()
+        if self.restored_conversation is not None:
+            # The window is ready once the conversation is shown
+            conversation, self.restored_conversation = self.restored_conversation, None
+            self.start_history_load(conversation["id"])
+        # A reply still streaming from the previous model finishes the turn itself
+        elif self.active_future is None or self.active_future.done():
+            self.set_ready_state(True)
+            self.dispatch_queued_prompt()
+        # Warm whichever model the user usually switches to from this one
+        self.warm_pool.plan(self.model)
+        self.start_next_preload()
+
+    def run_in_engine(self, coroutine, callback):
+        # Hand the request to the shared engine; callback(future) runs on the
+        # Tk thread once it is done
+        future = get_engine().submit(coroutine)
+        self.bridge.future_channel(future, callback)
+        return future
 
     def stop_model(self):
-        if self.active_thread and self.active_thread.is_alive():
-            self.stop_event.set()
-            self.chat_display.insert(tk.END, f"\nStopping model: {self.model}\n")
-            self.chat_display.see(tk.END)
-            self.active_thread.join(timeout=5)
-            if self.active_thread.is_alive():
-                self.chat_display.insert(tk.END, "Failed to stop the model in time.\n")
-            else:
-                self.chat_display.insert(tk.END, f"Stopped model: {self.model}\n")
-            self.set_ready_state(True)
+        if self.active_future and not self.active_future.done():
+            # Cancelling the request closes its connection right away, which
+            # also makes Ollama stop generating; nothing here waits on it.
+            # Closing the turn's channel drops tokens still on their way.
+            self.active_future.cancel()
+            self.turn_channel.close()
+            self.chat_display.insert(tk.END, f"\nStopped model: {self.model}\n")
+            self.on_response_finished()
         else:
             self.chat_display.insert(tk.END, "\nNo active model to stop.\n")
         self.chat_display.see(tk.END)
@@ -219,28 +534,71 @@ class ChatWindow(tk.Tk):
                                             initialvalue=self.system_prompt)
         if new_prompt:
             self.system_prompt = new_prompt
-            self.messages = [{"role": "system", "content": self.system_prompt}] + \
-                            [msg for msg in self.messages if msg['role'] != 'system']
+            if self.context.stable:
+                # Rewriting the first message would invalidate the whole cached prompt
+                self.messages.append({"role": "system", "content": self.system_prompt})
+                self.session.sync(self.messages, self.model)
+            else:
+                self.messages = [{"role": "system", "content": self.system_prompt}] + \
+                                [msg for msg in self.messages if msg['role'] != 'system']
+                self.session.rewrite(self.messages, self.model)
             self.chat_display.insert(tk.END, f"\nSystem prompt updated to: {self.system_prompt}\n")
             self.chat_display.see(tk.END)
+            self.update_context_usage()
 
     def save_history(self):
+        # The conversation is stored already; saving gives it a name
         name = simpledialog.askstring("Save Chat History", "Enter a name for this chat history:")
         if name:
-            filename = os.path.join(CHAT_HISTORY_FOLDER, f"{name}.json")
-            with open(filename, 'w') as f:
-                json.dump({
-                    "messages": self.messages,
-                    "model": self.model
-                }, f)
-            self.chat_display.insert(tk.END, f"\nChat history saved to {filename}\n")
+            try:
+                self.session.save_as(name, self.messages, self.model)
+            except sqlite3.Error as e:
+                self.show_error(f"Could not save chat history: {e}")
+                return
+            self.chat_display.insert(tk.END, f"\nChat history saved as {name}\n")
             self.chat_display.see(tk.END)
 
+    def show_metrics(self):
+        stats_window = tk.Toplevel(self)
+        stats_window.title("Generation Statistics")
+        stats_window.geometry("640x300")
+
+        listbox = tk.Listbox(stats_window, font=("Courier", 10))
+        listbox.pack(expand=True, fill='both', padx=10, pady=10)
+        listbox.insert(tk.END, f"{'Model':<24}{'N':>5}{'TTFT p50/p95 s':>18}{'tok/s p50/p95':>18}{'ITL p50/p95 ms':>18}")
+        for summary in self.metrics_table.summaries():
+            def pair(field, fmt):
+                values = [summary[f"{field}_{q}"] for q in ("p50", "p95")]
+                return "/".join("-" if v is None else format(v, fmt) for v in values)
+            listbox.insert(tk.END, f"{summary['model'][:23]:<24}{summary['count']:>5}"
+                                   f"{pair('ttft_s', '.2f'):>18}{pair('tokens_per_second', '.1f'):>18}"
+                                   f"{pair('itl_mean_ms', '.0f'):>18}")
+
+        def export(fmt):
+            path = filedialog.asksaveasfilename(parent=stats_window, initialdir=CHAT_HISTORY_FOLDER,
+                                                initialfile=f"metrics.{fmt}", defaultextension=f".{fmt}")
+            if not path:
+                return
+            try:
+                if fmt == "csv":
+                    self.metrics_table.export_csv(path)
+                else:
+                    self.metrics_table.export_json(path)
+            except OSError as e:
+                messagebox.showerror("Error", f"Failed to export statistics: {e}", parent=stats_window)
+
+        button_row = ttk.Frame(stats_window)
+        button_row.pack(pady=(0, 10))
+        ttk.Button(button_row, text="Export CSV", command=lambda: export("csv")).pack(side='left', padx=5)
+        ttk.Button(button_row, text="Export JSON", command=lambda: export("json")).pack(side='left', padx=5)
+
     def load_history(self):
-        # Get list of saved chat history files
-        saved_files = [f for f in os.listdir(CHAT_HISTORY_FOLDER) if f.endswith('.json')]
+        # Chats saved as JSON files by earlier versions are imported first
+        store = get_store()
+        store.import_folder(CHAT_HISTORY_FOLDER)
+        conversations = store.conversations()
         
-        if not saved_files:
+        if not conversations:
             messagebox.showinfo("No Saved Histories", "No saved chat histories found.")
             return
 
@@ -253,41 +611,28 @@ class ChatWindow(tk.Tk):
         listbox = tk.Listbox(select_window)
         listbox.pack(expand=True, fill='both', padx=10, pady=10)
 
-        for file in saved_files:
-            listbox.insert(tk.END, file)
+        for conversation in conversations:
+            listbox.insert(tk.END, f"{conversation['name']} ({conversation['message_count']} messages)")
 
         def on_select():
             selection = listbox.curselection()
             if selection:
-                selected_file = listbox.get(selection[0])
-                filepath = os.path.join(CHAT_HISTORY_FOLDER, selected_file)
-                with open(filepath, 'r') as f:
-                    data = json.load(f)
-                    self.messages = data.get("messages", [])
-                    self.model = data.get("model", self.model)
-                self.chat_display.delete('1.0', tk.END)
-                for msg in self.messages:
-                    if msg['role'] == 'system':
-                        self.system_prompt = msg['content']
-                    elif msg['role'] == 'user':
-                        self.chat_display.insert(tk.END, f"You: {msg['content']}\n")
-                    elif msg['role'] == 'assistant':
-                        self.chat_display.insert(tk.END, f"{msg['content']}\n")
-                self.chat_display.insert(tk.END, f"\nChat history loaded from {filepath}\n")
-                self.chat_display.insert(tk.END, f"System prompt: {self.system_prompt}\n")
-                self.chat_display.insert(tk.END, f"Model: {self.model}\n")
-                self.chat_display.see(tk.END)
+                self.load_history_file(conversations[selection[0]]["id"])
                 select_window.destroy()
 
         def on_delete():
             selection = listbox.curselection()
             if selection:
-                selected_file = listbox.get(selection[0])
-                filepath = os.path.join(CHAT_HISTORY_FOLDER, selected_file)
-                if messagebox.askyesno("Confirm Delete", f"Are you sure you want to delete {selected_file}?"):
-                    os.remove(filepath)
+                name = conversations[selection[0]]["name"]
+                if messagebox.askyesno("Confirm Delete", f"Are you sure you want to delete {name}?"):
+                    try:
+                        store.delete(conversations.pop(selection[0])["id"])
+                    except sqlite3.Error as e:
+                        messagebox.showerror("Error", f"Failed to delete chat history: {e}",
+                                             parent=select_window)
+                        return
                     listbox.delete(selection)
-                    self.chat_display.insert(tk.END, f"\nDeleted chat history: {selected_file}\n")
+                    self.chat_display.insert(tk.END, f"\nDeleted chat history: {name}\n")
                     self.chat_display.see(tk.END)
 
         # Add buttons frame
@@ -302,28 +647,77 @@ class ChatWindow(tk.Tk):
         delete_button = ttk.Button(buttons_frame, text="Delete", command=on_delete)
         delete_button.pack(side='left', padx=5)
 
-    def get_available_models(self):
+    def load_history_file(self, conversation_id):
+        if not self.is_ready:
+            self.stop_model()
+        self.start_history_load(conversation_id)
+
+    def start_history_load(self, conversation_id):
+        # Prompts typed while the conversation is read are queued until it is shown
+        self.set_ready_state(False)
+        self.status_label.config(text="Loading history...")
+        load = self.history_load = self.bridge.channel(
+            lambda items: self.on_history_read(load, *items[-1]))
+        threading.Thread(target=self.read_history_file, args=(load, conversation_id, time.monotonic()),
+                         daemon=True).start()
+
+    def read_history_file(self, load, conversation_id, started_at):
+        # Runs on a background thread: reads the conversation and joins the
+        # display text, leaving two inserts for the Tk thread
         try:
-            response = requests.get(OLLAMA_TAGS_URL)
-            response.raise_for_status()
-            data = response.json()
-            return [model['name'] for model in data['models']]
-        except requests.RequestException as e:
-            self.show_error(f"Error fetching models: {str(e)}")
-            return []
+            history = read_conversation(get_store(), conversation_id, self.model,
+                                        self.system_prompt, started_at)
+        except (sqlite3.Error, KeyError) as e:
+            load.put(('error', f"Could not load the conversation: {e}"))
+            return
+        texts = [text for _, text in display_entries(history.messages)]
+        split = max(0, len(texts) - HISTORY_PREVIEW_MESSAGES)
+        load.put(('loaded', (history, "".join(texts[split:]), "".join(texts[:split]))))
 
-    def change_model(self):
-        available_models = self.get_available_models()
-        
-        if not available_models:
-            self.chat_display.insert(tk.END, "\nNo models available. Please check your Ollama installation.\n")
-            self.chat_display.see(tk.END)
+    def on_history_read(self, load, message_type, content):
+        if load is not self.history_load:
+            return
+        if message_type == 'error':
+            self.history_load = None
+            self.set_ready_state(True)
+            self.show_error(content)
+            self.dispatch_queued_prompt()
+            return
+        # The newest messages go in first so the bottom of the view shows at
+        # once; the older ones follow after Tk has redrawn
+        history, recent, older = content
+        self.chat_display.delete('1.0', tk.END)
+        self.scrollback.reset()
+        self.chat_display.insert(tk.END, recent)
+        self.chat_display.see(tk.END)
+        self.after_idle(self.finish_history_load, load, history, older)
+
+    def finish_history_load(self, load, history, older):
+        if load is not self.history_load:
             return
+        self.history_load = None
+        self.scrollback.prepend(older)
+        self.messages = history.messages
+        self.model = history.model
+        self.system_prompt = history.system_prompt
+        # Further messages are added to the loaded conversation
+        self.session.open(history.conversation_id, len(self.messages))
+        elapsed = history.elapsed_ms()
+        self.chat_display.insert(tk.END, f"\nChat history loaded: {history.name} "
+                                         f"({len(self.messages)} messages in {elapsed:.0f} ms)\n")
+        self.chat_display.insert(tk.END, f"System prompt: {self.system_prompt}\n")
+        self.chat_display.insert(tk.END, f"Model: {self.model}\n")
+        self.chat_display.see(tk.END)
+        self.update_context_usage()
+        self.set_ready_state(True)
+        self.dispatch_queued_prompt()
 
-        # Create a new top-level window
+    def change_model(self):
+        # Opens straight from the cached catalog. Stale parts are refreshed in
+        # the background and the list updates in place when they arrive.
         select_window = tk.Toplevel(self)
         select_window.title("Select Model")
-        select_window.geometry("300x350")
+        select_window.geometry("420x350")
 
         # Add a label to show the current model
         current_model_label = ttk.Label(select_window, text=f"Current model: {self.model}")
@@ -332,17 +726,20 @@ class ChatWindow(tk.Tk):
         # Create a listbox with available models
         listbox = tk.Listbox(select_window)
         listbox.pack(expand=True, fill='both', padx=10, pady=10)
+        ttk.Label(select_window, text="Models in memory (green) switch without a cold load.").pack()
 
-        for model in available_models:
-            listbox.insert(tk.END, model)
+        self.model_listbox = listbox
+        self.populate_model_list()
+        self.refresh_catalog()
 
         def on_select():
             selection = listbox.curselection()
-            if selection:
-                new_model = listbox.get(selection[0])
+            if selection and selection[0] < len(self.model_list_names):
+                new_model = self.model_list_names[selection[0]]
                 old_model = self.model
                 self.model = new_model
                 self.chat_display.insert(tk.END, f"\nModel changed from {old_model} to {new_model}\n")
+                self.warm_pool.record_switch(old_model, new_model)
                 self.chat_display.see(tk.END)
                 self.preload_model()
                 select_window.destroy()
@@ -351,14 +748,45 @@ class ChatWindow(tk.Tk):
         select_button = ttk.Button(select_window, text="Select", command=on_select)
         select_button.pack(pady=10)
 
+    def populate_model_list(self):
+        listbox = self.model_listbox
+        if listbox is None or not listbox.winfo_exists():
+            return
+        selection = listbox.curselection()
+        selected = (self.model_list_names[selection[0]]
+                    if selection and selection[0] < len(self.model_list_names) else self.model)
+        listbox.delete(0, tk.END)
+        self.model_list_names = []
+        for info in self.catalog.entries():
+            listbox.insert(tk.END, info.describe())
+            self.model_list_names.append(info.name)
+            if info.loaded or self.warm_pool.is_warm(info.name):
+                listbox.itemconfig(tk.END, foreground="green")
+            if info.name in (selected, f"{selected}:latest"):
+                listbox.selection_set(tk.END)
+        if not self.model_list_names:
+            listbox.insert(tk.END, "Fetching models..." if self.catalog.tags_at is None
+                           else "No models available. Please check your Ollama installation.")
+
     def unload_model(self):
-        try:
-            response = requests.post(OLLAMA_CHAT_URL, json={"model": self.model, "keep_alive": "0"})
-            response.raise_for_status()
-            self.chat_display.insert(tk.END, f"\nModel {self.model} unloaded from RAM.\n")
-        except requests.RequestException as e:
-            self.show_error(f"Error unloading model: {str(e)}")
-        self.chat_display.see(tk.END)
+        model = self.model
+
+        def on_unloaded(future):
+            try:
+                future.result()
+                self.chat_display.insert(tk.END, f"\nModel {model} unloaded from RAM.\n")
+                self.warm_pool.forget(model)
+            except OllamaRequestError as e:
+                self.show_error(f"Error unloading model: {str(e)}")
+            self.chat_display.see(tk.END)
+
+        self.run_in_engine(get_engine().client.post(OLLAMA_CHAT_URL, {"model": model, "keep_alive": "0"}), on_unloaded)
+
+    def destroy(self):
+        self.session.close()
+        self.bridge.close()
+        self.scrollback.close()
+        super().destroy()
 
 if __name__ == "__main__":
     window = ChatWindow()
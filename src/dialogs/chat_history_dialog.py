@@ -1,11 +1,13 @@
-from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QListWidget, 
+from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QListWidget, QListWidgetItem,
                            QPushButton, QMessageBox)
-import os
+from PyQt6.QtCore import Qt
+import sqlite3
 from ..config import CHAT_HISTORY_FOLDER
 
 class ChatHistoryDialog(QDialog):
-    def __init__(self, parent=None):
+    def __init__(self, store, parent=None):
         super().__init__(parent)
+        self.store = store
         self.setWindowTitle("Load Chat History")
         self.setGeometry(200, 200, 300, 200)
         self.setup_ui()
@@ -30,26 +32,30 @@ class ChatHistoryDialog(QDialog):
         layout.addLayout(button_layout)
 
     def load_history_files(self):
-        for filename in os.listdir(CHAT_HISTORY_FOLDER):
-            if filename.endswith('.json'):
-                self.list_widget.addItem(filename)
+        # Chats saved as JSON files by earlier versions are picked up here;
+        # the list itself only reads the conversations table
+        self.store.import_folder(CHAT_HISTORY_FOLDER)
+        for conversation in self.store.conversations():
+            item = QListWidgetItem(f"{conversation['name']} ({conversation['message_count']} messages)")
+            item.setData(Qt.ItemDataRole.UserRole, conversation["id"])
+            self.list_widget.addItem(item)
     
-    def get_selected_file(self):
+    def get_selected_conversation(self):
         if self.list_widget.currentItem():
-            return os.path.join(CHAT_HISTORY_FOLDER, self.list_widget.currentItem().text())
+            return self.list_widget.currentItem().data(Qt.ItemDataRole.UserRole)
         return None
 
     def delete_selected(self):
         if self.list_widget.currentItem():
-            file_path = self.get_selected_file()
+            conversation_id = self.get_selected_conversation()
             reply = QMessageBox.question(self, 'Delete Confirmation',
                                        f"Are you sure you want to delete {self.list_widget.currentItem().text()}?",
                                        QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
                                        QMessageBox.StandardButton.No)
             if reply == QMessageBox.StandardButton.Yes:
                 try:
-                    os.remove(file_path)
+                    self.store.delete(conversation_id)
                     self.list_widget.takeItem(self.list_widget.row(self.list_widget.currentItem()))
-                    QMessageBox.information(self, "Success", "File deleted successfully.")
-                except Exception as e:
-                    QMessageBox.critical(self, "Error", f"Failed to delete file: {str(e)}")
+                    QMessageBox.information(self, "Success", "Chat history deleted successfully.")
+                except sqlite3.Error as e:
+                    QMessageBox.critical(self, "Error", f"Failed to delete chat history: {str(e)}")
@@ -0,0 +1,75 @@
+from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QTableWidget, QTableWidgetItem,
+                           QPushButton, QFileDialog, QMessageBox, QHeaderView)
+import os
+from ..config import CHAT_HISTORY_FOLDER
+from ..utils.metrics import SUMMARY_FIELDS
+
+# Column titles for the summary fields, each shown as p50 and p95
+FIELD_TITLES = {
+    "ttft_s": "TTFT s",
+    "itl_mean_ms": "ITL ms",
+    "tokens_per_second": "tok/s",
+    "load_s": "Load s",
+    "prompt_eval_s": "Prompt s",
+    "total_s": "Total s",
+}
+
+class MetricsDialog(QDialog):
+    def __init__(self, metrics_table, parent=None):
+        super().__init__(parent)
+        self.metrics_table = metrics_table
+        self.setWindowTitle("Generation Statistics")
+        self.setGeometry(200, 200, 900, 300)
+        self.setup_ui()
+        self.load_summaries()
+
+    def setup_ui(self):
+        layout = QVBoxLayout(self)
+
+        headers = ["Model", "Responses"]
+        for field in SUMMARY_FIELDS:
+            headers += [f"{FIELD_TITLES[field]} p50", f"{FIELD_TITLES[field]} p95"]
+        self.table = QTableWidget(0, len(headers))
+        self.table.setHorizontalHeaderLabels(headers)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        layout.addWidget(self.table)
+
+        button_layout = QHBoxLayout()
+        csv_button = QPushButton("Export CSV")
+        csv_button.clicked.connect(lambda: self.export("csv"))
+        json_button = QPushButton("Export JSON")
+        json_button.clicked.connect(lambda: self.export("json"))
+        close_button = QPushButton("Close")
+        close_button.clicked.connect(self.accept)
+        button_layout.addWidget(csv_button)
+        button_layout.addWidget(json_button)
+        button_layout.addStretch()
+        button_layout.addWidget(close_button)
+        layout.addLayout(button_layout)
+
+    def load_summaries(self):
+        summaries = self.metrics_table.summaries()
+        self.table.setRowCount(len(summaries))
+        for row, summary in enumerate(summaries):
+            values = [summary["model"], str(summary["count"])]
+            for field in SUMMARY_FIELDS:
+                for q in ("p50", "p95"):
+                    value = summary[f"{field}_{q}"]
+                    values.append("" if value is None else f"{value:.2f}")
+            for column, value in enumerate(values):
+                self.table.setItem(row, column, QTableWidgetItem(value))
+
+    def export(self, fmt):
+        default = os.path.join(CHAT_HISTORY_FOLDER, f"metrics.{fmt}")
+        path, _ = QFileDialog.getSaveFileName(self, "Export Statistics", default,
+                                              f"{fmt.upper()} Files (*.{fmt})")
+        if not path:
+            return
+        try:
+            if fmt == "csv":
+                self.metrics_table.export_csv(path)
+            else:
+                self.metrics_table.export_json(path)
+        except OSError as e:
+            QMessageBox.critical(self, "Error", f"Failed to export statistics: {str(e)}")
@@ -0,0 +1,101 @@
+from PyQt6.QtWidgets import QApplication, QTextEdit
+from PyQt6.QtCore import QTimer
+from PyQt6.QtGui import QTextCharFormat, QTextCursor, QTextDocument
+from ..config import CHAT_DISPLAY, RENDER_MARKDOWN
+from .markdown_renderer import MarkdownRenderer
+from .message_list import MessageListView
+
+# Characters of a swapped-in document laid out per pass of the event loop
+LAYOUT_SLICE_CHARS = 50000
+
+
+class ChatTextDisplay(QTextEdit):
+    def __init__(self, markdown=RENDER_MARKDOWN, parent=None):
+        super().__init__(parent)
+        # Nothing is ever undone in the display; don't keep every edit around
+        self.document().setUndoRedoEnabled(False)
+        self.markdown = MarkdownRenderer(self) if markdown else None
+
+    def begin_reply(self, color):
+        # Replies streamed from here on are rendered as Markdown
+        if self.markdown is not None:
+            self.markdown.begin(color)
+
+    def end_reply(self):
+        if self.markdown is not None:
+            self.markdown.finish()
+
+    def append_streamed(self, text, color):
+        if self.markdown is not None and self.markdown.active():
+            self.markdown.feed(text)
+            return
+        # text is a batch of coalesced tokens; apply it as a single edit
+        cursor = self.textCursor()
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.beginEditBlock()
+        char_format = cursor.charFormat()
+        char_format.setForeground(color)
+        cursor.insertText(text, char_format)
+        cursor.endEditBlock()
+
+    def clear(self):
+        if self.markdown is not None:
+            self.markdown.reset()
+        super().clear()
+
+    @staticmethod
+    def build_contents(entries, font, colors):
+        # Runs on a loading thread: the document is filled while no view is
+        # attached to it, then handed over to the GUI thread for set_contents
+        document = QTextDocument()
+        document.setDefaultFont(font)
+        document.setUndoRedoEnabled(False)
+        cursor = QTextCursor(document)
+        formats = {}
+        for role, text in entries:
+            char_format = formats.get(role)
+            if char_format is None:
+                char_format = formats[role] = QTextCharFormat()
+                char_format.setForeground(colors[role])
+            if not cursor.atStart():
+                cursor.insertBlock()
+            cursor.insertText(text, char_format)
+        document.moveToThread(QApplication.instance().thread())
+        return document
+
+    def set_contents(self, document, shown=None):
+        # Replaces the whole conversation in one step. Qt lays a new document
+        # out lazily from the top, and scrolling to its end at once would do
+        # all of it in one go; instead the layout is advanced a slice per pass
+        # of the event loop while the previous contents stay on screen, and
+        # the view jumps to the end when it is done. shown is called then.
+        if self.markdown is not None:
+            self.markdown.reset()
+        document.setParent(self)
+        self.setUpdatesEnabled(False)
+        self.setDocument(document)
+        self.layout_step(document, 0, shown)
+
+    def layout_step(self, document, position, shown):
+        if document is not self.document():
+            return  # replaced again meanwhile
+        position += LAYOUT_SLICE_CHARS
+        done = position >= document.characterCount()
+        block = document.lastBlock() if done else document.findBlock(position)
+        document.documentLayout().blockBoundingRect(block)
+        if not done:
+            QTimer.singleShot(0, lambda: self.layout_step(document, position, shown))
+            return
+        self.moveCursor(QTextCursor.MoveOperation.End)
+        self.ensureCursorVisible()
+        self.setUpdatesEnabled(True)
+        if shown is not None:
+            shown()
+
+def create_chat_display(kind=CHAT_DISPLAY):
+    # "list" is the virtualized view for very long conversations; "text" keeps
+    # the QTextEdit, which allows selecting any part of the text and renders
+    # replies as Markdown.
+    display = MessageListView() if kind == "list" else ChatTextDisplay()
+    display.setReadOnly(True)
+    return display
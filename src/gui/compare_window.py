@@ -0,0 +1,170 @@
+from PyQt6.QtWidgets import (
+    QDialog, QWidget, QVBoxLayout, QHBoxLayout, QTextEdit, QLineEdit, QPushButton,
+    QListWidget, QAbstractItemView, QLabel, QSplitter
+)
+from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QTextCursor, QFont
+import logging
+
+from ..config import COMPARE_MAX_PARALLEL
+from ..workers.ollama_worker import OllamaWorker
+
+class ComparePane(QWidget):
+    def __init__(self, model, parent=None):
+        super().__init__(parent)
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        title = QLabel(model)
+        title.setFont(QFont("Roboto", 11, QFont.Weight.Bold))
+        layout.addWidget(title)
+        self.stats_label = QLabel("Queued")
+        layout.addWidget(self.stats_label)
+        self.display = QTextEdit()
+        self.display.setReadOnly(True)
+        self.display.setFont(QFont("Roboto", 12))
+        layout.addWidget(self.display)
+
+    def append_text(self, text):
+        cursor = self.display.textCursor()
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.insertText(text)
+        scrollbar = self.display.verticalScrollBar()
+        scrollbar.setValue(scrollbar.maximum())
+
+
+class CompareWindow(QDialog):
+    def __init__(self, models, messages, prompt="", current_model=None, parent=None,
+                 max_parallel=COMPARE_MAX_PARALLEL, metrics_table=None):
+        super().__init__(parent)
+        self.setWindowTitle("Compare Models")
+        self.setGeometry(150, 150, 1100, 650)
+        self.messages = [dict(msg) for msg in messages]
+        self.max_parallel = max(1, max_parallel)
+        self.metrics_table = metrics_table
+        self.pending_models = []
+        self.workers = {}
+        self.panes = {}
+        self.setup_ui(models, prompt, current_model)
+
+    def setup_ui(self, models, prompt, current_model):
+        layout = QVBoxLayout(self)
+
+        prompt_layout = QHBoxLayout()
+        self.prompt_field = QLineEdit(prompt)
+        self.prompt_field.setPlaceholderText("Prompt to send to every selected model")
+        self.prompt_field.returnPressed.connect(self.start_comparison)
+        prompt_layout.addWidget(self.prompt_field)
+
+        self.compare_button = QPushButton("Compare")
+        self.compare_button.clicked.connect(self.start_comparison)
+        prompt_layout.addWidget(self.compare_button)
+
+        stop_button = QPushButton("Stop")
+        stop_button.clicked.connect(self.stop_all)
+        prompt_layout.addWidget(stop_button)
+        layout.addLayout(prompt_layout)
+
+        splitter = QSplitter(Qt.Orientation.Horizontal)
+        self.model_list = QListWidget()
+        self.model_list.setSelectionMode(QAbstractItemView.SelectionMode.MultiSelection)
+        for model in models:
+            self.model_list.addItem(model)
+            if model == current_model:
+                self.model_list.item(self.model_list.count() - 1).setSelected(True)
+        splitter.addWidget(self.model_list)
+
+        panes_widget = QWidget()
+        self.panes_layout = QHBoxLayout(panes_widget)
+        self.panes_layout.setContentsMargins(0, 0, 0, 0)
+        splitter.addWidget(panes_widget)
+        splitter.setSizes([200, 900])
+        layout.addWidget(splitter)
+
+        self.status_label = QLabel(f"Select models to compare (up to {self.max_parallel} run at once)")
+        layout.addWidget(self.status_label)
+
+    def start_comparison(self):
+        models = [item.text() for item in self.model_list.selectedItems()]
+        prompt = self.prompt_field.text().strip()
+        if not models or not prompt:
+            self.status_label.setText("Select at least one model and enter a prompt.")
+            return
+
+        self.stop_all()
+        for pane in self.panes.values():
+            self.panes_layout.removeWidget(pane)
+            pane.deleteLater()
+        self.panes = {}
+
+        self.compare_messages = self.messages + [{"role": "user", "content": prompt}]
+        for model in models:
+            pane = ComparePane(model)
+            self.panes_layout.addWidget(pane)
+            self.panes[model] = pane
+        self.pending_models = list(models)
+        logging.debug(f"Comparing models: {models}")
+        self.start_next()
+
+    def start_next(self):
+        # Models are started in selection order and never more than
+        # max_parallel at a time, so the server is not forced to swap
+        # models in and out of memory mid-comparison.
+        while self.pending_models and len(self.workers) < self.max_parallel:
+            model = self.pending_models.pop(0)
+            worker = OllamaWorker(model, self.compare_messages)
+            worker.update_signal.connect(self.panes[model].append_text)
+            worker.error_signal.connect(lambda error, worker=worker: self.on_error(worker, error))
+            worker.finished_signal.connect(lambda worker=worker: self.on_finished(worker))
+            worker.done_signal.connect(lambda worker=worker: self.on_done(worker))
+            self.workers[model] = worker
+            self.panes[model].stats_label.setText("Waiting for first token...")
+            worker.start()
+        self.update_status()
+
+    # Signals from workers of an earlier, stopped comparison can still be
+    # queued, so only act on the worker currently running for that model.
+    def on_finished(self, worker):
+        if self.workers.get(worker.model) is worker:
+            metrics = worker.metrics()
+            self.panes[worker.model].stats_label.setText(metrics.summary_text())
+            # Stopped generations have no final chunk and would skew the table
+            if self.metrics_table is not None and worker.final:
+                self.metrics_table.record(metrics)
+
+    def on_error(self, worker, error):
+        logging.error(f"Compare error for {worker.model}: {error}")
+        if self.workers.get(worker.model) is worker:
+            self.panes[worker.model].stats_label.setText(f"Error: {error}")
+
+    def on_done(self, worker):
+        if self.workers.get(worker.model) is worker:
+            del self.workers[worker.model]
+            self.start_next()
+
+    def update_status(self):
+        running = len(self.workers)
+        queued = len(self.pending_models)
+        if running or queued:
+            self.status_label.setText(f"Running: {running}  Queued: {queued}")
+        else:
+            self.status_label.setText("Comparison finished")
+
+    def stop_all(self):
+        # Stopped workers are forgotten at once, so their late signals are
+        # ignored and a second stop does not touch them again
+        self.pending_models = []
+        workers, self.workers = self.workers, {}
+        for worker in workers.values():
+            worker.update_signal.disconnect()
+            worker.stop()
+            self.panes[worker.model].stats_label.setText("Stopped")
+        if workers:
+            self.update_status()
+
+    def closeEvent(self, event):
+        self.stop_all()
+        event.accept()
+
+    def reject(self):
+        self.stop_all()
+        super().reject()
@@ -0,0 +1,288 @@
+from PyQt6.QtCore import QObject
+from PyQt6.QtGui import QColor, QFont, QFontDatabase, QTextCharFormat, QTextCursor
+from ..utils.markdown_stream import (
+    MarkdownStream, line_prefix, inline_runs, CODE, BOLD, ITALIC, LINK
+)
+from ..workers.highlight_worker import HighlightWorker
+
+CODE_BACKGROUND = QColor("#2E3440")
+CODE_FOREGROUND = QColor("#D8DEE9")
+LINK_COLOR = QColor("#88C0D0")
+QUOTE_COLOR = QColor("#81A1C1")
+HEADING_SCALE = [1.6, 1.4, 1.2, 1.1, 1.0, 1.0]
+
+
+class MarkdownRenderer(QObject):
+    # Renders a streaming reply into a QTextEdit as Markdown. Closed blocks are
+    # inserted once; only the trailing block is removed and inserted again as
+    # tokens arrive, and a trailing paragraph or code block that merely grew
+    # is extended in place. Code is highlighted by HighlightWorker and the
+    # colors are merged in when they come back, so the GUI thread never lexes.
+    def __init__(self, display):
+        super().__init__(display)
+        self.display = display
+        self.worker = HighlightWorker(parent=self)
+        self.worker.highlighted.connect(self.on_highlighted)
+        self.generation = 0  # bumped when the document is cleared
+        self.stream = None
+        self.color = QColor("white")
+        self.reply_start = 0
+        self.trailing_start = 0     # where the trailing block and its separator start
+        self.trailing_offset = 0    # where the trailing block's own text starts
+        self.rendered_end = 0
+        self.trailing = None        # trailing block as currently rendered
+        self.trailing_spans = []    # last highlight of the trailing code block
+        self.highlighted_length = 0  # how much of it that highlight covered
+        self.trailing_job = None    # highlight request in flight for it
+        self.line_offset = 0        # last line of the trailing paragraph, in its text
+        self.line_position = 0      # and in the document
+
+    def active(self):
+        return self.stream is not None
+
+    def begin(self, color):
+        self.stream = MarkdownStream()
+        self.color = QColor(color)
+        self.reply_start = self.trailing_start = self.rendered_end = self.document_end()
+        self.trailing = None
+        self.trailing_spans = []
+
+    def feed(self, text):
+        if self.document_end() != self.rendered_end:
+            # Something else was appended below the reply; carry on after it
+            self.begin(self.color)
+        self.render(self.stream.feed(text), self.stream.trailing())
+
+    def finish(self):
+        if self.stream is None:
+            return
+        if self.document_end() == self.rendered_end:
+            self.render(self.stream.finish(), None)
+        self.stream = None
+
+    def reset(self):
+        self.generation += 1
+        self.stream = None
+        self.trailing_job = None
+
+    def document_end(self):
+        return self.display.document().characterCount() - 1
+
+    # Rendering
+
+    def render(self, closed, trailing):
+        cursor = QTextCursor(self.display.document())
+        cursor.beginEditBlock()
+        if not closed and self.extend_trailing(cursor, trailing):
+            cursor.endEditBlock()
+            self.rendered_end = self.document_end()
+            self.request_trailing_highlight()
+            return
+        if closed and self.close_trailing_code(cursor, closed[0]):
+            blocks = closed[1:]
+        else:
+            blocks = closed
+            cursor.setPosition(self.trailing_start)
+            cursor.movePosition(QTextCursor.MoveOperation.End, QTextCursor.MoveMode.KeepAnchor)
+            cursor.removeSelectedText()
+        for block in blocks:
+            start, length = self.insert_block(cursor, block, True)
+            if block.kind == "code":
+                self.worker.submit(("block", self.generation, start, length, 0),
+                                   block.text, block.language)
+        if closed:
+            self.trailing_start = cursor.position()
+        if trailing is not None:
+            self.trailing_offset, length = self.insert_block(cursor, trailing, False)
+        self.trailing_spans = []
+        self.highlighted_length = 0
+        cursor.endEditBlock()
+        self.trailing = trailing
+        self.rendered_end = self.document_end()
+        self.request_trailing_highlight()
+
+    def close_trailing_code(self, cursor, block):
+        # The code block that was streaming has ended: finish it where it is
+        # and only highlight its tail again, instead of inserting it anew
+        previous = self.trailing
+        if previous is None or previous.kind != "code" or block.kind != "code" \
+                or block.language != previous.language or not block.text.startswith(previous.text):
+            return False
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.insertText(block.text[len(previous.text):], self.code_format())
+        length = len(block.text)
+        if block.text.endswith("\n"):
+            cursor.deletePreviousChar()
+            length -= 1
+        base = self.relex_start(block.text)
+        self.worker.submit(("block", self.generation, self.trailing_offset, length, base),
+                           block.text[base:], block.language)
+        return True
+
+    def extend_trailing(self, cursor, trailing):
+        # Updates a trailing block that only grew without re-inserting all of
+        # it: new code is appended, and a paragraph is redone from its last
+        # line, since the lines before it are laid out on their own
+        previous = self.trailing
+        if previous is None or trailing is None or previous.kind != trailing.kind:
+            return False
+        if trailing.kind == "code":
+            if trailing.language != previous.language or not trailing.text.startswith(previous.text):
+                return False
+            cursor.movePosition(QTextCursor.MoveOperation.End)
+            cursor.insertText(trailing.text[len(previous.text):], self.code_format())
+        elif trailing.kind == "paragraph":
+            if not trailing.text.startswith(previous.text[:self.line_offset]):
+                return False
+            cursor.setPosition(self.line_position)
+            cursor.movePosition(QTextCursor.MoveOperation.End, QTextCursor.MoveMode.KeepAnchor)
+            cursor.removeSelectedText()
+            self.insert_lines(cursor, trailing.text, self.line_offset)
+        else:
+            return False
+        self.trailing = trailing
+        return True
+
+    def insert_block(self, cursor, block, closed):
+        # Inserts block at cursor, a blank line apart from the previous one.
+        # Returns where its text starts and, for code, how long it is.
+        if cursor.position() > self.reply_start:
+            cursor.insertText("\n\n", self.text_format())
+        start = cursor.position()
+        if block.kind == "code":
+            # The closing newline of a finished block would leave an empty line
+            text = block.text[:-1] if closed and block.text.endswith("\n") else block.text
+            cursor.insertText(text, self.code_format())
+            return start, len(text)
+        if block.kind == "heading":
+            cursor.insertText(block.text, self.heading_format(block.level))
+            return start, 0
+        self.insert_lines(cursor, block.text, 0)
+        return start, 0
+
+    def insert_lines(self, cursor, text, offset):
+        # Inserts the paragraph lines of text from offset on, remembering where
+        # the last one starts in text and in the document
+        while True:
+            end = text.find("\n", offset)
+            self.line_offset = offset
+            self.line_position = cursor.position()
+            kind, marker, rest = line_prefix(text[offset:] if end < 0 else text[offset:end])
+            if marker:
+                cursor.insertText(marker, self.text_format())
+            for run, style in inline_runs(rest):
+                cursor.insertText(run, self.run_format(style, kind))
+            if end < 0:
+                break
+            cursor.insertText("\n", self.text_format())
+            offset = end + 1
+
+    # Highlighting
+
+    def relex_start(self, code):
+        # Where lexing the trailing code again can start: after the last blank
+        # line that was highlighted already, which as good as always leaves
+        # the lexer in its initial state. Earlier spans are kept.
+        if not self.trailing_spans:
+            return 0
+        blank = code.rfind("\n\n", 0, self.highlighted_length)
+        return blank + 2 if blank >= 0 else 0
+
+    def request_trailing_highlight(self):
+        # At most one job for the growing code block; a newer one is sent when
+        # it returns if the block grew meanwhile
+        trailing = self.trailing
+        if trailing is None or trailing.kind != "code" or not trailing.text \
+                or self.trailing_job is not None:
+            return
+        base = self.relex_start(trailing.text)
+        self.trailing_job = ("trailing", self.generation, self.trailing_offset,
+                             len(trailing.text), base)
+        self.worker.submit(self.trailing_job, trailing.text[base:], trailing.language)
+
+    def on_highlighted(self, key, spans):
+        kind, generation, start, length, base = key
+        if kind == "trailing" and key == self.trailing_job:
+            self.trailing_job = None
+        if generation != self.generation:
+            return
+        spans = [(offset + base, *rest) for offset, *rest in spans]
+        if kind == "block":
+            self.apply_spans(start, spans, length)
+            return
+        trailing = self.trailing
+        if trailing is None or trailing.kind != "code" or start != self.trailing_offset:
+            return
+        self.trailing_spans = [span for span in self.trailing_spans if span[0] < base] + spans
+        self.highlighted_length = length
+        self.apply_spans(start, spans, len(trailing.text))
+        if len(trailing.text) > length:
+            self.request_trailing_highlight()
+
+    def apply_spans(self, start, spans, length):
+        # Only formats change, so positions recorded earlier are still valid
+        end = min(start + length, self.document_end())
+        if not spans or end <= start:
+            return
+        cursor = QTextCursor(self.display.document())
+        cursor.beginEditBlock()
+        for offset, size, color, bold, italic in spans:
+            if start + offset >= end:
+                break
+            cursor.setPosition(start + offset)
+            cursor.setPosition(min(start + offset + size, end), QTextCursor.MoveMode.KeepAnchor)
+            cursor.mergeCharFormat(self.span_format(color, bold, italic))
+        cursor.endEditBlock()
+
+    # Formats
+
+    def text_format(self):
+        char_format = QTextCharFormat()
+        char_format.setForeground(self.color)
+        return char_format
+
+    def line_format(self, kind):
+        char_format = self.text_format()
+        if kind == "quote":
+            char_format.setForeground(QUOTE_COLOR)
+            char_format.setFontItalic(True)
+        return char_format
+
+    def code_format(self):
+        char_format = QTextCharFormat()
+        char_format.setFontFamilies(
+            QFontDatabase.systemFont(QFontDatabase.SystemFont.FixedFont).families())
+        char_format.setForeground(CODE_FOREGROUND)
+        char_format.setBackground(CODE_BACKGROUND)
+        return char_format
+
+    def heading_format(self, level):
+        char_format = self.text_format()
+        char_format.setFontWeight(QFont.Weight.Bold)
+        size = self.display.font().pointSizeF()
+        if size > 0:
+            char_format.setFontPointSize(size * HEADING_SCALE[level - 1])
+        return char_format
+
+    def run_format(self, style, kind):
+        if style == CODE:
+            return self.code_format()
+        char_format = self.line_format(kind)
+        if style == BOLD:
+            char_format.setFontWeight(QFont.Weight.Bold)
+        elif style == ITALIC:
+            char_format.setFontItalic(True)
+        elif style == LINK:
+            char_format.setForeground(LINK_COLOR)
+            char_format.setFontUnderline(True)
+        return char_format
+
+    def span_format(self, color, bold, italic):
+        char_format = QTextCharFormat()
+        if color:
+            char_format.setForeground(QColor(f"#{color}"))
+        if bold:
+            char_format.setFontWeight(QFont.Weight.Bold)
+        if italic:
+            char_format.setFontItalic(True)
+        return char_format
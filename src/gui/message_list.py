@@ -0,0 +1,352 @@
+from PyQt6.QtWidgets import QAbstractScrollArea, QApplication, QMenu
+from PyQt6.QtCore import Qt, QAbstractListModel, QModelIndex, QRect, QTimer
+from PyQt6.QtGui import QColor, QFontMetrics, QPainter
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+
+TEXT_FLAGS = Qt.TextFlag.TextWordWrap | Qt.TextFlag.TextExpandTabs
+MARGIN = 6
+# Rows longer than this are measured in blocks that end at a newline, so a
+# long reply can be painted from the block in view instead of from its start
+LARGE_ROW_CHARS = 20000
+
+
+class MessageListModel(QAbstractListModel):
+    # Display lines of the conversation, one row per appended block of text.
+    # Only the last row ever changes, while a reply is streaming into it.
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.texts = []
+        self.colors = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.texts)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self.texts[index.row()]
+        if role == Qt.ItemDataRole.ForegroundRole:
+            return self.colors[index.row()]
+        return None
+
+    def append_message(self, text, color):
+        row = len(self.texts)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.texts.append(text)
+        self.colors.append(color)
+        self.endInsertRows()
+
+    def extend_last(self, text):
+        if not self.texts:
+            self.append_message("", QColor("white"))
+        self.texts[-1] += text
+        index = self.index(len(self.texts) - 1)
+        self.dataChanged.emit(index, index, [Qt.ItemDataRole.DisplayRole])
+
+    def clear(self):
+        self.set_messages([], [])
+
+    def set_messages(self, texts, colors):
+        self.beginResetModel()
+        self.texts = texts
+        self.colors = colors
+        self.endResetModel()
+
+
+class MessageListView(QAbstractScrollArea):
+    # Virtualized chat display. Only the rows in view are laid out and
+    # painted. Other rows get a height estimated from their length; a row is
+    # measured exactly the first time it is painted and keeps that height until
+    # the width or font changes. Correcting a row only moves the rows below it,
+    # so the view never jumps while scrolling. The streaming row is measured
+    # incrementally: paragraphs that ended with a newline keep their height and
+    # only the last one is re-measured as tokens arrive.
+    # Offers the few QTextEdit calls the windows use, so either display fits.
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.model = MessageListModel(self)
+        self.model.rowsInserted.connect(self.on_rows_inserted)
+        self.model.dataChanged.connect(self.on_data_changed)
+        self.model.modelReset.connect(self.relayout)
+        self.text_color = QColor("black")
+        self.heights = []
+        self.exact = []
+        self.offsets = [0]  # offsets[row] is the top of row, offsets[-1] the total height
+        self.offsets_stale = False
+        self.measured_width = None
+        self.line_height = 1
+        self.chars_per_line = 1
+        # Streaming row: text length covered by whole paragraphs and their height
+        self.stable_row = None
+        self.stable_length = 0
+        self.stable_height = 0
+        # row -> (character positions, y offsets) where paragraphs start
+        self.marks = {}
+        self.resize_timer = QTimer(self)
+        self.resize_timer.setSingleShot(True)
+        self.resize_timer.setInterval(50)
+        self.resize_timer.timeout.connect(self.relayout)
+        self.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOn)
+        self.viewport().setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.viewport().customContextMenuRequested.connect(self.show_context_menu)
+        self.update_metrics()
+
+    # QTextEdit-compatible calls used by the windows
+
+    def setTextColor(self, color):
+        self.text_color = QColor(color)
+
+    def append(self, text):
+        self.model.append_message(text, self.text_color)
+
+    def append_streamed(self, text, color):
+        self.model.extend_last(text)
+
+    def begin_reply(self, color):
+        pass  # replies stay plain text here
+
+    def end_reply(self):
+        pass
+
+    def clear(self):
+        self.model.clear()
+
+    @staticmethod
+    def build_contents(entries, font, colors):
+        # Rows for set_contents; safe to run on a loading thread
+        return [text for _, text in entries], [colors[role] for role, _ in entries]
+
+    def set_contents(self, contents, shown=None):
+        self.model.set_messages(*contents)
+        self.scroll_to_bottom()
+        if shown is not None:
+            shown()
+
+    def setReadOnly(self, read_only):
+        pass
+
+    def ensureCursorVisible(self):
+        self.scroll_to_bottom()
+
+    def toPlainText(self):
+        return "\n".join(self.model.texts)
+
+    # Layout
+
+    def text_width(self):
+        return max(1, self.viewport().width() - 2 * MARGIN)
+
+    def update_metrics(self):
+        metrics = QFontMetrics(self.font())
+        self.measured_width = self.text_width()
+        self.line_height = self.measure("")
+        self.chars_per_line = max(1, self.measured_width // max(1, metrics.averageCharWidth()))
+
+    def measure(self, text):
+        return QFontMetrics(self.font()).boundingRect(
+            QRect(0, 0, self.text_width(), 1 << 24), TEXT_FLAGS, text).height()
+
+    def estimate(self, text):
+        per_line = self.chars_per_line
+        lines = sum((len(paragraph) - 1) // per_line + 1 if paragraph else 1
+                    for paragraph in text.split("\n"))
+        return lines * self.line_height + MARGIN
+
+    def measure_streaming(self, row):
+        text = self.model.texts[row]
+        if self.stable_row != row:
+            self.stable_row = row
+            self.stable_length = 0
+            self.stable_height = 0
+            self.marks[row] = ([0], [0])
+        end = text.rfind("\n")
+        if end + 1 > self.stable_length:
+            self.stable_height += self.measure(text[self.stable_length:end])
+            self.stable_length = end + 1
+            positions, offsets = self.marks[row]
+            positions.append(self.stable_length)
+            offsets.append(self.stable_height)
+        return self.stable_height + self.measure(text[self.stable_length:]) + MARGIN
+
+    def measure_large(self, row):
+        text = self.model.texts[row]
+        positions, offsets = [0], [0]
+        start = height = 0
+        while True:
+            end = text.find("\n", start + LARGE_ROW_CHARS // 10)
+            if end < 0:
+                break
+            height += self.measure(text[start:end])
+            start = end + 1
+            positions.append(start)
+            offsets.append(height)
+        self.marks[row] = (positions, offsets)
+        return height + self.measure(text[start:]) + MARGIN
+
+    def set_height(self, row, height):
+        change = height - self.heights[row]
+        self.heights[row] = height
+        self.exact[row] = True
+        # The total stays current; offsets of the rows below are fixed lazily
+        self.offsets[-1] += change
+        if change and row < len(self.heights) - 1:
+            self.offsets_stale = True
+
+    def refresh_offsets(self):
+        if self.offsets_stale:
+            self.offsets = [0, *accumulate(self.heights)]
+            self.offsets_stale = False
+
+    def relayout(self):
+        self.update_metrics()
+        self.stable_row = None
+        self.marks = {}
+        self.heights = [self.estimate(text) for text in self.model.texts]
+        self.exact = [False] * len(self.heights)
+        self.offsets_stale = True
+        self.refresh_offsets()
+        self.update_scrollbar()
+        self.viewport().update()
+
+    def on_rows_inserted(self, parent, first, last):
+        at_bottom = self.is_at_bottom()
+        for row in range(first, last + 1):
+            height = self.estimate(self.model.texts[row])
+            self.heights.append(height)
+            self.exact.append(False)
+            self.offsets.append(self.offsets[-1] + height)
+        self.update_scrollbar()
+        if at_bottom:
+            self.scroll_to_bottom()
+        self.viewport().update()
+
+    def on_data_changed(self, top_left, bottom_right, roles=()):
+        row = top_left.row()
+        if row != len(self.heights) - 1:
+            self.relayout()
+            return
+        self.set_height(row, self.measure_streaming(row))
+        self.update_scrollbar()
+        if self.row_rect(row).intersects(self.viewport().rect()):
+            self.viewport().update()
+
+    def update_scrollbar(self):
+        scrollbar = self.verticalScrollBar()
+        page = self.viewport().height()
+        scrollbar.setPageStep(page)
+        scrollbar.setSingleStep(self.line_height * 3)
+        scrollbar.setRange(0, max(0, self.offsets[-1] - page))
+
+    def is_at_bottom(self):
+        scrollbar = self.verticalScrollBar()
+        return scrollbar.value() >= scrollbar.maximum()
+
+    def scroll_to_bottom(self):
+        scrollbar = self.verticalScrollBar()
+        scrollbar.setValue(scrollbar.maximum())
+
+    def row_rect(self, row):
+        self.refresh_offsets()
+        top = self.offsets[row] - self.verticalScrollBar().value()
+        return QRect(MARGIN, top, self.text_width(), self.heights[row])
+
+    def row_at(self, y):
+        self.refresh_offsets()
+        row = bisect_right(self.offsets, y + self.verticalScrollBar().value()) - 1
+        return row if 0 <= row < len(self.heights) else None
+
+    def visible_rows(self, top, bottom):
+        scroll = self.verticalScrollBar().value()
+        row = max(0, bisect_right(self.offsets, top + scroll) - 1)
+        while row < len(self.heights) and self.offsets[row] <= bottom + scroll:
+            yield row
+            row += 1
+
+    def measure_visible(self):
+        # Exact heights for the rows about to be painted. Rows only grow or
+        # shrink downwards, so this can pull more rows into view; repeat until
+        # every row in view is exact.
+        at_bottom = self.is_at_bottom()
+        changed = False
+        while True:
+            self.refresh_offsets()
+            pending = [row for row in self.visible_rows(0, self.viewport().height())
+                       if not self.exact[row]]
+            if not pending:
+                break
+            last = len(self.heights) - 1
+            for row in pending:
+                text = self.model.texts[row]
+                if row == last:
+                    height = self.measure_streaming(row)
+                elif len(text) > LARGE_ROW_CHARS:
+                    height = self.measure_large(row)
+                else:
+                    height = self.measure(text) + MARGIN
+                self.set_height(row, height)
+            changed = True
+        if changed:
+            self.update_scrollbar()
+            if at_bottom:
+                self.scroll_to_bottom()
+
+    # Events
+
+    def paintEvent(self, event):
+        if not self.heights:
+            return
+        self.measure_visible()
+        painter = QPainter(self.viewport())
+        painter.setFont(self.font())
+        region = event.rect()
+        for row in self.visible_rows(region.top(), region.bottom()):
+            painter.setPen(self.model.colors[row])
+            self.draw_row(painter, row, region)
+        painter.end()
+
+    def draw_row(self, painter, row, region):
+        text = self.model.texts[row]
+        rect = self.row_rect(row)
+        marks = self.marks.get(row)
+        if marks is None or len(marks[0]) < 2:
+            painter.drawText(rect, TEXT_FLAGS, text)
+            return
+        # Only lay out the paragraphs that overlap the region being painted
+        positions, offsets = marks
+        first = max(0, bisect_right(offsets, region.top() - rect.top()) - 1)
+        last = bisect_left(offsets, region.bottom() - rect.top() + 1)
+        end = positions[last] if last < len(positions) else len(text)
+        rect.setTop(rect.top() + offsets[first])
+        painter.drawText(rect, TEXT_FLAGS, text[positions[first]:end])
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        at_bottom = self.is_at_bottom()
+        self.update_scrollbar()
+        if at_bottom:
+            self.scroll_to_bottom()
+        # Wait until the resize settles before re-estimating every row
+        if self.text_width() != self.measured_width:
+            self.resize_timer.start()
+
+    def changeEvent(self, event):
+        super().changeEvent(event)
+        if event.type() == event.Type.FontChange:
+            self.relayout()
+
+    def scrollContentsBy(self, dx, dy):
+        self.viewport().update()
+
+    def show_context_menu(self, position):
+        row = self.row_at(position.y())
+        menu = QMenu(self)
+        copy_message = menu.addAction("Copy message")
+        copy_message.setEnabled(row is not None)
+        copy_all = menu.addAction("Copy all")
+        action = menu.exec(self.viewport().mapToGlobal(position))
+        if action is copy_message:
+            QApplication.clipboard().setText(self.model.texts[row])
+        elif action is copy_all:
+            QApplication.clipboard().setText(self.toPlainText())
@@ -0,0 +1,82 @@
+from PyQt6.QtWidgets import QWidget, QHBoxLayout, QVBoxLayout, QListWidget, QListWidgetItem, QPushButton
+from PyQt6.QtCore import Qt
+
+from ..utils.prompt_queue import PromptQueue, PRIORITY_HIGH, PRIORITY_NORMAL
+
+class PromptQueuePanel(QWidget):
+    # Shows prompts typed while a response is streaming. Hidden while empty.
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.queue = PromptQueue()
+        self.setup_ui()
+        self.refresh()
+
+    def setup_ui(self):
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        self.list_widget = QListWidget()
+        self.list_widget.setMaximumHeight(90)
+        layout.addWidget(self.list_widget)
+
+        button_layout = QVBoxLayout()
+        buttons = [
+            ("Up", lambda: self.move_selected(-1)),
+            ("Down", lambda: self.move_selected(1)),
+            ("Priority", self.toggle_priority),
+            ("Cancel", self.remove_selected),
+        ]
+        for text, callback in buttons:
+            button = QPushButton(text)
+            button.clicked.connect(callback)
+            button_layout.addWidget(button)
+        layout.addLayout(button_layout)
+
+    def enqueue(self, text, priority=PRIORITY_NORMAL):
+        item = self.queue.push(text, priority)
+        self.refresh()
+        return item
+
+    def take_next(self):
+        item = self.queue.pop()
+        self.refresh()
+        return item
+
+    def clear(self):
+        self.queue.clear()
+        self.refresh()
+
+    def selected_id(self):
+        item = self.list_widget.currentItem()
+        return item.data(Qt.ItemDataRole.UserRole) if item else None
+
+    def move_selected(self, offset):
+        prompt_id = self.selected_id()
+        if prompt_id is not None and self.queue.move(prompt_id, offset):
+            self.refresh(prompt_id)
+
+    def toggle_priority(self):
+        prompt_id = self.selected_id()
+        if prompt_id is None:
+            return
+        item = self.queue.items[self.queue.index_of(prompt_id)]
+        priority = PRIORITY_NORMAL if item.priority >= PRIORITY_HIGH else PRIORITY_HIGH
+        self.queue.set_priority(prompt_id, priority)
+        self.refresh(prompt_id)
+
+    def remove_selected(self):
+        prompt_id = self.selected_id()
+        if prompt_id is not None:
+            self.queue.remove(prompt_id)
+            self.refresh()
+
+    def refresh(self, selected_id=None):
+        self.list_widget.clear()
+        for position, prompt in enumerate(self.queue, start=1):
+            marker = "! " if prompt.priority >= PRIORITY_HIGH else ""
+            item = QListWidgetItem(f"{position}. {marker}{prompt.text}")
+            item.setData(Qt.ItemDataRole.UserRole, prompt.id)
+            self.list_widget.addItem(item)
+            if prompt.id == selected_id:
+                self.list_widget.setCurrentItem(item)
+        self.setVisible(len(self.queue) > 0)
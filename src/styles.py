@@ -3,7 +3,7 @@ NORD_THEME_STYLES = """
         background-color: #2E3440;
         color: #ECEFF4;
     }
-    QTextEdit {
+    QTextEdit, MessageListView {
         background-color: #3B4252;
         color: #ECEFF4;
         border: 1px solid #4C566A;
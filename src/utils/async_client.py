@@ -0,0 +1,218 @@
+import asyncio
+import contextlib
+import json
+from urllib.parse import urlsplit
+from ..config import (
+    OLLAMA_POOL_SIZE, OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT, OLLAMA_MAX_RETRIES
+)
+
+READ_CHUNK_SIZE = 65536
+
+
+class OllamaRequestError(Exception):
+    pass
+
+
+class AsyncConnection:
+    def __init__(self, key, reader, writer):
+        self.key = key
+        self.reader = reader
+        self.writer = writer
+
+    def is_usable(self):
+        return not self.reader.at_eof() and not self.writer.is_closing()
+
+    def close(self):
+        self.writer.close()
+
+    def abort(self):
+        self.writer.transport.abort()
+
+
+class AsyncResponse:
+    def __init__(self, connection, status, reason, headers, timeout):
+        self.connection = connection
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.timeout = timeout
+        self.chunked = headers.get("transfer-encoding", "").lower() == "chunked"
+        length = headers.get("content-length")
+        self.remaining = int(length) if length is not None and not self.chunked else None
+        self.keep_alive = (headers.get("connection", "").lower() != "close"
+                           and (self.chunked or self.remaining is not None))
+        self.complete = False
+
+    async def _read(self, awaitable):
+        try:
+            return await asyncio.wait_for(awaitable, self.timeout)
+        except asyncio.TimeoutError:
+            raise OllamaRequestError("Timed out waiting for Ollama to respond")
+        except (OSError, asyncio.IncompleteReadError) as e:
+            raise OllamaRequestError(f"Connection to Ollama lost: {e}")
+
+    async def iter_chunks(self):
+        reader = self.connection.reader
+        if self.chunked:
+            while True:
+                size_line = await self._read(reader.readline())
+                try:
+                    size = int(size_line.split(b";", 1)[0].strip(), 16)
+                except ValueError:
+                    raise OllamaRequestError(f"Malformed chunk header from Ollama: {size_line!r}")
+                if size == 0:
+                    while (await self._read(reader.readline())) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                data = await self._read(reader.readexactly(size))
+                await self._read(reader.readexactly(2))
+                yield data
+        elif self.remaining is not None:
+            while self.remaining > 0:
+                data = await self._read(reader.read(min(self.remaining, READ_CHUNK_SIZE)))
+                if not data:
+                    raise OllamaRequestError("Connection closed before the response was complete")
+                self.remaining -= len(data)
+                yield data
+        else:
+            while True:
+                data = await self._read(reader.read(READ_CHUNK_SIZE))
+                if not data:
+                    break
+                yield data
+        self.complete = True
+
+    async def read(self):
+        return b"".join([chunk async for chunk in self.iter_chunks()])
+
+    async def json(self):
+        body = await self.read()
+        try:
+            return json.loads(body) if body.strip() else {}
+        except ValueError as e:
+            raise OllamaRequestError(f"Malformed response from Ollama: {e}")
+
+
+class AsyncOllamaClient:
+    def __init__(self, pool_size=OLLAMA_POOL_SIZE, connect_timeout=OLLAMA_CONNECT_TIMEOUT,
+                 read_timeout=OLLAMA_READ_TIMEOUT, max_retries=OLLAMA_MAX_RETRIES):
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.idle_connections = {}
+
+    async def _connect(self, key):
+        scheme, host, port = key
+        for attempt in range(self.max_retries + 1):
+            try:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(host, port, ssl=scheme == "https"),
+                    self.connect_timeout)
+                return AsyncConnection(key, reader, writer)
+            except (OSError, asyncio.TimeoutError) as e:
+                if attempt == self.max_retries:
+                    raise OllamaRequestError(f"Error connecting to {host}:{port}: {e or 'timed out'}")
+                await asyncio.sleep(0.2 * (2 ** attempt))
+
+    def _acquire_idle(self, key):
+        idle = self.idle_connections.get(key)
+        while idle:
+            connection = idle.pop()
+            if connection.is_usable():
+                return connection
+            connection.close()
+        return None
+
+    def _release(self, connection):
+        idle = self.idle_connections.setdefault(connection.key, [])
+        if len(idle) < self.pool_size and connection.is_usable():
+            idle.append(connection)
+        else:
+            connection.close()
+
+    async def _send(self, method, url, payload, timeout):
+        parts = urlsplit(url)
+        scheme = parts.scheme or "http"
+        port = parts.port or (443 if scheme == "https" else 80)
+        key = (scheme, parts.hostname, port)
+        target = parts.path or "/"
+        if parts.query:
+            target += f"?{parts.query}"
+        body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+        head = (f"{method} {target} HTTP/1.1\r\n"
+                f"Host: {parts.hostname}:{port}\r\n"
+                "Accept: application/json, application/x-ndjson\r\n"
+                "Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: keep-alive\r\n\r\n").encode("latin-1")
+
+        # A pooled connection may have been closed by the server while idle;
+        # that only shows up once we try to use it, so retry on a fresh one.
+        while True:
+            connection = self._acquire_idle(key)
+            reused = connection is not None
+            if connection is None:
+                connection = await self._connect(key)
+            try:
+                connection.writer.write(head + body)
+                await connection.writer.drain()
+                status_line = await asyncio.wait_for(connection.reader.readline(), timeout)
+                if not status_line:
+                    raise ConnectionResetError("connection closed by server")
+                _, status, reason = (status_line.decode("latin-1").rstrip("\r\n").split(" ", 2) + [""])[:3]
+                if not status.isdigit():
+                    raise OllamaRequestError(f"Malformed status line from Ollama: {status_line!r}")
+                headers = {}
+                while True:
+                    line = await asyncio.wait_for(connection.reader.readline(), timeout)
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                return AsyncResponse(connection, int(status), reason, headers, timeout)
+            except (OSError, asyncio.IncompleteReadError) as e:
+                connection.close()
+                if reused:
+                    continue
+                raise OllamaRequestError(f"Error connecting to Ollama: {e}")
+            except asyncio.TimeoutError:
+                connection.close()
+                raise OllamaRequestError("Timed out waiting for Ollama to respond")
+            except BaseException:
+                connection.close()
+                raise
+
+    @contextlib.asynccontextmanager
+    async def stream(self, method, url, payload=None, timeout=None):
+        response = await self._send(method, url, payload, timeout or self.read_timeout)
+        try:
+            if response.status >= 400:
+                body = await response.read()
+                try:
+                    detail = json.loads(body).get("error", "")
+                except ValueError:
+                    detail = body.decode("utf-8", "replace")
+                raise OllamaRequestError(f"{response.status} {response.reason}: {detail}".rstrip(": "))
+            yield response
+        finally:
+            if response.complete and response.keep_alive:
+                self._release(response.connection)
+            else:
+                response.connection.abort()
+
+    async def request_json(self, method, url, payload=None, timeout=None):
+        async with self.stream(method, url, payload, timeout) as response:
+            return await response.json()
+
+    async def get(self, url, timeout=None):
+        return await self.request_json("GET", url, timeout=timeout)
+
+    async def post(self, url, payload=None, timeout=None):
+        return await self.request_json("POST", url, payload, timeout)
+
+    def close(self):
+        for idle in self.idle_connections.values():
+            for connection in idle:
+                connection.close()
+        self.idle_connections.clear()
@@ -0,0 +1,183 @@
+import argparse
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from ..config import (
+    OLLAMA_CHAT_URL, OLLAMA_PS_URL, OLLAMA_KEEP_ALIVE, AUTOTUNE_PREDICT_TOKENS, AUTOTUNE_TOLERANCE
+)
+from .async_client import OllamaRequestError
+from .runtime_profiles import get_profiles
+from .stream_engine import get_engine
+
+# Long enough that prompt evaluation, which num_batch affects, is measurable
+PROMPT = ("Summarize the following notes in three sentences.\n"
+          + "The lighthouse keeper logged the weather, the ships that passed and the state "
+            "of the lamp every hour, and kept the lens clean through the winter storms.\n" * 24)
+
+# Each option is swept with the best values found so far for the ones before
+# it. Within AUTOTUNE_TOLERANCE of the fastest value the cheaper one wins:
+# fewer threads leave cores to the rest of the machine, a smaller batch uses
+# less memory. A larger context holds more of the conversation (the apps'
+# context budget follows num_ctx) but its KV cache costs memory, so it is only
+# taken when a memory limit is given and the model stays within it.
+SWEEP = [
+    # option, what it is scored by, prefer larger values within the memory limit
+    ("num_thread", "tokens_per_second", False),
+    ("num_batch", "prompt_tokens_per_second", False),
+    ("num_ctx", "tokens_per_second", True),
+]
+DEFAULT_BATCHES = [128, 256, 512]
+DEFAULT_CONTEXTS = [2048, 4096, 8192]
+
+
+def thread_candidates(cpus=None):
+    cpus = cpus or os.cpu_count() or 1
+    return sorted({max(1, cpus // 4), max(1, cpus // 2), max(1, cpus - 1), cpus})
+
+
+async def model_memory(client, model):
+    # Bytes the loaded model takes in total and on the GPU, from /api/ps
+    data = await client.get(OLLAMA_PS_URL)
+    for entry in data.get("models", []):
+        if model in (entry.get("name"), entry.get("model")):
+            return entry.get("size", 0), entry.get("size_vram", 0)
+    return 0, 0
+
+
+async def run_trial(client, model, options, trial, predict_tokens=AUTOTUNE_PREDICT_TOKENS):
+    # One short, deterministic generation. The trial number starts the prompt
+    # so Ollama cannot answer the prompt from its cache.
+    payload = {
+        "model": model,
+        "messages": [{"role": "user", "content": f"Trial {trial}. {PROMPT}"}],
+        "stream": False,
+        "keep_alive": OLLAMA_KEEP_ALIVE,
+        "options": dict(options, num_predict=predict_tokens, temperature=0, seed=0),
+    }
+    final = await client.post(OLLAMA_CHAT_URL, payload, timeout=600)
+    if final.get("error"):
+        raise OllamaRequestError(final["error"])
+    size, size_vram = await model_memory(client, model)
+    eval_seconds = final.get("eval_duration", 0) / 1e9
+    prompt_seconds = final.get("prompt_eval_duration", 0) / 1e9
+    return {
+        "tokens_per_second": final.get("eval_count", 0) / eval_seconds if eval_seconds else 0,
+        "prompt_tokens_per_second":
+            final.get("prompt_eval_count", 0) / prompt_seconds if prompt_seconds else 0,
+        "load_seconds": final.get("load_duration", 0) / 1e9,
+        "memory_mb": size / 1024 ** 2,
+        "vram_mb": size_vram / 1024 ** 2,
+    }
+
+
+def pick(results, metric, prefer_larger, tolerance=AUTOTUNE_TOLERANCE, memory_limit_mb=None):
+    # results: value -> trial result; the cheapest value close to the fastest
+    fastest = max(result[metric] for result in results.values())
+    close = [value for value, result in results.items() if result[metric] >= fastest * (1 - tolerance)]
+    if prefer_larger and memory_limit_mb:
+        fits = [value for value in close if results[value]["memory_mb"] <= memory_limit_mb]
+        if fits:
+            return max(fits)
+    return min(close)
+
+
+def calibrate(model, candidates, client=None, log=print, predict_tokens=AUTOTUNE_PREDICT_TOKENS,
+              memory_limit_mb=None):
+    # Sweeps the candidate values of each option in SWEEP order and returns
+    # the profile to store. A value Ollama fails on (out of memory, say) is
+    # skipped; options it never succeeded with are left at Ollama's default.
+    # Trials run one at a time on the stream engine, like every other request
+    engine = get_engine()
+    client = client or engine.client
+    options = {}
+    trial = 0
+    best = None
+    for option, metric, prefer_larger in SWEEP:
+        results = {}
+        for value in candidates[option]:
+            trial += 1
+            tried = dict(options, **{option: value})
+            try:
+                results[value] = engine.submit(
+                    run_trial(client, model, tried, trial, predict_tokens)).result()
+            except (OllamaRequestError, ValueError) as e:
+                log(f"{option}={value}: failed ({e})")
+                continue
+            result = results[value]
+            log(f"{option}={value}: {result['tokens_per_second']:.1f} tok/s, "
+                f"prompt {result['prompt_tokens_per_second']:.0f} tok/s, "
+                f"{result['memory_mb']:.0f} MB ({result['vram_mb']:.0f} MB on GPU)")
+        if results:
+            options[option] = pick(results, metric, prefer_larger, memory_limit_mb=memory_limit_mb)
+            best = results[options[option]]
+            log(f"{option}: using {options[option]}")
+    if best is None:
+        return None
+    return {
+        "options": options,
+        "tokens_per_second": round(best["tokens_per_second"], 2),
+        "prompt_tokens_per_second": round(best["prompt_tokens_per_second"], 2),
+        "memory_mb": round(best["memory_mb"]),
+        "vram_mb": round(best["vram_mb"]),
+        "cpus": os.cpu_count(),
+        "calibrated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+
+def parse_values(text):
+    return [int(value) for value in text.split(",") if value.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Find the fastest num_thread, num_batch and num_ctx for a model on the "
+                    "configured Ollama server and store them for every later request.")
+    parser.add_argument("model", help="model to calibrate, e.g. qwen7")
+    parser.add_argument("--threads", type=parse_values,
+                        help="num_thread values to try (default: derived from this machine's CPUs; "
+                             "give them when the server is another machine)")
+    parser.add_argument("--batches", type=parse_values, default=DEFAULT_BATCHES,
+                        help="num_batch values to try")
+    parser.add_argument("--contexts", type=parse_values, default=DEFAULT_CONTEXTS,
+                        help="num_ctx values to try")
+    parser.add_argument("--max-memory", type=int, metavar="MB",
+                        help="take the largest num_ctx that costs no speed and keeps the loaded model "
+                             "within this many MB (default: the smallest)")
+    parser.add_argument("--tokens", type=int, default=AUTOTUNE_PREDICT_TOKENS,
+                        help="tokens generated per trial")
+    parser.add_argument("--dry-run", action="store_true", help="report without storing the profile")
+    parser.add_argument("--show", action="store_true", help="print the stored profile and exit")
+    parser.add_argument("--reset", action="store_true",
+                        help="remove the stored profile so Ollama's defaults are used again")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    profiles = get_profiles()
+    if args.show:
+        print(profiles.get(args.model) or f"No profile for {args.model} on {profiles.host}")
+        return
+    if args.reset:
+        removed = profiles.remove(args.model)
+        print(f"{'Removed' if removed else 'No'} profile for {args.model} on {profiles.host}")
+        return
+
+    candidates = {"num_thread": args.threads or thread_candidates(),
+                  "num_batch": args.batches, "num_ctx": args.contexts}
+    print(f"Calibrating {args.model} on {profiles.host}")
+    started = time.monotonic()
+    profile = calibrate(args.model, candidates, predict_tokens=args.tokens,
+                        memory_limit_mb=args.max_memory)
+    if profile is None:
+        print("Every trial failed; nothing stored.", file=sys.stderr)
+        sys.exit(1)
+    print(f"Best: {profile['options']} at {profile['tokens_per_second']} tok/s "
+          f"({time.monotonic() - started:.0f} s)")
+    if not args.dry_run:
+        profiles.save(args.model, profile)
+        print(f"Stored in {profiles.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+from ..config import CONTEXT_TOKEN_BUDGET, PREFIX_STABLE_MODE
+
+# Rough tokens-per-character ratio for English text and code with the BPE
+# vocabularies Ollama models use, plus the chat template's per-message cost.
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + MESSAGE_OVERHEAD_TOKENS
+
+
+class ContextWindow:
+    # Picks the part of a conversation that is sent to /api/chat: the system
+    # prompt is always kept, then as many of the most recent messages as fit
+    # in the token budget. Estimates are cached per message object, so each
+    # turn only measures new messages and the walk stops at the budget edge;
+    # the cost of a turn stays flat however long the conversation gets.
+    #
+    # In stable mode the first message sent only moves when the window no
+    # longer fits, so consecutive requests share a byte-identical prefix and
+    # Ollama can reuse its prompt cache.
+    def __init__(self, budget=CONTEXT_TOKEN_BUDGET, stable=PREFIX_STABLE_MODE):
+        self.budget = budget
+        self.stable = stable
+        self.anchor = None
+        self.carried = None
+        self.estimates = {}
+        self.used = 0
+        self.sent_count = 0
+        self.dropped_count = 0
+
+    def tokens_for(self, message):
+        content = message.get("content", "")
+        cached = self.estimates.get(id(message))
+        # The content check catches both edited messages and ids reused by a
+        # new dict after the old one was garbage collected.
+        if cached is None or cached[0] is not content:
+            cached = (content, estimate_tokens(content))
+            self.estimates[id(message)] = cached
+        return cached[1]
+
+    def select(self, messages):
+        pinned = [m for m in messages[:1] if m.get("role") == "system"]
+        history = messages[len(pinned):]
+        used = sum(self.tokens_for(m) for m in pinned)
+
+        start = self.anchored_start(messages, len(pinned), used) if self.stable else None
+        if start is None:
+            limit = self.budget
+            if self.stable:
+                # Slide in one big step rather than a message per turn, so the
+                # prefix then stays put for many turns.
+                limit = used + max(0, self.budget - used) // 2
+            start = self.fit_start(history, used, limit)
+            self.anchor = (len(pinned) + start, history[start]) if history else None
+        if self.stable and start:
+            pinned += self.carried_system_prompt(history, start)
+
+        used += sum(self.tokens_for(m) for m in pinned[1:] + history[start:])
+        if len(self.estimates) > 2 * len(messages) + 64:
+            self.prune(messages)
+        self.used = used
+        self.sent_count = len(pinned) + len(history) - start
+        self.dropped_count = start
+        return pinned + history[start:]
+
+    def fit_start(self, history, used, limit):
+        start = len(history)
+        while start > 0:
+            tokens = self.tokens_for(history[start - 1])
+            # The newest message is always sent, even when it alone is over budget
+            if used + tokens > limit and start < len(history):
+                break
+            used += tokens
+            start -= 1
+        if self.stable:
+            # The system prompt carried from before the window counts too
+            carried = next((m for m in reversed(history[:start]) if m.get("role") == "system"), None)
+            while carried is not None and start < len(history) - 1 and \
+                    used + self.tokens_for(carried) > limit:
+                dropped = history[start]
+                used -= self.tokens_for(dropped)
+                start += 1
+                if dropped.get("role") == "system":
+                    carried = dropped
+        # Don't open the window on an assistant reply to a prompt that was cut
+        while start < len(history) - 1 and history[start].get("role") == "assistant":
+            start += 1
+        return start
+
+    def anchored_start(self, messages, offset, used):
+        # Keep the window where it started last turn while it still fits
+        if self.anchor is None:
+            return None
+        index, message = self.anchor
+        if index >= len(messages) or messages[index] is not message:
+            return None
+        if self.carried is not None and self.carried[0] is self.anchor and self.carried[1] is not None:
+            used += self.tokens_for(self.carried[1])
+        if used + sum(self.tokens_for(m) for m in messages[index:]) > self.budget:
+            return None
+        return index - offset
+
+    def carried_system_prompt(self, history, start):
+        # A system prompt changed mid-conversation is appended to the history;
+        # keep the latest one even after the window has moved past it.
+        if self.carried is None or self.carried[0] is not self.anchor:
+            latest = next((m for m in reversed(history[:start]) if m.get("role") == "system"), None)
+            self.carried = (self.anchor, latest)
+        return [self.carried[1]] if self.carried[1] is not None else []
+
+    def prune(self, messages):
+        live = {id(m) for m in messages}
+        self.estimates = {key: value for key, value in self.estimates.items() if key in live}
+
+    def usage_text(self):
+        text = f"Context: {self.used}/{self.budget} tokens"
+        if self.dropped_count:
+            text += f" ({self.dropped_count} older messages not sent)"
+        return text
+
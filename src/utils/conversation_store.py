@@ -0,0 +1,419 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from ..config import CONVERSATION_DB
+from .session_journal import empty_state
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    -- Never reused, so a window still holding a deleted conversation's id
+    -- cannot write into another one
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE,
+    model TEXT,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    conversation_id INTEGER NOT NULL REFERENCES conversations(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    UNIQUE (conversation_id, position)
+);
+CREATE TABLE IF NOT EXISTS imported_files (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    conversation_id INTEGER
+);
+"""
+
+
+class ConversationStore:
+    # Saved chats in one SQLite database in WAL mode. A conversation's
+    # messages are rows numbered by position, so adding a message is a single
+    # insert however long the chat is, and a load can ask for just the last
+    # few. One connection is shared by the GUI and loading threads.
+    def __init__(self, path=CONVERSATION_DB):
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        # With WAL, NORMAL only risks the last commits on power loss, never corruption
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("PRAGMA foreign_keys=ON")
+        self.db.executescript(SCHEMA)
+
+    def transaction(self):
+        return Transaction(self)
+
+    # Conversations
+
+    def create(self, name, model, messages=()):
+        now = time.time()
+        with self.transaction() as db:
+            conversation_id = db.execute(
+                "INSERT INTO conversations (name, model, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (self.unique_name(db, name), model, now, now)).lastrowid
+            self.insert_messages(db, conversation_id, 0, messages, model)
+        return conversation_id
+
+    def conversations(self):
+        # Newest first, without touching the messages table
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT id, name, model, message_count, updated_at FROM conversations "
+                "ORDER BY updated_at DESC").fetchall()
+        return [dict(zip(("id", "name", "model", "message_count", "updated_at"), row)) for row in rows]
+
+    def get(self, conversation_id):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT id, name, model, message_count, updated_at FROM conversations WHERE id = ?",
+                (conversation_id,)).fetchone()
+        return dict(zip(("id", "name", "model", "message_count", "updated_at"), row)) if row else None
+
+    def rename(self, conversation_id, name):
+        # Saving under a name that is taken replaces that conversation, as
+        # saving over a file did
+        with self.transaction() as db:
+            db.execute("DELETE FROM conversations WHERE name = ? AND id != ?", (name, conversation_id))
+            db.execute("UPDATE conversations SET name = ?, updated_at = ? WHERE id = ?",
+                       (name, time.time(), conversation_id))
+
+    def delete(self, conversation_id):
+        with self.transaction() as db:
+            db.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+
+    @staticmethod
+    def unique_name(db, name):
+        candidate, number = name, 1
+        while db.execute("SELECT 1 FROM conversations WHERE name = ?", (candidate,)).fetchone():
+            number += 1
+            candidate = f"{name} ({number})"
+        return candidate
+
+    # Messages
+
+    def append(self, conversation_id, messages, model):
+        # Adds messages after the ones stored; returns the new message count,
+        # or None when the conversation was deleted meanwhile
+        with self.transaction() as db:
+            row = db.execute("SELECT message_count FROM conversations WHERE id = ?",
+                             (conversation_id,)).fetchone()
+            if row is None:
+                return None
+            return self.insert_messages(db, conversation_id, row[0], messages, model)
+
+    def replace(self, conversation_id, messages, model):
+        with self.transaction() as db:
+            if not db.execute("SELECT 1 FROM conversations WHERE id = ?", (conversation_id,)).fetchone():
+                return None
+            db.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation_id,))
+            return self.insert_messages(db, conversation_id, 0, messages, model)
+
+    def truncate(self, conversation_id, count, model):
+        # Drops the messages after the first count
+        with self.transaction() as db:
+            if not db.execute("SELECT 1 FROM conversations WHERE id = ?", (conversation_id,)).fetchone():
+                return None
+            db.execute("DELETE FROM messages WHERE conversation_id = ? AND position >= ?",
+                       (conversation_id, count))
+            return self.insert_messages(db, conversation_id, count, [], model)
+
+    @staticmethod
+    def insert_messages(db, conversation_id, start, messages, model):
+        now = time.time()
+        db.executemany(
+            "INSERT INTO messages (conversation_id, position, role, content, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(conversation_id, start + i, message["role"], message["content"], now)
+             for i, message in enumerate(messages)])
+        count = start + len(messages)
+        db.execute("UPDATE conversations SET message_count = ?, model = COALESCE(?, model), "
+                   "updated_at = ? WHERE id = ?", (count, model, now, conversation_id))
+        return count
+
+    def messages(self, conversation_id, last=None):
+        # All messages in order, or only the last ones
+        with self.lock:
+            if last is None:
+                rows = self.db.execute(
+                    "SELECT role, content FROM messages WHERE conversation_id = ? ORDER BY position",
+                    (conversation_id,)).fetchall()
+            else:
+                rows = self.db.execute(
+                    "SELECT role, content FROM messages WHERE conversation_id = ? AND position >= "
+                    "(SELECT message_count FROM conversations WHERE id = ?) - ? ORDER BY position",
+                    (conversation_id, conversation_id, last)).fetchall()
+        return [{"role": role, "content": content} for role, content in rows]
+
+    def system_prompt(self, conversation_id):
+        # The latest system message, wherever it is in the conversation
+        with self.lock:
+            row = self.db.execute(
+                "SELECT content FROM messages WHERE conversation_id = ? AND role = 'system' "
+                "ORDER BY position DESC LIMIT 1", (conversation_id,)).fetchone()
+        return row[0] if row else None
+
+    # Importing the JSON files earlier versions saved
+
+    def import_folder(self, folder):
+        # Imports every .json chat in folder that is new or changed since it
+        # was last imported, all in one transaction. Returns how many.
+        try:
+            names = sorted(name for name in os.listdir(folder) if name.endswith(".json"))
+        except OSError:
+            return 0
+        imported = 0
+        with self.transaction() as db:
+            known = {path: (mtime, conversation_id) for path, mtime, conversation_id
+                     in db.execute("SELECT path, mtime, conversation_id FROM imported_files")}
+            for name in names:
+                path = os.path.join(folder, name)
+                mtime = None
+                try:
+                    mtime = os.stat(path).st_mtime
+                    if known.get(path, (None,))[0] == mtime:
+                        continue
+                    with open(path, "r") as f:
+                        data = json.load(f)
+                    messages = [{"role": msg["role"], "content": msg["content"]}
+                                for msg in data.get("messages", [])]
+                except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+                    logging.warning(f"Skipping {path}: {e}")
+                    if mtime is not None:
+                        # Not tried again until the file changes
+                        db.execute("INSERT OR REPLACE INTO imported_files VALUES (?, ?, NULL)",
+                                   (path, mtime))
+                    continue
+                previous = known.get(path, (None, None))[1]
+                if previous is not None and db.execute(
+                        "SELECT 1 FROM conversations WHERE id = ?", (previous,)).fetchone():
+                    # The file changed after it was imported: refresh the copy
+                    db.execute("DELETE FROM messages WHERE conversation_id = ?", (previous,))
+                    self.insert_messages(db, previous, 0, messages, data.get("model"))
+                    conversation_id = previous
+                else:
+                    now = time.time()
+                    conversation_id = db.execute(
+                        "INSERT INTO conversations (name, model, created_at, updated_at) "
+                        "VALUES (?, ?, ?, ?)",
+                        (self.unique_name(db, name[:-5]), data.get("model"), mtime, now)).lastrowid
+                    self.insert_messages(db, conversation_id, 0, messages, data.get("model"))
+                db.execute("INSERT OR REPLACE INTO imported_files VALUES (?, ?, ?)",
+                           (path, mtime, conversation_id))
+                imported += 1
+        return imported
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+class Transaction:
+    # Holds the store's lock for one BEGIN ... COMMIT, rolling back on error
+    def __init__(self, store):
+        self.store = store
+
+    def __enter__(self):
+        self.store.lock.acquire()
+        self.store.db.execute("BEGIN IMMEDIATE")
+        return self.store.db
+
+    def __exit__(self, exc_type, exc, traceback):
+        try:
+            self.store.db.execute("COMMIT" if exc_type is None else "ROLLBACK")
+        finally:
+            self.store.lock.release()
+        return False
+
+
+class Session:
+    # The conversation a window is in. It is created in the store with the
+    # first message that is not the system prompt; after that only messages
+    # added since the last sync are written. With a journal, every message,
+    # reply checkpoint and store write is also journaled, so the session can
+    # be restored on the next start even if the app did not exit cleanly.
+    def __init__(self, store, journal=None, name_format="Chat %Y-%m-%d %H:%M"):
+        self.store = store
+        self.journal = journal
+        self.name_format = name_format
+        self.conversation_id = None
+        self.stored = 0  # messages of the window's list already in the store
+        self.recorded = 0  # messages of the window's list already journaled
+
+    def record(self, op, **fields):
+        if self.journal is not None:
+            self.journal.record(op, **fields)
+
+    def record_stored(self, model):
+        self.record("stored", conversation=self.conversation_id, count=self.stored, model=model)
+
+    def sync(self, messages, model):
+        for message in messages[self.recorded:]:
+            self.record("message", role=message["role"], content=message["content"], model=model)
+        self.recorded = len(messages)
+        try:
+            if self.conversation_id is None:
+                if all(message["role"] == "system" for message in messages):
+                    return
+                self.conversation_id = self.store.create(
+                    time.strftime(self.name_format), model, messages)
+                self.stored = len(messages)
+            elif len(messages) > self.stored:
+                count = self.store.append(self.conversation_id, messages[self.stored:], model)
+                if count is None:
+                    # Deleted from the history list: store it anew
+                    self.reset()
+                    self.sync(messages, model)
+                    return
+                self.stored = count
+            else:
+                return
+            self.record_stored(model)
+        except sqlite3.Error as e:
+            logging.error(f"Could not store the conversation: {e}")
+
+    def checkpoint(self, text):
+        # text was added to the reply being streamed
+        self.record("partial", text=text)
+
+    def rewrite(self, messages, model):
+        # The window changed earlier messages, not just added some
+        self.record("rewrite", messages=list(messages), model=model)
+        self.recorded = len(messages)
+        if self.conversation_id is None:
+            self.sync(messages, model)
+            return
+        try:
+            count = self.store.replace(self.conversation_id, messages, model)
+            if count is None:
+                self.reset()
+                self.sync(messages, model)
+                return
+            self.stored = count
+            self.record_stored(model)
+        except sqlite3.Error as e:
+            logging.error(f"Could not store the conversation: {e}")
+
+    def truncate(self, messages, model):
+        # The window dropped messages from the end of its list
+        self.record("truncate", count=len(messages))
+        self.recorded = len(messages)
+        if self.conversation_id is None or self.stored <= len(messages):
+            return
+        try:
+            if all(message["role"] == "system" for message in messages):
+                # Nothing is left worth keeping in the history list
+                self.store.delete(self.conversation_id)
+                self.reset()
+                return
+            count = self.store.truncate(self.conversation_id, len(messages), model)
+            if count is None:
+                self.reset()
+                self.sync(messages, model)
+                return
+            self.stored = count
+            self.record_stored(model)
+        except sqlite3.Error as e:
+            logging.error(f"Could not store the conversation: {e}")
+
+    def save_as(self, name, messages, model):
+        # Names the conversation, storing it first if nothing was yet
+        if self.conversation_id is None:
+            self.conversation_id = self.store.create(name, model, messages)
+            self.stored = self.recorded = len(messages)
+            self.record("rewrite", messages=list(messages), model=model)
+            self.record_stored(model)
+        self.sync(messages, model)
+        self.store.rename(self.conversation_id, name)
+
+    def open(self, conversation_id, message_count):
+        self.conversation_id = conversation_id
+        self.stored = self.recorded = message_count
+        self.record("open", conversation=conversation_id, count=message_count)
+
+    def reset(self):
+        # The window started over; the next message begins a new conversation
+        self.conversation_id = None
+        self.stored = self.recorded = 0
+        self.record("reset")
+
+    def restore(self):
+        # Called once at startup. Whatever the journal holds that the store
+        # does not (messages whose write failed, the reply that was
+        # streaming) is added to the conversation, which is returned so the
+        # window can load it; None when there is nothing to restore.
+        if self.journal is None:
+            return None
+        try:
+            state = self.journal.replay()
+        except OSError as e:
+            logging.error(f"Could not open the session journal: {e}")
+            self.journal = None
+            return None
+        if state is None:
+            logging.warning("Another window journals this session; this one is not journaled")
+            self.journal = None
+            return None
+        try:
+            conversation = self.recover(state)
+        except sqlite3.Error as e:
+            # The journal is left as it is for the next start
+            logging.error(f"Could not restore the session: {e}")
+            self.journal.close()
+            self.journal = None
+            return None
+        if conversation is None:
+            self.journal.start(empty_state())
+        else:
+            self.journal.start(dict(empty_state(), conversation=conversation["id"],
+                                    stored=conversation["message_count"]))
+        return conversation
+
+    def recover(self, state):
+        messages = list(state["messages"])
+        if state["partial"]:
+            messages.append({"role": "assistant", "content": state["partial"]})
+        conversation = state["conversation"] is not None and self.store.get(state["conversation"])
+        if state["rewritten"] or not conversation:
+            if conversation:
+                self.store.replace(conversation["id"], messages, state["model"])
+            elif state["conversation"] is None and \
+                    any(message["role"] != "system" for message in messages):
+                conversation_id = self.store.create(time.strftime(self.name_format),
+                                                    state["model"], messages)
+                return self.store.get(conversation_id)
+            else:
+                # Nothing but a system prompt, or deleted meanwhile
+                return None
+        else:
+            # Messages the store got after the journal last heard of it are
+            # the first of these; replaying a journal twice adds nothing twice
+            missing = messages[max(0, conversation["message_count"] - state["stored"]):]
+            if missing:
+                self.store.append(conversation["id"], missing, state["model"])
+        return self.store.get(conversation["id"])
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ConversationStore()
+        return _store
@@ -0,0 +1,40 @@
+import time
+
+
+class LoadedHistory:
+    # A conversation read from the conversation store
+    def __init__(self, conversation_id, name, messages, model, system_prompt, started_at):
+        self.conversation_id = conversation_id
+        self.name = name
+        self.messages = messages
+        self.model = model
+        self.system_prompt = system_prompt
+        self.started_at = started_at
+
+    def elapsed_ms(self):
+        return (time.monotonic() - self.started_at) * 1000
+
+
+def read_conversation(store, conversation_id, model, system_prompt, started_at=None, last=None):
+    # With last, only the conversation's last messages are read. Falls back
+    # to the given model and system prompt when the conversation has none.
+    started_at = time.monotonic() if started_at is None else started_at
+    conversation = store.get(conversation_id)
+    if conversation is None:
+        raise KeyError(f"conversation {conversation_id} does not exist")
+    messages = store.messages(conversation_id, last)
+    return LoadedHistory(conversation_id, conversation["name"], messages,
+                         conversation["model"] or model,
+                         store.system_prompt(conversation_id) or system_prompt, started_at)
+
+
+def display_entries(messages):
+    # (role, text) for every message the chat display shows, in order
+    entries = []
+    for msg in messages:
+        if msg['role'] == 'user':
+            entries.append(('user', f"You: {msg['content']}\n"))
+        elif msg['role'] == 'assistant':
+            entries.append(('assistant', f"{msg['content']}\n"))
+    return entries
+
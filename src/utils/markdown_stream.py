@@ -0,0 +1,182 @@
+import re
+
+try:
+    from pygments.lexers import get_lexer_by_name
+    from pygments.styles import get_style_by_name
+    from pygments.util import ClassNotFound
+except ImportError:
+    get_lexer_by_name = None
+
+FENCE = re.compile(r" {0,3}(`{3,}|~{3,})\s*([\w+#.-]*)")
+HEADING = re.compile(r" {0,3}(#{1,6})\s+(.*?)\s*#*\s*$")
+LIST_ITEM = re.compile(r"(\s*)([-*+]|\d+[.)])\s+")
+QUOTE = re.compile(r"\s*>\s?")
+INLINE = re.compile(r"`([^`\n]+)`|\*\*([^*\n]+)\*\*|__([^_\n]+)__|\*([^*\s][^*\n]*)\*|\b_([^_\n]+)_\b"
+                    r"|\[([^\]\n]+)\]\([^)\s]+\)")
+# Inline run styles
+PLAIN, CODE, BOLD, ITALIC, LINK = range(5)
+INLINE_STYLES = [CODE, BOLD, BOLD, ITALIC, ITALIC, LINK]
+
+
+class Block:
+    # kind is "paragraph", "heading" or "code"; text is the content without
+    # the Markdown syntax that delimits the block (fences, leading #s)
+    def __init__(self, kind, text, language="", level=0):
+        self.kind = kind
+        self.text = text
+        self.language = language
+        self.level = level
+
+
+class MarkdownStream:
+    # Splits a reply into Markdown blocks as it streams in. Each feed() only
+    # scans the lines that completed since the last call and returns the
+    # blocks they closed; everything after the last closed block is the
+    # still-growing trailing block, which is all a renderer has to redo.
+    def __init__(self):
+        self.text = ""
+        self.block_start = 0  # where the trailing block starts in self.text
+        self.scanned = 0      # start of the first line not classified yet
+        self.kind = None      # None, "paragraph" or "code"
+        self.fence = ""
+        self.language = ""
+
+    def feed(self, text):
+        self.text += text
+        closed = []
+        while True:
+            end = self.text.find("\n", self.scanned)
+            if end < 0:
+                break
+            self.scan_line(self.text[self.scanned:end], end + 1, closed)
+            self.scanned = end + 1
+        return closed
+
+    def finish(self):
+        # The reply ended: whatever is left is final
+        closed = []
+        if self.scanned < len(self.text):
+            self.scan_line(self.text[self.scanned:], len(self.text), closed)
+            self.scanned = len(self.text)
+        if self.kind is not None:
+            closed.append(self.open_block(self.text[self.block_start:]))
+            self.kind = None
+            self.block_start = len(self.text)
+        return closed
+
+    def scan_line(self, line, next_start, closed):
+        if self.kind == "code":
+            fence = FENCE.fullmatch(line.rstrip())
+            if fence and fence.group(1)[0] == self.fence[0] and len(fence.group(1)) >= len(self.fence) \
+                    and not fence.group(2):
+                body = self.text[self.block_start:self.scanned]
+                closed.append(Block("code", self.strip_fence(body), self.language))
+                self.kind = None
+                self.block_start = next_start
+            return
+
+        fence = FENCE.match(line)
+        heading = HEADING.match(line)
+        if fence or heading or not line.strip():
+            if self.kind == "paragraph":
+                closed.append(Block("paragraph", self.text[self.block_start:self.scanned].rstrip("\n")))
+                self.kind = None
+            self.block_start = self.scanned
+        if fence:
+            self.kind = "code"
+            self.fence = fence.group(1)
+            self.language = fence.group(2).lower()
+        elif heading:
+            closed.append(Block("heading", heading.group(2), level=len(heading.group(1))))
+            self.block_start = next_start
+        elif not line.strip():
+            self.block_start = next_start
+        else:
+            self.kind = "paragraph"
+
+    def strip_fence(self, body):
+        # Drop the opening fence line of a code block
+        newline = body.find("\n")
+        return body[newline + 1:] if newline >= 0 else ""
+
+    def open_block(self, text):
+        if self.kind == "code":
+            return Block("code", self.strip_fence(text), self.language)
+        heading = HEADING.match(text) if "\n" not in text else None
+        if heading:
+            return Block("heading", heading.group(2), level=len(heading.group(1)))
+        return Block("paragraph", text.rstrip("\n"))
+
+    def trailing(self):
+        # The still-open block, or None when the reply ended on a boundary
+        text = self.text[self.block_start:]
+        if not text:
+            return None
+        if self.kind is None:
+            fence = FENCE.fullmatch(text.rstrip())
+            if fence:
+                return Block("code", "", fence.group(2).lower())
+        return self.open_block(text)
+
+
+def line_prefix(line):
+    # How a paragraph line starts: ("list", marker, rest), ("quote", "", rest)
+    # or ("plain", "", line)
+    item = LIST_ITEM.match(line)
+    if item:
+        marker = item.group(2)
+        bullet = "•" if marker in "-*+" else marker
+        return "list", item.group(1) + bullet + " ", line[item.end():]
+    quote = QUOTE.match(line)
+    if quote:
+        return "quote", "", line[quote.end():]
+    return "plain", "", line
+
+
+def inline_runs(text):
+    # Splits a line into (text, style) runs for code spans, bold, italic and
+    # links; unclosed markers are left as typed
+    runs = []
+    position = 0
+    for match in INLINE.finditer(text):
+        if match.start() > position:
+            runs.append((text[position:match.start()], PLAIN))
+        group = next(i for i, value in enumerate(match.groups()) if value is not None)
+        runs.append((match.group(group + 1), INLINE_STYLES[group]))
+        position = match.end()
+    if position < len(text):
+        runs.append((text[position:], PLAIN))
+    return runs
+
+
+_style_cache = {}
+
+def highlight_spans(code, language, style_name="nord"):
+    # (start, length, color, bold, italic) for every styled token of code.
+    # Pure computation, safe to run off the GUI thread; empty without pygments
+    # or for an unknown language.
+    if get_lexer_by_name is None or not language:
+        return []
+    try:
+        lexer = get_lexer_by_name(language, stripnl=False, ensurenl=False)
+    except ClassNotFound:
+        return []
+    style = _style_cache.get(style_name)
+    if style is None:
+        try:
+            style = get_style_by_name(style_name)
+        except ClassNotFound:
+            style = get_style_by_name("monokai")
+        _style_cache[style_name] = style
+    spans = []
+    for start, token_type, value in lexer.get_tokens_unprocessed(code):
+        token_style = style.style_for_token(token_type)
+        if not value or not (token_style["color"] or token_style["bold"] or token_style["italic"]):
+            continue
+        key = (token_style["color"], token_style["bold"], token_style["italic"])
+        last = spans[-1] if spans else None
+        if last is not None and last[0] + last[1] == start and last[2:] == key:
+            spans[-1] = (last[0], last[1] + len(value)) + key
+        else:
+            spans.append((start, len(value)) + key)
+    return spans
@@ -0,0 +1,121 @@
+import csv
+import json
+import socket
+import time
+from collections import deque
+from ..config import METRICS_HISTORY
+
+# Columns of an exported record, in CSV order
+FIELDS = [
+    "timestamp", "host", "model", "ttft_s", "itl_mean_ms", "itl_p95_ms", "tokens_per_second",
+    "client_tokens", "total_s", "load_s", "prompt_eval_count", "prompt_eval_s",
+    "eval_count", "eval_s",
+]
+
+# Per-model statistics reported with p50/p95
+SUMMARY_FIELDS = ["ttft_s", "itl_mean_ms", "tokens_per_second", "load_s", "prompt_eval_s", "total_s"]
+
+
+def percentile(values, q):
+    # Linear interpolation between closest ranks, q in 0..100
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return None
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def seconds(nanoseconds):
+    return nanoseconds / 1e9 if nanoseconds else None
+
+
+class GenerationMetrics:
+    # Timings of one response: measured on the client while streaming plus
+    # the durations and counts Ollama reports in its final chunk.
+    def __init__(self, model, started_at, first_token_at, last_token_at, token_count,
+                 token_gaps=(), final=None):
+        final = final or {}
+        self.timestamp = time.time()
+        self.host = socket.gethostname()
+        self.model = model
+        self.final = final
+        self.client_tokens = token_count
+        self.ttft_s = first_token_at - started_at if first_token_at is not None else None
+
+        if first_token_at is not None and token_count > 1:
+            self.itl_mean_ms = (last_token_at - first_token_at) / (token_count - 1) * 1000
+        else:
+            self.itl_mean_ms = None
+        p95 = percentile(token_gaps, 95)
+        self.itl_p95_ms = p95 * 1000 if p95 is not None else None
+
+        self.total_s = seconds(final.get("total_duration"))
+        self.load_s = seconds(final.get("load_duration"))
+        self.prompt_eval_count = final.get("prompt_eval_count", 0 if final else None)
+        self.prompt_eval_s = seconds(final.get("prompt_eval_duration"))
+        self.eval_count = final.get("eval_count")
+        self.eval_s = seconds(final.get("eval_duration"))
+        if self.eval_count and self.eval_s:
+            self.tokens_per_second = self.eval_count / self.eval_s
+        elif self.itl_mean_ms:
+            self.tokens_per_second = 1000 / self.itl_mean_ms
+        else:
+            self.tokens_per_second = None
+
+    def as_row(self):
+        return {field: getattr(self, field) for field in FIELDS}
+
+    def summary_text(self):
+        parts = []
+        if self.ttft_s is not None:
+            parts.append(f"TTFT {self.ttft_s:.2f} s")
+        if self.tokens_per_second is not None:
+            parts.append(f"{self.tokens_per_second:.1f} tok/s")
+        if self.itl_mean_ms is not None:
+            parts.append(f"ITL {self.itl_mean_ms:.0f} ms")
+        if self.load_s:
+            parts.append(f"load {self.load_s:.2f} s")
+        if self.prompt_eval_count is not None:
+            # A reused prompt cache shows up as a small count here
+            parts.append(f"prompt {self.prompt_eval_count} tok in {self.prompt_eval_s or 0:.2f} s")
+        return "  ·  ".join(parts) if parts else "No tokens received"
+
+
+class MetricsTable:
+    # The most recent METRICS_HISTORY responses per model
+    def __init__(self, history=METRICS_HISTORY):
+        self.history = history
+        self.records = {}
+
+    def record(self, metrics):
+        self.records.setdefault(metrics.model, deque(maxlen=self.history)).append(metrics)
+
+    def all_records(self):
+        rows = [m for records in self.records.values() for m in records]
+        return sorted(rows, key=lambda m: m.timestamp)
+
+    def summaries(self):
+        summaries = []
+        for model, records in self.records.items():
+            summary = {"model": model, "count": len(records)}
+            for field in SUMMARY_FIELDS:
+                values = [getattr(m, field) for m in records]
+                summary[f"{field}_p50"] = percentile(values, 50)
+                summary[f"{field}_p95"] = percentile(values, 95)
+            summaries.append(summary)
+        return summaries
+
+    def export_csv(self, path):
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            writer.writeheader()
+            for metrics in self.all_records():
+                writer.writerow(metrics.as_row())
+
+    def export_json(self, path):
+        with open(path, "w") as f:
+            json.dump({"host": socket.gethostname(),
+                       "summary": self.summaries(),
+                       "records": [m.as_row() for m in self.all_records()]}, f, indent=2)
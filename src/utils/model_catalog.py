@@ -0,0 +1,96 @@
+import time
+from ..config import MODEL_CATALOG_TTL, MODEL_PS_TTL
+
+
+def format_size(num_bytes):
+    return f"{num_bytes / 1024 ** 3:.1f} GB"
+
+
+class ModelInfo:
+    def __init__(self, name, size=0, family="", parameter_size="", quantization="", digest=""):
+        self.name = name
+        self.size = size
+        self.family = family
+        self.parameter_size = parameter_size
+        self.quantization = quantization
+        self.digest = digest
+        self.loaded = False
+        self.size_vram = 0
+
+    def describe(self):
+        parts = [part for part in (self.parameter_size, self.quantization, self.family) if part]
+        if self.size:
+            parts.append(format_size(self.size))
+        if self.loaded:
+            parts.append("in memory" + (" (GPU)" if self.size_vram else ""))
+        return f"{self.name}  ({', '.join(parts)})" if parts else self.name
+
+
+class ModelCatalog:
+    # Installed models from /api/tags and the ones currently loaded from
+    # /api/ps. The two are refreshed separately: the installed list rarely
+    # changes, residency changes whenever Ollama loads or evicts a model.
+    # Fetching happens elsewhere; the update methods only apply responses, so
+    # the catalog is only ever touched from the GUI thread.
+    def __init__(self, ttl=MODEL_CATALOG_TTL, ps_ttl=MODEL_PS_TTL):
+        self.ttl = ttl
+        self.ps_ttl = ps_ttl
+        self.models = {}
+        self.loaded_names = set()
+        self.tags_at = None
+        self.ps_at = None
+
+    def tags_stale(self):
+        return self.tags_at is None or time.monotonic() - self.tags_at > self.ttl
+
+    def ps_stale(self):
+        return self.ps_at is None or time.monotonic() - self.ps_at > self.ps_ttl
+
+    def update_tags(self, data):
+        models = {}
+        for entry in data.get("models", []):
+            name = entry.get("name") or entry.get("model")
+            if not name:
+                continue
+            previous = self.models.get(name)
+            digest = entry.get("digest", "")
+            if previous is not None and digest and previous.digest == digest:
+                models[name] = previous
+                continue
+            details = entry.get("details") or {}
+            info = ModelInfo(name, entry.get("size", 0), details.get("family", ""),
+                             details.get("parameter_size", ""),
+                             details.get("quantization_level", ""), digest)
+            info.loaded = name in self.loaded_names
+            models[name] = info
+        self.models = models
+        self.tags_at = time.monotonic()
+
+    def update_ps(self, data, requested_at=None):
+        loaded = {}
+        for entry in data.get("models", []):
+            name = entry.get("name") or entry.get("model")
+            if name:
+                loaded[name] = entry
+        for name, info in self.models.items():
+            entry = loaded.get(name)
+            info.loaded = entry is not None
+            info.size_vram = entry.get("size_vram", 0) if entry else 0
+        self.loaded_names = set(loaded)
+        self.ps_at = requested_at if requested_at is not None else time.monotonic()
+
+    def find(self, name):
+        # Models pulled without a tag are listed as "<name>:latest"
+        return self.models.get(name) or self.models.get(f"{name}:latest")
+
+    def is_installed(self, name):
+        return self.find(name) is not None
+
+    def is_loaded(self, name):
+        return name in self.loaded_names or f"{name}:latest" in self.loaded_names
+
+    def names(self):
+        return list(self.models)
+
+    def entries(self):
+        return list(self.models.values())
@@ -0,0 +1,105 @@
+import json
+from json.decoder import scanstring
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+CONTENT_KEY = '"content":"'
+CONTENT_KEY_LENGTH = len(CONTENT_KEY)
+PARTIAL_SUFFIX = b'"done":false}'
+
+
+class NDJSONParser:
+    # Incremental newline-delimited JSON parser. Complete lines are decoded
+    # straight out of the incoming chunk through a memoryview; only a trailing
+    # partial line is copied into the reusable buffer until the rest arrives.
+    def __init__(self):
+        self.buffer = bytearray()
+        self.errors = []
+
+    def feed(self, chunk):
+        results = []
+        buffer = self.buffer
+        if buffer:
+            buffer += chunk
+            data = buffer
+        else:
+            data = chunk
+        start = 0
+        find = data.find
+        with memoryview(data) as view:
+            while True:
+                end = find(b"\n", start)
+                if end < 0:
+                    break
+                if end > start and not (end - start == 1 and data[start] == 13):
+                    self.handle_line(view[start:end], results)
+                start = end + 1
+            if data is not buffer and start < len(data):
+                buffer += view[start:]
+        if data is buffer:
+            del buffer[:start]
+        return results
+
+    def flush(self):
+        results = []
+        if self.buffer.strip():
+            with memoryview(self.buffer) as view:
+                self.handle_line(view, results)
+        self.buffer.clear()
+        return results
+
+    def decode(self, line):
+        if orjson is not None:
+            return orjson.loads(line)
+        return json.loads(str(line, "utf-8"))
+
+    def handle_line(self, line, results):
+        try:
+            results.append(self.decode(line))
+        except ValueError as e:
+            self.errors.append(f"Error decoding JSON from Ollama response: {e}")
+
+
+class ChatStreamParser(NDJSONParser):
+    # /api/chat specialisation: feed() returns only the message content of each
+    # chunk. The final chunk (done: true, with the timing stats) is kept whole
+    # in self.final and any {"error": ...} line is collected in self.errors.
+    def __init__(self):
+        super().__init__()
+        self.final = None
+        self.done = False
+
+    def handle_line(self, line, results):
+        if orjson is None and line[-len(PARTIAL_SUFFIX):] == PARTIAL_SUFFIX:
+            # Without orjson a full json.loads of every chunk dominates, so pull
+            # just the content string out of intermediate chunks.
+            text = str(line, "utf-8")
+            index = text.find(CONTENT_KEY)
+            if index >= 0:
+                try:
+                    content, _ = scanstring(text, index + CONTENT_KEY_LENGTH)
+                except ValueError as e:
+                    self.errors.append(f"Error decoding JSON from Ollama response: {e}")
+                    return
+                if content:
+                    results.append(content)
+                return
+        try:
+            data = self.decode(line)
+        except ValueError as e:
+            self.errors.append(f"Error decoding JSON from Ollama response: {e}")
+            return
+        if 'error' in data:
+            self.errors.append(str(data['error']))
+            return
+        message = data.get('message')
+        if message and message.get('content'):
+            results.append(message['content'])
+        if data.get('done'):
+            self.done = True
+            self.final = data
@@ -0,0 +1,74 @@
+import itertools
+
+PRIORITY_NORMAL = 0
+PRIORITY_HIGH = 1
+
+
+class QueuedPrompt:
+    def __init__(self, prompt_id, text, priority=PRIORITY_NORMAL):
+        self.id = prompt_id
+        self.text = text
+        self.priority = priority
+
+    def __repr__(self):
+        return f"QueuedPrompt({self.id}, {self.text!r}, priority={self.priority})"
+
+
+class PromptQueue:
+    # Prompts waiting for the current generation to finish, kept in dispatch
+    # order: higher priority first, then first-in first-out.
+    def __init__(self):
+        self.items = []
+        self.ids = itertools.count(1)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(list(self.items))
+
+    def insert(self, item):
+        index = len(self.items)
+        while index > 0 and self.items[index - 1].priority < item.priority:
+            index -= 1
+        self.items.insert(index, item)
+
+    def push(self, text, priority=PRIORITY_NORMAL):
+        item = QueuedPrompt(next(self.ids), text, priority)
+        self.insert(item)
+        return item
+
+    def pop(self):
+        return self.items.pop(0) if self.items else None
+
+    def index_of(self, prompt_id):
+        for index, item in enumerate(self.items):
+            if item.id == prompt_id:
+                return index
+        return -1
+
+    def remove(self, prompt_id):
+        index = self.index_of(prompt_id)
+        return self.items.pop(index) if index >= 0 else None
+
+    def move(self, prompt_id, offset):
+        # Moving past a neighbour of a different priority adopts its priority,
+        # so the queue stays ordered.
+        index = self.index_of(prompt_id)
+        target = index + offset
+        if index < 0 or not 0 <= target < len(self.items):
+            return False
+        item = self.items.pop(index)
+        item.priority = self.items[target if offset < 0 else target - 1].priority
+        self.items.insert(target, item)
+        return True
+
+    def set_priority(self, prompt_id, priority):
+        item = self.remove(prompt_id)
+        if item is not None:
+            item.priority = priority
+            self.insert(item)
+        return item
+
+    def clear(self):
+        self.items.clear()
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from ..config import (
+    RESPONSE_CACHE_FOLDER, RESPONSE_CACHE_ENABLED, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_TTL
+)
+
+
+def cache_key(model, messages, options=None):
+    payload = json.dumps([model, options or {}, messages], sort_keys=True,
+                         ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    # Finished replies stored one JSON file per (model, options, messages)
+    # hash. A file's mtime is its last use: hits touch it and eviction removes
+    # the least recently used files once the folder grows past max_bytes.
+    def __init__(self, folder=RESPONSE_CACHE_FOLDER, max_bytes=RESPONSE_CACHE_MAX_BYTES,
+                 ttl=RESPONSE_CACHE_TTL, enabled=RESPONSE_CACHE_ENABLED):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.enabled = enabled
+        self.bypass = False
+        self.hits = 0
+        self.misses = 0
+        self.index = None  # key -> [size, last_used], read from disk on first use
+
+    def path(self, key):
+        return os.path.join(self.folder, f"{key}.json")
+
+    def load_index(self):
+        if self.index is not None:
+            return self.index
+        self.index = {}
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            with os.scandir(self.folder) as entries:
+                for entry in entries:
+                    if entry.name.endswith(".json") and entry.is_file():
+                        stat = entry.stat()
+                        self.index[entry.name[:-5]] = [stat.st_size, stat.st_mtime]
+        except OSError as e:
+            logging.warning(f"Response cache unavailable: {e}")
+        return self.index
+
+    def get(self, model, messages, options=None):
+        if not self.enabled or self.bypass:
+            return None
+        key = cache_key(model, messages, options)
+        if key not in self.load_index():
+            self.misses += 1
+            return None
+        try:
+            with open(self.path(key), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Dropping unreadable cache entry {key}: {e}")
+            self.remove(key)
+            self.misses += 1
+            return None
+        if self.ttl and time.time() - entry.get("created", 0) > self.ttl:
+            self.remove(key)
+            self.misses += 1
+            return None
+        now = time.time()
+        try:
+            os.utime(self.path(key), (now, now))
+        except OSError:
+            pass
+        self.index[key][1] = now
+        self.hits += 1
+        return entry
+
+    def put(self, model, messages, content, final=None, options=None):
+        if not self.enabled:
+            return
+        key = cache_key(model, messages, options)
+        entry = {"model": model, "created": time.time(), "content": content, "final": final}
+        data = json.dumps(entry, ensure_ascii=False).encode("utf-8")
+        path = self.path(key)
+        try:
+            self.load_index()
+            # Write then rename so a crash never leaves a half-written entry
+            with open(path + ".tmp", "wb") as f:
+                f.write(data)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            logging.warning(f"Could not write response cache entry: {e}")
+            return
+        self.index[key] = [len(data), time.time()]
+        self.evict()
+
+    def remove(self, key):
+        self.load_index().pop(key, None)
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            pass
+
+    def evict(self):
+        total = sum(size for size, _ in self.index.values())
+        if total <= self.max_bytes:
+            return
+        for key, (size, _) in sorted(self.index.items(), key=lambda item: item[1][1]):
+            self.remove(key)
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        for key in list(self.load_index()):
+            self.remove(key)
+        self.hits = 0
+        self.misses = 0
+
+    def stats_text(self):
+        if not self.enabled:
+            return ""
+        entries = len(self.index) if self.index is not None else 0
+        return f"Cache: {self.hits} hits, {self.misses} misses, {entries} entries"
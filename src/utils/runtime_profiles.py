@@ -0,0 +1,99 @@
+import json
+import logging
+import os
+import socket
+import threading
+from urllib.parse import urlsplit
+from ..config import (
+    OLLAMA_BASE_URL, RUNTIME_PROFILES_FILE, CONTEXT_TOKEN_BUDGET, CONTEXT_BUDGET_SHARE
+)
+
+LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1", "0.0.0.0"}
+
+
+def host_key(base_url=OLLAMA_BASE_URL):
+    # The machine that runs the model. A local server is named after this
+    # computer, so a home folder shared between machines keeps them apart.
+    parts = urlsplit(base_url)
+    host = parts.hostname or base_url
+    if host in LOCAL_HOSTS:
+        host = socket.gethostname()
+    return f"{host}:{parts.port}" if parts.port else host
+
+
+class RuntimeProfiles:
+    # Ollama options found fastest by calibration, stored per (host, model)
+    # in one JSON file. The file is read again when it changes, so a profile
+    # saved by a calibration run is used from the next request on.
+    def __init__(self, path=RUNTIME_PROFILES_FILE, host=None):
+        self.path = path
+        self.host = host or host_key()
+        self.lock = threading.Lock()
+        self.profiles = {}
+        self.mtime = None
+
+    def load(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            self.profiles, self.mtime = {}, None
+            return self.profiles
+        if mtime != self.mtime:
+            try:
+                with open(self.path, "r") as f:
+                    self.profiles = json.load(f).get("hosts", {})
+            except (OSError, ValueError) as e:
+                logging.warning(f"Could not read runtime profiles: {e}")
+                self.profiles = {}
+            self.mtime = mtime
+        return self.profiles
+
+    def get(self, model):
+        with self.lock:
+            return self.load().get(self.host, {}).get(model)
+
+    def options(self, model, default=None):
+        profile = self.get(model) or {}
+        return dict(profile.get("options") or default or {})
+
+    def save(self, model, profile):
+        with self.lock:
+            self.load().setdefault(self.host, {})[model] = profile
+            self.write()
+
+    def remove(self, model):
+        with self.lock:
+            if self.load().get(self.host, {}).pop(model, None) is None:
+                return False
+            self.write()
+            return True
+
+    def write(self):
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"hosts": self.profiles}, f, indent=2)
+        os.replace(temp_path, self.path)
+        self.mtime = None
+
+
+_profiles = None
+
+
+def get_profiles():
+    global _profiles
+    if _profiles is None:
+        _profiles = RuntimeProfiles()
+    return _profiles
+
+
+def runtime_options(model, default=None):
+    # Options to send with every request for model on the configured server.
+    # Preloads must send the same ones, or Ollama reloads the model.
+    return get_profiles().options(model, default)
+
+
+def context_budget(model):
+    # Tokens of conversation to send to model: a share of its calibrated
+    # num_ctx, leaving the rest for the reply
+    num_ctx = get_profiles().options(model).get("num_ctx")
+    return int(num_ctx * CONTEXT_BUDGET_SHARE) if num_ctx else CONTEXT_TOKEN_BUDGET
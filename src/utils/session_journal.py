@@ -0,0 +1,193 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from ..config import (
+    SESSION_JOURNAL_FOLDER, JOURNAL_FLUSH_INTERVAL_MS, JOURNAL_COMPACT_RECORDS
+)
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+def empty_state():
+    return {
+        "conversation": None,  # id in the conversation store
+        "stored": 0,           # the window's messages the store has
+        "messages": [],        # the window's messages after those
+        "rewritten": False,    # messages replace the stored ones
+        "partial": "",         # the reply streamed so far
+        "model": None,
+    }
+
+
+def apply(state, record):
+    # Replays one journal record onto state
+    op = record["op"]
+    if op == "message":
+        state["messages"].append({"role": record["role"], "content": record["content"]})
+        state["partial"] = ""
+    elif op == "partial":
+        state["partial"] += record["text"]
+    elif op == "stored":
+        state["messages"] = state["messages"][max(0, record["count"] - state["stored"]):]
+        state.update(conversation=record["conversation"], stored=record["count"], rewritten=False)
+    elif op == "truncate":
+        keep = record["count"] - state["stored"]
+        if keep >= 0:
+            state["messages"] = state["messages"][:keep]
+        else:
+            state.update(messages=[], stored=record["count"])
+        state["partial"] = ""
+    elif op == "rewrite":
+        state.update(messages=list(record["messages"]), stored=0, rewritten=True, partial="")
+    elif op == "open":
+        state.update(empty_state(), conversation=record["conversation"], stored=record["count"])
+    elif op == "reset":
+        state.update(empty_state())
+    elif op == "snapshot":
+        state.update(record["state"])
+    if record.get("model"):
+        state["model"] = record["model"]
+
+
+def coalesce(records):
+    # Consecutive reply checkpoints become one record
+    merged = []
+    for record in records:
+        if record["op"] == "partial" and merged and merged[-1]["op"] == "partial":
+            merged[-1] = {"op": "partial", "text": merged[-1]["text"] + record["text"]}
+        else:
+            merged.append(record)
+    return merged
+
+
+class SessionJournal:
+    # Append-only JSONL log of one app's session. The GUI thread only queues
+    # records; a writer thread appends whatever arrived within
+    # flush_interval_ms with a single write and fsync, so a burst of
+    # checkpoints costs one disk flush. Every compact_records records the
+    # file is replaced by a snapshot of the state it describes. That state
+    # holds only what the conversation store lacks, so neither a record nor
+    # a compaction costs more as the conversation grows.
+    def __init__(self, name, folder=SESSION_JOURNAL_FOLDER,
+                 flush_interval_ms=JOURNAL_FLUSH_INTERVAL_MS, compact_records=JOURNAL_COMPACT_RECORDS):
+        self.path = os.path.join(folder, f"{name}.jsonl")
+        self.folder = folder
+        self.flush_interval = flush_interval_ms / 1000
+        self.compact_records = compact_records
+        self.records = queue.SimpleQueue()
+        self.state = None
+        self.file = None
+        self.lock_file = None
+        self.thread = None
+        self.written = 0
+
+    def replay(self):
+        # The state the journal left off in, or None when another instance of
+        # the app holds it
+        os.makedirs(self.folder, exist_ok=True)
+        self.lock_file = open(f"{self.path}.lock", "a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(self.lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                self.lock_file.close()
+                self.lock_file = None
+                return None
+        state = empty_state()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        apply(state, json.loads(line))
+                    except (ValueError, KeyError, TypeError) as e:
+                        # A record cut short by a crash ends the journal
+                        logging.warning(f"Journal {self.path} ends in a damaged record: {e}")
+                        break
+        except FileNotFoundError:
+            pass
+        return state
+
+    def start(self, state):
+        # Begins journaling from state. The file is replaced by its snapshot
+        # first, so what was just restored is not restored again.
+        self.state = state
+        self.compact()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def record(self, op, **fields):
+        if self.thread is not None:
+            self.records.put(dict(fields, op=op))
+
+    def run(self):
+        while True:
+            records = [self.records.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while records[-1] is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    records.append(self.records.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            closing = records[-1] is None
+            records = coalesce([record for record in records if record is not None])
+            if records:
+                self.write(records)
+            if closing:
+                if self.file is not None:
+                    self.file.close()
+                return
+
+    def write(self, records):
+        for record in records:
+            apply(self.state, record)
+        if self.file is None:
+            # Opening the journal failed: try again with a fresh snapshot
+            self.compact()
+            return
+        try:
+            self.file.write("".join(json.dumps(record) + "\n" for record in records))
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        except OSError as e:
+            logging.error(f"Could not write the session journal: {e}")
+        self.written += len(records)
+        if self.written >= self.compact_records:
+            self.compact()
+
+    def compact(self):
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write(json.dumps({"op": "snapshot", "state": self.state}) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logging.error(f"Could not compact the session journal: {e}")
+        if self.file is not None:
+            self.file.close()
+        try:
+            self.file = open(self.path, "a", encoding="utf-8")
+        except OSError as e:
+            logging.error(f"Could not open the session journal: {e}")
+            self.file = None
+        self.written = 0
+
+    def close(self):
+        # Writes out what is queued and releases the journal
+        if self.thread is not None:
+            self.records.put(None)
+            self.thread.join()
+            self.thread = None
+        if self.lock_file is not None:
+            self.lock_file.close()
+            self.lock_file = None
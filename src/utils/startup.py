@@ -0,0 +1,27 @@
+import logging
+import time
+
+
+class StartupTimer:
+    # Times the startup phases from the moment the window starts being built,
+    # so time-to-interactive can be tracked from the logs.
+    def __init__(self, log=logging.info):
+        self.log = log
+        self.started = time.monotonic()
+        self.phases = {}
+        self.finished = False
+
+    def mark(self, phase):
+        if phase in self.phases:
+            return
+        elapsed = (time.monotonic() - self.started) * 1000
+        self.phases[phase] = elapsed
+        self.log(f"Startup: {phase} after {elapsed:.0f} ms")
+
+    def finish(self, phase="interactive"):
+        if self.finished:
+            return
+        self.mark(phase)
+        self.finished = True
+        self.log("Startup timeline: " + ", ".join(
+            f"{name} {elapsed:.0f} ms" for name, elapsed in self.phases.items()))
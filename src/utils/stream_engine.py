@@ -0,0 +1,59 @@
+import asyncio
+import logging
+import threading
+from ..config import OLLAMA_STREAM_CAPTURE, OLLAMA_STREAM_REPLAY, OLLAMA_STREAM_REPLAY_SPEED
+from .async_client import AsyncOllamaClient
+from .stream_fixtures import RecordingClient, ReplayClient
+
+class StreamEngine:
+    # One asyncio loop on one background thread runs every Ollama request:
+    # generations, preloads, model management and the calls made outside the
+    # windows. The loop is not merged into Qt's or Tk's event loop, which
+    # neither toolkit can run asyncio on without an extra dependency or
+    # polling. GUIs hand coroutines over with submit() and get results back
+    # through Qt signals or Tk's after().
+    def __init__(self, client=None):
+        self.client = client or AsyncOllamaClient()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run_loop, name="ollama-stream-engine",
+                                       daemon=True)
+        self.thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def call_soon(self, callback, *args):
+        self.loop.call_soon_threadsafe(callback, *args)
+
+    def shutdown(self):
+        if not self.thread.is_alive():
+            return
+        self.loop.call_soon_threadsafe(self.client.close)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=1)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def default_client():
+    if OLLAMA_STREAM_REPLAY:
+        logging.info(f"Replaying Ollama streams from {OLLAMA_STREAM_REPLAY}")
+        return ReplayClient(OLLAMA_STREAM_REPLAY, OLLAMA_STREAM_REPLAY_SPEED)
+    client = AsyncOllamaClient()
+    if OLLAMA_STREAM_CAPTURE:
+        logging.info(f"Recording Ollama streams to {OLLAMA_STREAM_CAPTURE}")
+        return RecordingClient(client, OLLAMA_STREAM_CAPTURE)
+    return client
+
+def get_engine():
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            logging.debug("Starting Ollama stream engine")
+            _engine = StreamEngine(default_client())
+        return _engine
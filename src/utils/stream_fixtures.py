@@ -0,0 +1,209 @@
+import asyncio
+import base64
+import contextlib
+import json
+import logging
+import os
+import re
+import time
+from datetime import datetime
+from urllib.parse import urlsplit
+
+FIXTURE_VERSION = 1
+FIXTURE_SUFFIX = ".stream.jsonl"
+
+# Fixture file layout, one JSON object per line: a header describing the
+# request and response, then one {"t": seconds, "b": base64} line per chunk
+# exactly as read from the socket, timed from when the request was sent.
+
+
+def is_chat_stream(url, payload):
+    return (urlsplit(url).path.endswith("/api/chat") and payload is not None
+            and bool(payload.get("messages")) and payload.get("stream", True))
+
+
+def read_fixture(path):
+    with open(path, "r") as f:
+        header = json.loads(f.readline())
+        if header.get("fixture") != FIXTURE_VERSION:
+            raise ValueError(f"{path} is not a recorded stream fixture")
+        chunks = []
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                chunks.append((entry["t"], base64.b64decode(entry["b"])))
+    return header, chunks
+
+
+def fixture_paths(path):
+    if os.path.isdir(path):
+        return sorted(os.path.join(path, name) for name in os.listdir(path)
+                      if name.endswith(FIXTURE_SUFFIX))
+    return [path]
+
+
+class StreamRecorder:
+    # Collects one chat stream in memory and writes it out when it ends, so
+    # recording adds no file I/O between chunks.
+    def __init__(self, folder, method, url, payload):
+        self.folder = folder
+        self.header = {
+            "fixture": FIXTURE_VERSION,
+            "method": method,
+            "path": urlsplit(url).path,
+            "model": payload.get("model", ""),
+            "request": payload,
+            "recorded_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        self.started = time.monotonic()
+        self.chunks = []
+
+    def record(self, chunk):
+        self.chunks.append((time.monotonic() - self.started, chunk))
+
+    def save(self, response, complete):
+        self.header.update(status=response.status, reason=response.reason,
+                           headers=dict(response.headers), complete=complete)
+        model = re.sub(r"[^\w.-]+", "_", self.header["model"]) or "model"
+        name = f"{datetime.now():%Y%m%d-%H%M%S-%f}-{model}{FIXTURE_SUFFIX}"
+        path = os.path.join(self.folder, name)
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            with open(path, "w") as f:
+                f.write(json.dumps(self.header) + "\n")
+                for offset, chunk in self.chunks:
+                    f.write(json.dumps({"t": round(offset, 6),
+                                        "b": base64.b64encode(chunk).decode("ascii")}) + "\n")
+            logging.debug(f"Recorded stream fixture {path}")
+        except OSError as e:
+            logging.warning(f"Could not save stream fixture: {e}")
+
+
+class RecordingResponse:
+    def __init__(self, response, recorder):
+        self.response = response
+        self.recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self.response, name)
+
+    async def iter_chunks(self):
+        async for chunk in self.response.iter_chunks():
+            self.recorder.record(chunk)
+            yield chunk
+
+
+class RecordingClient:
+    # Wraps the real client and saves every streamed /api/chat response to a
+    # fixture in folder. Everything else passes straight through.
+    def __init__(self, client, folder):
+        self.client = client
+        self.folder = folder
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    @contextlib.asynccontextmanager
+    async def stream(self, method, url, payload=None, timeout=None):
+        if not is_chat_stream(url, payload):
+            async with self.client.stream(method, url, payload, timeout) as response:
+                yield response
+            return
+        recorder = StreamRecorder(self.folder, method, url, payload)
+        async with self.client.stream(method, url, payload, timeout) as response:
+            try:
+                yield RecordingResponse(response, recorder)
+            finally:
+                # Stopped generations are kept too, marked incomplete
+                recorder.save(response, response.complete)
+
+    async def request_json(self, method, url, payload=None, timeout=None):
+        async with self.stream(method, url, payload, timeout) as response:
+            return await response.json()
+
+    async def get(self, url, timeout=None):
+        return await self.request_json("GET", url, timeout=timeout)
+
+    async def post(self, url, payload=None, timeout=None):
+        return await self.request_json("POST", url, payload, timeout)
+
+
+class ReplayResponse:
+    def __init__(self, header, chunks, speed):
+        self.status = header.get("status", 200)
+        self.reason = header.get("reason", "OK")
+        self.headers = header.get("headers", {})
+        self.chunks = chunks
+        self.speed = speed
+        self.complete = False
+
+    async def iter_chunks(self):
+        started = time.monotonic()
+        for offset, chunk in self.chunks:
+            if self.speed:
+                delay = started + offset / self.speed - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            else:
+                # Still yield to the loop so a Stop can cancel the replay
+                await asyncio.sleep(0)
+            yield chunk
+        self.complete = True
+
+    async def read(self):
+        return b"".join([chunk async for chunk in self.iter_chunks()])
+
+    async def json(self):
+        body = await self.read()
+        return json.loads(body) if body.strip() else {}
+
+
+class ReplayClient:
+    # Stands in for the Ollama server: streamed chat requests are answered
+    # with recorded fixtures in turn, at their original pace times speed
+    # (0 replays as fast as possible). Version, model list and preload
+    # requests get minimal answers so the windows start up normally.
+    def __init__(self, path, speed=1.0):
+        self.fixtures = [read_fixture(fixture) for fixture in fixture_paths(path)]
+        if not self.fixtures:
+            raise ValueError(f"No stream fixtures found in {path}")
+        self.speed = speed
+        self.next_fixture = 0
+        self.models = sorted({header["model"] for header, _ in self.fixtures if header["model"]})
+        self.requests = []
+
+    def canned(self, url, payload):
+        path = urlsplit(url).path
+        if path.endswith("/api/version"):
+            return {"version": "replay"}
+        if path.endswith("/api/tags"):
+            return {"models": [{"name": name, "model": name} for name in self.models]}
+        if path.endswith("/api/ps"):
+            return {"models": []}
+        model = (payload or {}).get("model", "")
+        return {"model": model, "message": {"role": "assistant", "content": ""},
+                "done_reason": "load", "done": True}
+
+    @contextlib.asynccontextmanager
+    async def stream(self, method, url, payload=None, timeout=None):
+        self.requests.append(payload)
+        if is_chat_stream(url, payload):
+            header, chunks = self.fixtures[self.next_fixture % len(self.fixtures)]
+            self.next_fixture += 1
+            yield ReplayResponse(header, chunks, self.speed)
+        else:
+            body = json.dumps(self.canned(url, payload)).encode()
+            yield ReplayResponse({}, [(0, body)], 0)
+
+    async def request_json(self, method, url, payload=None, timeout=None):
+        async with self.stream(method, url, payload, timeout) as response:
+            return await response.json()
+
+    async def get(self, url, timeout=None):
+        return await self.request_json("GET", url, timeout=timeout)
+
+    async def post(self, url, payload=None, timeout=None):
+        return await self.request_json("POST", url, payload, timeout)
+
+    def close(self):
+        pass
@@ -0,0 +1,111 @@
+import os
+import queue
+import sys
+import threading
+import tkinter as tk
+
+WAKEUP_EVENT = "<<BridgeWakeup>>"
+
+
+class Channel:
+    # The results of one operation (a reply, a request, a history load). Any
+    # thread may put items; the handler gets every item that arrived since it
+    # last ran, as one list, on the Tk thread. Items put after close() are
+    # dropped, so a stopped operation cannot reach the window any more.
+    def __init__(self, bridge, handler):
+        self.bridge = bridge
+        self.handler = handler
+        self.items = queue.SimpleQueue()
+        self.closed = False
+
+    def put(self, item):
+        if self.closed:
+            return
+        self.items.put(item)
+        self.bridge.wake(self)
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        items = []
+        while True:
+            try:
+                items.append(self.items.get_nowait())
+            except queue.Empty:
+                return items
+
+
+class TkBridge:
+    # Wakes the Tk event loop from worker threads only when a channel has
+    # something to deliver, so nothing polls and an idle window uses no CPU.
+    # A wakeup is a byte written to a pipe Tk watches; where Tk cannot watch
+    # files (Windows) it is a virtual event instead. At most one wakeup is
+    # pending at a time and it handles every channel that got items meanwhile.
+    def __init__(self, root):
+        self.root = root
+        self.lock = threading.Lock()
+        self.ready = {}  # channels with items, in the order they got them
+        self.woken = False
+        self.reader = self.writer = None
+        if hasattr(root.tk, "createfilehandler"):
+            self.reader, self.writer = os.pipe()
+            os.set_blocking(self.reader, False)
+            root.tk.createfilehandler(self.reader, tk.READABLE, self.on_readable)
+        else:
+            root.bind(WAKEUP_EVENT, lambda event: self.deliver())
+
+    def channel(self, handler):
+        return Channel(self, handler)
+
+    def future_channel(self, future, callback):
+        # Runs callback(future) on the Tk thread once the future is done
+        channel = self.channel(lambda items: callback(items[-1]))
+        future.add_done_callback(channel.put)
+        return channel
+
+    def wake(self, channel):
+        with self.lock:
+            self.ready[channel] = True
+            if self.woken:
+                return
+            self.woken = True
+        try:
+            if self.writer is not None:
+                os.write(self.writer, b"\0")
+            else:
+                self.root.event_generate(WAKEUP_EVENT, when="tail")
+        except (OSError, RuntimeError, tk.TclError):
+            pass  # the window is gone
+
+    def on_readable(self, file, mask):
+        try:
+            os.read(self.reader, 64)
+        except BlockingIOError:
+            pass
+        self.deliver()
+
+    def deliver(self):
+        with self.lock:
+            ready, self.ready = self.ready, {}
+            self.woken = False
+        for channel in ready:
+            if channel.closed:
+                continue
+            items = channel.drain()
+            if not items:
+                continue  # already handled by an earlier wakeup
+            try:
+                channel.handler(items)
+            except Exception:
+                # An exception escaping a file handler would end mainloop
+                self.root.report_callback_exception(*sys.exc_info())
+
+    def close(self):
+        with self.lock:
+            self.woken = True  # no more wakeups
+        if self.reader is not None:
+            self.root.tk.deletefilehandler(self.reader)
+            os.close(self.reader)
+            os.close(self.writer)
+            self.reader = self.writer = None
@@ -0,0 +1,95 @@
+import tempfile
+
+
+class Scrollback:
+    # Keeps a Tk text widget at around max_lines lines. While the view is at
+    # the bottom, the oldest lines are moved to a file in chunks of
+    # chunk_lines once the widget holds a chunk more than it should. When
+    # the view reaches the top, the most recently moved chunk is put back,
+    # one chunk per scroll. The file works as a stack: restoring a chunk
+    # truncates it, so the file only ever holds what is not in the widget.
+    def __init__(self, text, max_lines, chunk_lines, folder=None):
+        self.text = text
+        self.max_lines = max_lines
+        self.chunk_lines = chunk_lines
+        self.file = tempfile.TemporaryFile(dir=folder, prefix=".scrollback-")
+        self.chunks = []  # (offset, size, lines) of each chunk in the file
+        self.check_pending = False
+        self.scrollbar_set = text.vbar.set
+        text.configure(yscrollcommand=self.on_scroll)
+
+    def line_count(self):
+        return int(self.text.index("end-1c").split(".")[0])
+
+    def on_scroll(self, first, last):
+        self.scrollbar_set(first, last)
+        # Inserts and scrolling both end up here; the widget is only changed
+        # once Tk is idle again
+        if not self.check_pending and (
+                float(last) >= 1.0 and self.line_count() > self.max_lines + self.chunk_lines
+                or float(first) <= 0.0 and float(last) < 1.0 and self.chunks):
+            self.check_pending = True
+            self.text.after_idle(self.check)
+
+    def check(self):
+        self.check_pending = False
+        first, last = self.text.yview()
+        if last >= 1.0:
+            self.trim()
+        elif first <= 0.0 and self.chunks:
+            self.restore()
+
+    def trim(self):
+        excess = self.line_count() - self.max_lines
+        if excess <= self.chunk_lines:
+            return
+        lines = excess // self.chunk_lines * self.chunk_lines
+        text = self.text.get("1.0", f"{lines + 1}.0")
+        self.text.delete("1.0", f"{lines + 1}.0")
+        self.spill(text, lines)
+
+    def spill(self, text, lines):
+        # Writes the first lines of text to the file, chunk_lines a chunk;
+        # lines is a multiple of chunk_lines. Returns where the rest starts.
+        self.file.seek(0, 2)
+        begin = 0
+        for _ in range(lines // self.chunk_lines):
+            end = begin
+            for _ in range(self.chunk_lines):
+                end = text.index("\n", end) + 1
+            data = text[begin:end].encode("utf-8")
+            self.chunks.append((self.file.tell(), len(data), self.chunk_lines))
+            self.file.write(data)
+            begin = end
+        return begin
+
+    def restore(self):
+        offset, size, lines = self.chunks.pop()
+        self.file.seek(offset)
+        data = self.file.read(size).decode("utf-8")
+        self.file.truncate(offset)
+        # Keep the lines that were in view where they are on screen
+        top = int(self.text.index("@0,0").split(".")[0])
+        self.text.insert("1.0", data)
+        self.text.yview(f"{top + lines}.0")
+
+    def prepend(self, text):
+        # Puts text above the widget's contents, sending what does not fit
+        # straight to the file instead of through the widget
+        if self.chunks:
+            # Lines spilled meanwhile belong between text and the widget
+            self.file.seek(0)
+            text += self.file.read().decode("utf-8")
+            self.reset()
+        keep = max(0, self.max_lines - self.line_count())
+        spilled = max(0, text.count("\n") - keep) // self.chunk_lines * self.chunk_lines
+        self.text.insert("1.0", text[self.spill(text, spilled):])
+
+    def reset(self):
+        # The widget was cleared
+        self.chunks = []
+        self.file.seek(0)
+        self.file.truncate()
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,95 @@
+import json
+import logging
+import time
+from collections import deque
+from ..config import MODEL_USAGE_FILE, OLLAMA_KEEP_ALIVE, WARM_POOL_PREDICTIONS
+
+
+class WarmPool:
+    # Decides which models to keep resident in Ollama. Every model switch is
+    # counted; after the active model loads, the models most often switched to
+    # from it are preloaded in the background so switching there is instant.
+    # Loads run one at a time from a queue: a load for the model the user is
+    # waiting on jumps the queue, nothing is ever refused.
+    def __init__(self, usage_file=MODEL_USAGE_FILE, keep_alive=OLLAMA_KEEP_ALIVE,
+                 predictions=WARM_POOL_PREDICTIONS):
+        self.usage_file = usage_file
+        self.keep_alive = keep_alive
+        self.predictions = predictions
+        self.transitions = self.load_usage()
+        self.pending = deque()
+        self.loading = None
+        self.resident = {}  # model -> time.monotonic() when Ollama will unload it
+
+    def load_usage(self):
+        try:
+            with open(self.usage_file, "r") as f:
+                return json.load(f).get("transitions", {})
+        except (OSError, ValueError):
+            return {}
+
+    def save_usage(self):
+        try:
+            with open(self.usage_file, "w") as f:
+                json.dump({"transitions": self.transitions}, f)
+        except OSError as e:
+            logging.warning(f"Could not save model usage: {e}")
+
+    def record_switch(self, old_model, new_model):
+        if not old_model or old_model == new_model:
+            return
+        counts = self.transitions.setdefault(old_model, {})
+        counts[new_model] = counts.get(new_model, 0) + 1
+        self.save_usage()
+
+    def predict(self, model):
+        counts = self.transitions.get(model, {})
+        ranked = sorted(counts, key=counts.get, reverse=True)
+        return [name for name in ranked if name != model][:self.predictions]
+
+    def is_warm(self, model):
+        return self.resident.get(model, 0) > time.monotonic()
+
+    def touch(self, model):
+        # Every request carries keep_alive, so each use restarts the timer
+        self.resident[model] = time.monotonic() + self.keep_alive
+
+    def sync_loaded(self, is_loaded, as_of):
+        # Drop models Ollama reports as unloaded, unless they were loaded or
+        # used after that report was requested
+        for model, expires in list(self.resident.items()):
+            if expires - self.keep_alive < as_of and not is_loaded(model):
+                del self.resident[model]
+
+    def forget(self, model):
+        self.resident.pop(model, None)
+        if model in self.pending:
+            self.pending.remove(model)
+
+    def request(self, model, urgent=False):
+        if model == self.loading or (not urgent and self.is_warm(model)):
+            return
+        if model in self.pending:
+            if not urgent:
+                return
+            self.pending.remove(model)
+        if urgent:
+            self.pending.appendleft(model)
+        else:
+            self.pending.append(model)
+
+    def plan(self, model):
+        for name in self.predict(model):
+            self.request(name)
+
+    def next_load(self):
+        if self.loading is not None or not self.pending:
+            return None
+        self.loading = self.pending.popleft()
+        return self.loading
+
+    def load_finished(self, model, ok):
+        if ok:
+            self.touch(model)
+        if self.loading == model:
+            self.loading = None
@@ -0,0 +1,54 @@
+from PyQt6.QtCore import QObject, pyqtSignal
+import logging
+import time
+from ..config import OLLAMA_TAGS_URL, OLLAMA_PS_URL, OLLAMA_STARTUP_TIMEOUT
+from ..utils.model_catalog import ModelCatalog
+from .request_worker import RequestWorker
+
+class CatalogWorker(QObject):
+    # Refreshes the stale parts of a ModelCatalog in the background
+    updated = pyqtSignal()
+    error = pyqtSignal(str)
+
+    def __init__(self, catalog=None, tags_url=OLLAMA_TAGS_URL, ps_url=OLLAMA_PS_URL,
+                 timeout=OLLAMA_STARTUP_TIMEOUT, parent=None):
+        super().__init__(parent)
+        self.catalog = catalog or ModelCatalog()
+        self.tags_url = tags_url
+        self.ps_url = ps_url
+        self.timeout = timeout
+        self.tags_worker = None
+        self.ps_worker = None
+        self.ps_requested_at = None
+
+    def refresh(self, force=False):
+        if self.tags_worker is None and (force or self.catalog.tags_stale()):
+            self.tags_worker = RequestWorker("GET", self.tags_url, timeout=self.timeout)
+            self.tags_worker.finished.connect(self.on_tags)
+            self.tags_worker.error.connect(self.on_tags_error)
+            self.tags_worker.start()
+        if self.ps_worker is None and (force or self.catalog.ps_stale()):
+            self.ps_requested_at = time.monotonic()
+            self.ps_worker = RequestWorker("GET", self.ps_url, timeout=self.timeout)
+            self.ps_worker.finished.connect(self.on_ps)
+            self.ps_worker.error.connect(self.on_ps_error)
+            self.ps_worker.start()
+
+    def on_tags(self, data):
+        self.tags_worker = None
+        self.catalog.update_tags(data)
+        self.updated.emit()
+
+    def on_ps(self, data):
+        self.ps_worker = None
+        self.catalog.update_ps(data, self.ps_requested_at)
+        self.updated.emit()
+
+    def on_tags_error(self, error):
+        self.tags_worker = None
+        logging.warning(f"Error fetching models: {error}")
+        self.error.emit(error)
+
+    def on_ps_error(self, error):
+        self.ps_worker = None
+        logging.warning(f"Error fetching loaded models: {error}")
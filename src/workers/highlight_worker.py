@@ -0,0 +1,31 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from PyQt6.QtCore import QObject, pyqtSignal
+from ..config import CODE_HIGHLIGHT_STYLE
+from ..utils.markdown_stream import highlight_spans
+
+class HighlightWorker(QObject):
+    # Lexes code blocks on one background thread. highlighted is emitted from
+    # that thread, so it reaches the GUI thread as a queued signal.
+    highlighted = pyqtSignal(object, object)
+
+    def __init__(self, style=CODE_HIGHLIGHT_STYLE, parent=None):
+        super().__init__(parent)
+        self.style = style
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="highlight")
+
+    def submit(self, key, code, language):
+        future = self.executor.submit(highlight_spans, code, language, self.style)
+        future.add_done_callback(lambda done: self.on_done(key, done))
+
+    def on_done(self, key, future):
+        try:
+            spans = future.result()
+        except Exception as e:
+            # A lexer failure only costs the colors
+            logging.warning(f"Highlighting failed: {e}")
+            spans = []
+        try:
+            self.highlighted.emit(key, spans)
+        except RuntimeError:
+            pass  # the display was closed meanwhile
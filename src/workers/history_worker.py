@@ -0,0 +1,49 @@
+import sqlite3
+import threading
+import time
+from PyQt6.QtCore import QObject, pyqtSignal
+from PyQt6.QtGui import QColor
+from ..config import HISTORY_PREVIEW_MESSAGES
+from ..utils.history_loader import read_conversation, display_entries
+
+ROLE_COLORS = {"user": QColor("gray"), "assistant": QColor("white")}
+
+class HistoryWorker(QObject):
+    # Reads a stored conversation and builds the display contents on a
+    # background thread with the display's build_contents, so the window only
+    # has to swap them in. A long conversation first gets a preview built
+    # from a query for just its last messages.
+    # Signals carry the worker so a window can drop results of a load it
+    # replaced.
+    preview = pyqtSignal(object, object)
+    loaded = pyqtSignal(object, object, object)
+    error = pyqtSignal(object, str)
+
+    def __init__(self, store, conversation_id, display, model, system_prompt):
+        super().__init__()
+        self.store = store
+        self.conversation_id = conversation_id
+        self.build_contents = type(display).build_contents
+        self.font = display.font()
+        self.model = model
+        self.system_prompt = system_prompt
+
+    def start(self):
+        started_at = time.monotonic()
+        threading.Thread(target=self.run, args=(started_at,), daemon=True).start()
+
+    def run(self, started_at):
+        try:
+            history = read_conversation(self.store, self.conversation_id, self.model,
+                                        self.system_prompt, started_at, last=HISTORY_PREVIEW_MESSAGES)
+            if len(history.messages) == HISTORY_PREVIEW_MESSAGES:
+                # There may be more: show these while the rest is read
+                self.preview.emit(self, self.build_contents(display_entries(history.messages),
+                                                            self.font, ROLE_COLORS))
+                history = read_conversation(self.store, self.conversation_id, self.model,
+                                            self.system_prompt, started_at)
+        except (sqlite3.Error, KeyError) as e:
+            self.error.emit(self, f"Could not load the conversation: {e}")
+            return
+        self.loaded.emit(self, history, self.build_contents(display_entries(history.messages),
+                                                            self.font, ROLE_COLORS))
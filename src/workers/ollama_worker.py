@@ -1,49 +1,144 @@
-from PyQt6.QtCore import QThread, pyqtSignal
-import json
+from PyQt6.QtCore import QObject, pyqtSignal
+import asyncio
 import logging
-import requests
-from ..config import OLLAMA_CHAT_URL
+import re
+import time
+from ..config import OLLAMA_CHAT_URL, OLLAMA_KEEP_ALIVE, STREAM_FLUSH_INTERVAL_MS, STREAM_FLUSH_MAX_TOKENS
+from ..utils.async_client import OllamaRequestError
+from ..utils.metrics import GenerationMetrics
+from ..utils.ndjson import ChatStreamParser
+from ..utils.runtime_profiles import runtime_options
+from ..utils.stream_engine import get_engine
 
-class OllamaWorker(QThread):
+# Splits a cached reply into word-sized pieces for replay
+REPLAY_PIECE = re.compile(r"\s*\S+|\s+")
+
+class OllamaWorker(QObject):
     update_signal = pyqtSignal(str)
     error_signal = pyqtSignal(str)
     finished_signal = pyqtSignal()
+    done_signal = pyqtSignal()
 
-    def __init__(self, model, messages):
+    def __init__(self, model, messages, flush_interval_ms=STREAM_FLUSH_INTERVAL_MS,
+                 flush_max_tokens=STREAM_FLUSH_MAX_TOKENS, cached=None, options=None):
         super().__init__()
         self.model = model
         self.messages = messages
+        # The calibrated profile for this machine and model, if there is one
+        self.options = runtime_options(model) if options is None else options
+        self.cached = cached
+        self.is_running = True
+        self.future = None
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_max_tokens = max(1, flush_max_tokens)
+        self.pending_tokens = []
+        self.last_flush = 0.0
+        self.started_at = None
+        self.first_token_at = None
+        self.finished_at = None
+        self.token_count = 0
+        self.last_token_at = None
+        self.token_gaps = []
+        self.final = None
+
+    def start(self):
         self.is_running = True
+        self.started_at = time.monotonic()
+        self.future = get_engine().submit(self.run())
 
-    def run(self):
+    def isRunning(self):
+        return self.future is not None and not self.future.done()
+
+    async def run(self):
         try:
+            if self.cached is not None:
+                await self.replay(self.cached)
+                return
+
             logging.debug(f"Sending request to Ollama. Model: {self.model}")
             logging.debug(f"Messages: {self.messages}")
-            
-            response = requests.post(OLLAMA_CHAT_URL, json={
+
+            async with get_engine().client.stream("POST", OLLAMA_CHAT_URL, {
                 "model": self.model,
                 "messages": self.messages,
-                "stream": True
-            }, stream=True, timeout=500)
-            
-            logging.debug(f"Response status code: {response.status_code}")
-            response.raise_for_status()
-
-            for line in response.iter_lines():
-                if not self.is_running:
-                    break
-                if line:
-                    try:
-                        data = json.loads(line)
-                        if 'message' in data and 'content' in data['message']:
-                            self.update_signal.emit(data['message']['content'])
-                    except json.JSONDecodeError as e:
-                        logging.error(f"JSON decode error: {e}")
-                        self.error_signal.emit(f"Error decoding JSON from Ollama response: {e}")
+                "stream": True,
+                "keep_alive": OLLAMA_KEEP_ALIVE,
+                "options": self.options
+            }, timeout=500) as response:
+                logging.debug(f"Response status code: {response.status}")
+
+                parser = ChatStreamParser()
+                async for chunk in response.iter_chunks():
+                    if not self.is_running:
+                        break
+                    self.buffer_tokens(parser.feed(chunk))
+                    if parser.errors:
+                        self.flush_tokens()
+                        for error in parser.errors:
+                            logging.error(f"Stream error: {error}")
+                            self.error_signal.emit(error)
+                        parser.errors.clear()
+                self.final = parser.final
+            self.flush_tokens()
+            self.finished_at = time.monotonic()
             self.finished_signal.emit()
-        except requests.exceptions.RequestException as e:
+        except OllamaRequestError as e:
             logging.error(f"Request exception: {e}")
+            self.flush_tokens()
             self.error_signal.emit(f"Error connecting to Ollama: {str(e)}")
+        except asyncio.CancelledError:
+            # Leaving the stream context closed the socket, which is what makes
+            # Ollama abandon the generation; report what arrived so far.
+            logging.debug(f"Generation cancelled. Model: {self.model}")
+            self.flush_tokens()
+            self.finished_at = time.monotonic()
+            self.finished_signal.emit()
+            raise
+        finally:
+            self.done_signal.emit()
+
+    async def replay(self, entry):
+        # A cached reply goes through the same batching and signals as a
+        # streamed one, so the window cannot tell the difference.
+        logging.debug(f"Replaying cached response. Model: {self.model}")
+        pieces = REPLAY_PIECE.findall(entry.get("content", ""))
+        for start in range(0, len(pieces), self.flush_max_tokens):
+            self.buffer_tokens(pieces[start:start + self.flush_max_tokens])
+            await asyncio.sleep(0)
+        self.final = entry.get("final")
+        self.flush_tokens()
+        self.finished_at = time.monotonic()
+        self.finished_signal.emit()
+
+    def buffer_tokens(self, tokens):
+        if not tokens:
+            return
+        self.pending_tokens.extend(tokens)
+        self.token_count += len(tokens)
+        now = time.monotonic()
+        if self.first_token_at is None:
+            self.first_token_at = now
+        else:
+            # A chunk can hold several tokens; spread its gap across them
+            self.token_gaps.append((now - self.last_token_at) / len(tokens))
+        self.last_token_at = now
+        if (len(self.pending_tokens) >= self.flush_max_tokens
+                or now - self.last_flush >= self.flush_interval):
+            self.flush_tokens(now)
+
+    def metrics(self):
+        return GenerationMetrics(self.model, self.started_at, self.first_token_at,
+                                 self.last_token_at, self.token_count, self.token_gaps, self.final)
+
+    def flush_tokens(self, now=None):
+        if self.pending_tokens:
+            self.update_signal.emit("".join(self.pending_tokens))
+            self.pending_tokens = []
+        self.last_flush = now if now is not None else time.monotonic()
 
     def stop(self):
+        # Never blocks: the task is cancelled on the engine loop, which aborts
+        # the in-flight read and drops the connection immediately.
         self.is_running = False
+        if self.future is not None:
+            self.future.cancel()
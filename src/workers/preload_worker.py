@@ -1,27 +1,40 @@
 from PyQt6.QtCore import QObject, pyqtSignal
-import requests
-from ..config import OLLAMA_CHAT_URL
+from ..config import OLLAMA_CHAT_URL, OLLAMA_KEEP_ALIVE
+from ..utils.runtime_profiles import runtime_options
+from ..utils.stream_engine import get_engine
 
 class PreloadWorker(QObject):
     finished = pyqtSignal()
     error = pyqtSignal(str)
+    done = pyqtSignal()
 
     def __init__(self, model):
         super().__init__()
         self.model = model
         self.is_running = True
+        self.future = None
 
-    def run(self):
+    def start(self):
+        self.future = get_engine().submit(self.run())
+
+    async def run(self):
         try:
-            response = requests.post(OLLAMA_CHAT_URL, json={
-                "model": self.model
+            await get_engine().client.post(OLLAMA_CHAT_URL, {
+                "model": self.model,
+                "keep_alive": OLLAMA_KEEP_ALIVE,
+                # Loading with other options than the chat requests would make
+                # Ollama load the model again on the first message
+                "options": runtime_options(self.model)
             }, timeout=60)
-            response.raise_for_status()
             if self.is_running:
                 self.finished.emit()
-        except requests.exceptions.RequestException as e:
+        except Exception as e:
+            # Whatever went wrong, the warm pool must hear the load is over
+            # or it never starts another
             if self.is_running:
                 self.error.emit(str(e))
+        finally:
+            self.done.emit()
 
     def stop(self):
         self.is_running = False
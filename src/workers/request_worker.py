@@ -0,0 +1,26 @@
+from PyQt6.QtCore import QObject, pyqtSignal
+from ..utils.stream_engine import get_engine
+
+class RequestWorker(QObject):
+    finished = pyqtSignal(object)
+    error = pyqtSignal(str)
+
+    def __init__(self, method, url, payload=None, timeout=None):
+        super().__init__()
+        self.method = method
+        self.url = url
+        self.payload = payload
+        self.timeout = timeout
+        self.future = None
+
+    def start(self):
+        self.future = get_engine().submit(self.run())
+
+    async def run(self):
+        try:
+            data = await get_engine().client.request_json(self.method, self.url,
+                                                          self.payload, self.timeout)
+            self.finished.emit(data)
+        except Exception as e:
+            # Callers wait for one of the two signals before asking again
+            self.error.emit(str(e))
@@ -0,0 +1,56 @@
+from PyQt6.QtCore import QObject, pyqtSignal
+import logging
+from ..utils.warm_pool import WarmPool
+from .preload_worker import PreloadWorker
+
+class WarmPoolManager(QObject):
+    # Runs the WarmPool's queued loads one after another with PreloadWorker
+    model_ready = pyqtSignal(str)
+    model_failed = pyqtSignal(str, str)
+
+    def __init__(self, pool=None, parent=None):
+        super().__init__(parent)
+        self.pool = pool or WarmPool()
+        self.worker = None
+
+    def is_warm(self, model):
+        return self.pool.is_warm(model)
+
+    def touch(self, model):
+        self.pool.touch(model)
+
+    def forget(self, model):
+        self.pool.forget(model)
+
+    def record_switch(self, old_model, new_model):
+        self.pool.record_switch(old_model, new_model)
+
+    def preload(self, model, urgent=False):
+        self.pool.request(model, urgent)
+        self.start_next()
+
+    def plan(self, model):
+        self.pool.plan(model)
+        self.start_next()
+
+    def start_next(self):
+        model = self.pool.next_load()
+        if model is None:
+            return
+        logging.debug(f"Warm pool loading {model} ({len(self.pool.pending)} queued)")
+        self.worker = PreloadWorker(model)
+        self.worker.finished.connect(self.on_loaded)
+        self.worker.error.connect(self.on_failed)
+        self.worker.start()
+
+    def on_loaded(self):
+        model = self.pool.loading
+        self.pool.load_finished(model, True)
+        self.model_ready.emit(model)
+        self.start_next()
+
+    def on_failed(self, error):
+        model = self.pool.loading
+        self.pool.load_finished(model, False)
+        self.model_failed.emit(model, error)
+        self.start_next()
@@ -0,0 +1,13 @@
+import pytest
+
+from benchmarks import bench_cancel
+
+# Must run before anything from src is imported; see use_free_port
+PORT = bench_cancel.use_free_port()
+
+
+@pytest.mark.parametrize("scenario", list(bench_cancel.SCENARIOS))
+@pytest.mark.parametrize("client", bench_cancel.available_clients())
+def test_stop_closes_the_stream_within_budget(client, scenario):
+    result = bench_cancel.run(client, scenario, dict(bench_cancel.SCENARIOS[scenario], port=PORT))
+    assert result["socket_closed_ms"] < bench_cancel.CANCEL_BUDGET_MS, result